@@ -0,0 +1,115 @@
+'''
+Compares parquet codecs and row group sizes for the cleaned dataset on file size,
+full scan time and one month date filter time.
+
+The cleaned dataset only has 5000 rows, which fits in a single row group whatever the
+settings, so it is resampled up to a larger size first. Run from the repo root:
+
+    python benchmarks/parquet_layout.py --rows 2000000
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+# Make the dashboard utils importable from the benchmark
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "dashboard_app"))
+from utils.data_utils import DATA_FILES
+from utils.storage_utils import MIN_ROW_GROUP_ROWS, choose_row_group_size, write_parquet
+
+CODECS = ["none", "snappy", "zstd", "lz4"]
+
+
+def synthesise(df, rows, seed=42):
+    '''
+    Builds a larger dataset by resampling rows from the cleaned dataset, keeping its date range.
+
+    Parameters:
+    - df: The cleaned dataset
+    - rows: Number of rows to generate
+    - seed: Random seed
+
+    Returns:
+    - The larger DataFrame, in random order like the original file
+    '''
+    rng = np.random.default_rng(seed)
+    return df.iloc[rng.integers(0, len(df), rows)].reset_index(drop=True)
+
+
+def timed(function, repeats):
+    '''Returns the best time in milliseconds over a number of repeats.'''
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return 1000 * min(times)
+
+
+def measure(path, month_start, month_end, repeats):
+    '''
+    Measures one parquet file.
+
+    Returns:
+    - Dictionary of file size, scan time, filter time and row groups skipped by the filter
+    '''
+    date_filter = [("date", ">=", month_start), ("date", "<", month_end)]
+
+    # Count the row groups whose date statistics overlap the month
+    metadata = pq.ParquetFile(path).metadata
+    date_index = metadata.schema.to_arrow_schema().get_field_index("date")
+    overlapping = 0
+    for i in range(metadata.num_row_groups):
+        stats = metadata.row_group(i).column(date_index).statistics
+        if stats is None or not stats.has_min_max or (stats.min < month_end and stats.max >= month_start):
+            overlapping += 1
+
+    return {
+        "size_mb": os.path.getsize(path) / 1024 / 1024,
+        "scan_ms": timed(lambda: pq.read_table(path), repeats),
+        "month_filter_ms": timed(lambda: pq.read_table(path, filters=date_filter), repeats),
+        "row_groups": metadata.num_row_groups,
+        "row_groups_skipped": metadata.num_row_groups - overlapping,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Number of rows to synthesise")
+    parser.add_argument("--repeats", type=int, default=3, help="Timing repeats, the best is reported")
+    args = parser.parse_args()
+
+    df = synthesise(pd.read_parquet(DATA_FILES[0]), args.rows)
+    month_start = pd.Timestamp("2025-03-01")
+    month_end = pd.Timestamp("2025-04-01")
+    monthly = choose_row_group_size(df)
+
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        # The old layout, pandas defaults with the rows in their original order
+        path = os.path.join(folder, "pandas_default.parquet")
+        df.to_parquet(path)
+        results.append({"layout": "pandas default", "codec": "snappy", "row_group_size": len(df), **measure(path, month_start, month_end, args.repeats)})
+
+        # Every codec with the default monthly row groups
+        for codec in CODECS:
+            path = os.path.join(folder, f"{codec}.parquet")
+            write_parquet(df, path, compression=codec)
+            results.append({"layout": "sorted", "codec": codec, "row_group_size": monthly, **measure(path, month_start, month_end, args.repeats)})
+
+        # Smaller and larger row groups with zstd
+        for size in [MIN_ROW_GROUP_ROWS, monthly // 4, monthly * 4, len(df)]:
+            path = os.path.join(folder, f"zstd_{size}.parquet")
+            write_parquet(df, path, row_group_size=size, compression="zstd")
+            results.append({"layout": "sorted", "codec": "zstd", "row_group_size": size, **measure(path, month_start, month_end, args.repeats)})
+
+    print(f"{args.rows:,} rows, filtering {month_start:%B %Y}\n")
+    print(pd.DataFrame(results).round(2).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+'''
+Measures the cold start of each dashboard page: every page is run once in a fresh Python
+process, like the first view after a container starts, with the import profiler from
+utils/profile_utils.py timing every module it imports. Run from the repo root:
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --pages introduction clusters --top 10
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+DASHBOARD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dashboard_app")
+
+PAGES = ["introduction", "data_visualisation", "hypothesis_statistical_testing", "significance_screening",
+         "clusters", "models_overview", "model_predictions"]
+
+
+def run_page(page):
+    '''Runs one page in this process and prints the startup report as JSON, used by the child processes.'''
+    start = time.perf_counter()
+    sys.path.insert(0, DASHBOARD_DIR)
+    from utils.profile_utils import install_import_profiler, record_first_paint, startup_report
+    install_import_profiler()
+
+    # Streamlit's own import is part of every cold start
+    from streamlit.testing.v1 import AppTest
+    ready = time.perf_counter()
+    loaded = set(sys.modules)
+
+    at = AppTest.from_file(os.path.join(DASHBOARD_DIR, f"{page}.py"), default_timeout=300)
+    at.run()
+    record_first_paint(page, time.perf_counter() - ready)
+    report = startup_report(top=len(sys.modules))
+    # Keep only the modules the page imported itself
+    report["slowest_imports"] = {name: seconds for name, seconds in report["slowest_imports"].items() if name not in loaded}
+    report["page_import_seconds"] = round(sum(report["slowest_imports"].values()), 4)
+    report["streamlit_seconds"] = ready - start
+    report["total_seconds"] = time.perf_counter() - start
+    report["errors"] = [exception.message for exception in at.exception]
+    print(json.dumps(report))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", nargs="+", choices=PAGES, default=PAGES, help="Pages to measure")
+    parser.add_argument("--top", type=int, default=5, help="Slowest imports to list for each page")
+    parser.add_argument("--page", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.page:
+        run_page(args.page)
+        return
+
+    # Pages read their files relative to the repo root, and the utils package from the dashboard folder
+    env = {**os.environ, "PYTHONPATH": DASHBOARD_DIR}
+    print(f"{'Page':<32}{'Streamlit (s)':>14}{'Page imports (s)':>18}{'First paint (s)':>17}{'Total (s)':>11}")
+    reports = {}
+    for page in args.pages:
+        output = subprocess.run([sys.executable, __file__, "--page", page], capture_output=True, text=True, env=env, check=True)
+        report = reports[page] = json.loads(output.stdout.strip().splitlines()[-1])
+        print(f"{page:<32}{report['streamlit_seconds']:>14.2f}{report['page_import_seconds']:>18.2f}"
+              f"{report['first_paint'][page]['seconds']:>17.2f}{report['total_seconds']:>11.2f}")
+        for error in report["errors"]:
+            print(f"    error: {error}")
+
+    print(f"\nSlowest imports by self time, top {args.top} per page")
+    for page, report in reports.items():
+        slowest = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in list(report["slowest_imports"].items())[:args.top])
+        print(f"  {page}: {slowest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,21 @@
 import streamlit as st
-import matplotlib.pyplot as plt
-import seaborn as sns
-import pandas as pd
 import numpy as np
-from datetime import date
-from utils.graph_utils import plot_distribution, plot_frequency, plot_stacked_category, plot_group_by_bar, plot_trend_over_time
+from utils.compute_utils import shared_result
+from utils.data_utils import apply_filters, filter_positions, load_data, load_daily_rollup, load_table, filter_signature
+from utils.preview_utils import PREVIEW_MIN_ROWS, stratified_sample
+from utils.render_utils import show_figure, show_plotly
+from utils.tab_utils import keep, prefetch_tabs, session_value
+from utils.table_utils import page_positions
+from utils.ui_components import sidebar_filters
+from utils import plotly_utils, preview_utils
+
+# Matplotlib, seaborn and the graph utils are imported inside the draw functions, which only run
+# when a figure isn't already in the render cache, so cached views never load them
 
 st.set_page_config(
     layout="wide",
 )
 
-@st.cache_data(show_spinner=False)
-def load_data():
-    df = pd.read_parquet("./data/mental_health_social_media_dataset_cleaned.parquet")
-    return df
- 
 if "page" not in st.session_state:
     # Initialise the page number in session state to 1
     st.session_state.page = 1
@@ -33,81 +34,31 @@ def prev_page():
     if st.session_state.page > 1:
         st.session_state.page -= 1
 
-# Load the cleaned dataset
+# Load the cleaned dataset, shared read only by every session so it must not be changed in place
 df = load_data()
 
-# Add sidebar filters
-with st.sidebar:
-    st.header(":material/filter_alt: Filters")
-
-    # Get min and max dates for date filter
-    min_date = df["date"].min().date()
-    max_date = df["date"].max().date()
-
-    # Date range filter
-    min_date = df["date"].min()
-    max_date = df["date"].max()
-
-    # Date range filter
-    date_range = st.date_input(
-        "Select Date Range",
-        value=(min_date, max_date),
-        min_value=min_date,
-        max_value=max_date,
-        format="DD/MM/YYYY",
-        on_change=reset_page
-    )
-
-    # Initialise start_date and end_date
-    start_date = None
-    end_date = None
-
-    if isinstance(date_range, tuple) and len(date_range) == 2:
-        # Set start_date and end_date based on date_range
-        start_date, end_date = date_range
-    elif isinstance(date_range, date):
-        # If date_range is a single date, set start_date and leave end_date as None
-        start_date = date_range
-        end_date = None
-
-    # gender multi select filter
-    gender = st.multiselect("Select Genders", options=["Male", "Female", "Other"],  on_change=reset_page)
-
-    # age group multi select filter
-    age_group = st.multiselect("Select Age Groups", options=['<18', '18-24', '25-34', '35-44', '45-54', '55+'], on_change=reset_page)
-
-    # platform multi select filter
-    platform = st.multiselect("Select Platforms", options=['Facebook', 'Instagram', 'Snapchat', 'TikTok', 'Twitter', 'WhatsApp', 'YouTube'], on_change=reset_page)
-
-    # mental state multi select filter
-    mental_state = st.multiselect("Select Mental States", options=['Healthy', 'Stressed', 'At Risk'], on_change=reset_page)
-    
-
-# Create a copy of the dataframe to apply filters on
-df_filtered = df.copy()
+# Add sidebar filters, turning back to the first page of the table whenever they change
+start_date, end_date, gender, age_group, platform, mental_state = sidebar_filters(df, on_change=reset_page)
 
-# Apply date range filter
-if start_date and end_date:
-    df_filtered = df_filtered[
-        (df_filtered["date"] >= pd.to_datetime(start_date)) &
-        (df_filtered["date"] <= pd.to_datetime(end_date))
-    ]
+# Apply the sidebar filters to the dataset, keeping the positions of the filtered rows for the table
+filtered_rows = filter_positions(df, start_date, end_date, gender, age_group, platform, mental_state)
+df_filtered = df.iloc[filtered_rows]
 
-# Apply gender filter
-if len(gender) > 0:
-    df_filtered = df_filtered[df_filtered["gender"].isin(gender)]
+# Apply the same filters to the daily rollup used by the trends tab
+rollup_filtered = apply_filters(load_daily_rollup(), start_date, end_date, gender, age_group, platform, mental_state)
 
-# Apply age group filter
-if len(age_group) > 0:
-    df_filtered = df_filtered[df_filtered["age_group"].isin(age_group)]
+# Signature of the filters, used as part of the render cache key
+filters = filter_signature(start_date, end_date, gender, age_group, platform, mental_state)
 
-# Apply platform filter
-if len(platform) > 0:
-    df_filtered = df_filtered[df_filtered["platform"].isin(platform)]
+# Large selections are previewed from the rollup cells' samples while their exact charts are computed
+if len(df_filtered) >= PREVIEW_MIN_ROWS:
+    sample = stratified_sample(df, rollup_filtered, start_date, end_date, gender, age_group, platform, mental_state)
+else:
+    sample = None
 
-# Apply mental state filter
-if len(mental_state) > 0:
-    df_filtered = df_filtered[df_filtered["mental_state"].isin(mental_state)]
+def previewed(build):
+    """Returns a chart's preview builder, or None if the selection is small enough to chart exactly."""
+    return None if sample is None else build
 
 # Display the count of filtered records in the sidebar
 st.sidebar.markdown(f"Filtered Records: **{len(df_filtered)}** / {len(df)}")
@@ -119,18 +70,9 @@ st.write("# " + ":material/bar_chart:" + " Data Visualisation")
 st.caption("EDA - Exploratory Data Analysis and Visualisation of the social media and mental health dataset.")
 
 
-# Create tabs for different visualisations
-tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8 = st.tabs(
-            [":material/table: Table", 
-             ":material/leaderboard: Distributions", 
-             ":material/bar_chart: Frequency Charts", 
-             ":material/grid_on: Correlations", 
-             ":material/search_insights: Category vs Numeric", 
-             ":material/looks_one: Numeric vs Numeric", 
-             ":material/category: Category vs Category", 
-             ":material/monitoring: Trends Over Time"])
-
-with tab1:
+# Each tab is a function, so only the visible tab runs on each rerun and the others can be prefetched
+def table_tab():
+    """Shows the filtered rows as a table, one page at a time."""
     st.info(":material/table: Table View of the raw data")
 
     # Define full list of fields to be displayed in the table
@@ -141,56 +83,48 @@ with tab1:
                   "anxiety_level", "stress_level", "mood_level", "mental_state"]
     
     # add multi select to pick fields to display
-    fields = st.multiselect("Select columns to display in table", options=all_fields, default=all_fields)
+    fields = st.multiselect("Select columns to display in table", **keep("table_fields", options=all_fields, default=all_fields))
 
     col1, col2, col3 = st.columns(3)
 
     with col1:
         # Add a page size slider
-        page_size = st.slider("Select number of rows per page", min_value=5, max_value=100, value=20, step=5, on_change=reset_page)
+        page_size = st.slider("Select number of rows per page", min_value=5, max_value=100, step=5,
+                              **keep("table_page_size", value=20, on_change=reset_page))
 
     with col2:
         # Sort by column dropdown
-        sort_by = st.selectbox("Sort by column", options=["None"] + fields, index=0, on_change=reset_page)
+        sort_by = st.selectbox("Sort by column", **keep("table_sort_by", options=["None"] + fields, index=0, on_change=reset_page))
 
     with col3:
         # sort order dropdown
-        sort_order = st.selectbox("Sort order", options=["Ascending", "Descending"], index=0, on_change=reset_page)
-
-    # Sort the entire dataset first
-    if sort_by != "None":
-        # Sort by selected column
-        sorted_df = df_filtered[fields].sort_values(
-            by=sort_by,
-            ascending=(sort_order == "Ascending")
-        )
-    else:
-        # Sort by index instead
-        sorted_df = df_filtered[fields].sort_index(
-            ascending=(sort_order == "Ascending")
-        )
+        sort_order = st.selectbox("Sort order", **keep("table_sort_order", options=["Ascending", "Descending"], index=0, on_change=reset_page))
 
     # Pagination setup
-    total_rows = len(sorted_df)
+    total_rows = len(filtered_rows)
     total_pages = max(1, (total_rows + page_size - 1) // page_size)
     
     # Clamp page to valid range
-    if st.session_state.page > total_pages:
-        st.session_state.page = total_pages
-    if st.session_state.page < 1:
-        st.session_state.page = 1
-
-    page = st.session_state.page
+    page = min(max(session_value("page", 1), 1), total_pages)
+    st.session_state.page = page
 
     start = (page - 1) * page_size
     end = start + page_size
-    page_df = sorted_df.iloc[start:end].copy()
 
-    if "date" in page_df.columns:
-        page_df["date"] = page_df["date"].dt.strftime("%d/%m/%Y")
+    # Get the rows on this page from the cached sort order, so page turns don't re-sort the table
+    positions = page_positions(df, filtered_rows, sort_by, sort_order == "Ascending", filters, start, end)
 
-    # Display
-    st.dataframe(page_df, width="stretch", height=600)
+    # Gather only the selected columns of the rows on this page from the shared Arrow table
+    page_df = load_table().select(fields).take(positions).to_pandas()
+    page_df.index = df.index[positions]
+
+    # Display, the browser formats the dates so they don't need converting to strings here
+    st.dataframe(
+        page_df,
+        width="stretch",
+        height=600,
+        column_config={"date": st.column_config.DateColumn(format="DD/MM/YYYY")}
+    )
 
     info_col, buttons_col = st.columns(2)
 
@@ -217,25 +151,26 @@ with tab1:
             )
         
 
-with tab2:
+def distributions_tab():
+    """Shows the distributions of the numerical features."""
     st.info(":material/leaderboard: Distributions of numerical features")
 
     # Define numerical fields for distribution plots
     dist_fields = [ "age", "daily_screen_time_min", "social_media_time_min", "sleep_hours", "physical_activity_min" ]
 
     # add multi select to pick fields to plot distributions for numerical features
-    fields = st.multiselect("Select numerical features to plot distributions", options=dist_fields, default=dist_fields)
+    fields = st.multiselect("Select numerical features to plot distributions", **keep("distributions_fields", options=dist_fields, default=dist_fields))
     
     col1, col2 = st.columns(2)
 
     with col1:
         # Add a chart type dropdown
-        chart_type = st.selectbox("Select chart type", ["Histogram", "Histogram & KDE", "Violin Plot", "Box Plot", "Violin Plot & Box Plot"])
+        chart_type = st.selectbox("Select chart type", **keep("distributions_chart_type", options=["Histogram", "Histogram & KDE", "Violin Plot", "Box Plot", "Violin Plot & Box Plot"], index=0))
 
     with col2:
         # Add a bin size slider thats only visible if chart type is histogram or histogram & kde
         if chart_type in ["Histogram", "Histogram & KDE"]:
-            bin_size = st.slider("Select bin size for histogram", min_value=1, max_value=100, value=30, step=1)
+            bin_size = st.slider("Select bin size for histogram", min_value=1, max_value=100, step=1, **keep("distributions_bin_size", value=30))
         else:
             bin_size = None
     
@@ -246,14 +181,14 @@ with tab2:
 
         with col1:
             # Add skewness sub title toggle
-            on = st.toggle("Add skewness", value=False)
+            on = st.toggle("Add skewness", **keep("distributions_skewness", value=False))
             if on:
                 show_skewness = True
             else:
                 show_skewness = False
         with col2:
             # Add kurtosis sub title toggle
-            on = st.toggle("Add kurtosis", value=False)
+            on = st.toggle("Add kurtosis", **keep("distributions_kurtosis", value=False))
             if on:
                 show_kurtosis = True
             else:
@@ -261,7 +196,7 @@ with tab2:
 
         with col3:
             # Add count toggle
-            on = st.toggle("Add count", value=False)
+            on = st.toggle("Add count", **keep("distributions_count", value=False))
             if on:
                 show_count = True
             else:
@@ -271,7 +206,7 @@ with tab2:
 
         with col1:
             # Add standard deviation line dropdown
-            on = st.toggle("Add 1st Quartile Line", value=False)
+            on = st.toggle("Add 1st Quartile Line", **keep("distributions_q1", value=False))
             if on:
                 show_q1 = True
             else:
@@ -279,7 +214,7 @@ with tab2:
 
         with col2:
             # Add show 3rd quartile line toggle
-            on = st.toggle("Add 3rd Quartile Line", value=False)
+            on = st.toggle("Add 3rd Quartile Line", **keep("distributions_q3", value=False))
             if on:
                 show_q3 = True
             else:
@@ -287,7 +222,7 @@ with tab2:
 
         with col3:
             # Add IQR line toggle
-            on = st.toggle("Add IQR Line", value=False)
+            on = st.toggle("Add IQR Line", **keep("distributions_iqr", value=False))
             if on:
                 show_iqr = True
             else:
@@ -299,7 +234,7 @@ with tab2:
 
         with col1:
             # Add mean line toggle
-            on = st.toggle("Add Mean Line", value=False)
+            on = st.toggle("Add Mean Line", **keep("distributions_mean", value=False))
             if on:
                 show_mean = True
             else:
@@ -307,7 +242,7 @@ with tab2:
 
         with col2:
             # Add median line toggle
-            on = st.toggle("Add Median Line", value=False)
+            on = st.toggle("Add Median Line", **keep("distributions_median", value=False))
             if on:
                 show_median = True
             else:
@@ -315,57 +250,98 @@ with tab2:
 
         with col3:
             # Add standard deviation line dropdown
-            std_line = st.selectbox("Add Standard Deviation Line", ["None", "1 SD", "2 SD", "3 SD"])
-
-    # Create subplots based on number of fields selected to change the grid layout dynamically
-    match len(fields):
-        case 0 | 1:
-            fig, ax = plt.subplots(1, 1, figsize=(20, 10))
-        case 2:
-            fig, ax = plt.subplots(1, 2, figsize=(20, 10))
-        case 3 | 4:
-            fig, ax = plt.subplots(2, 2, figsize=(20, 10))
-        case 5:
-            fig, ax = plt.subplots(2, 3, figsize=(20, 10))
-
-    if isinstance(ax, np.ndarray):
-        # Flatten the 2D array of axes to 1D for easier indexing
-        ax = ax.flatten()
-    else:
-        # is only one plot, convert to list so for loop works
-        ax = [ax]
-
-    # for each field, plot the distribution
-    for i, field in enumerate(fields):
-        # call the plot distribution function from graph_utils to draw that fields distribution
-        plot_distribution(
-                axes=ax[i],
-                type=chart_type,
-                df=df_filtered,
-                column=field,
-                bins=bin_size,
-                kde=(chart_type == "Histogram & KDE"),
-                mean=show_mean,
-                median=show_median,
-                std=std_line,
-                q1=show_q1,
-                q3=show_q3,
-                iqr=show_iqr,
-                skew=show_skewness,
-                kurtosis=show_kurtosis,
-                count=show_count
-            )
+            std_line = st.selectbox("Add Standard Deviation Line", **keep("distributions_std_line", options=["None", "1 SD", "2 SD", "3 SD"], index=0))
+
+    def draw_distributions():
+        """Draws the distribution plots for the selected fields."""
+        import matplotlib.pyplot as plt
+        from utils.graph_utils import plot_distribution
+        # Create subplots based on number of fields selected to change the grid layout dynamically
+        match len(fields):
+            case 0 | 1:
+                fig, ax = plt.subplots(1, 1, figsize=(20, 10))
+            case 2:
+                fig, ax = plt.subplots(1, 2, figsize=(20, 10))
+            case 3 | 4:
+                fig, ax = plt.subplots(2, 2, figsize=(20, 10))
+            case 5:
+                fig, ax = plt.subplots(2, 3, figsize=(20, 10))
+
+        if isinstance(ax, np.ndarray):
+            # Flatten the 2D array of axes to 1D for easier indexing
+            ax = ax.flatten()
+        else:
+            # is only one plot, convert to list so for loop works
+            ax = [ax]
+
+        # for each field, plot the distribution
+        for i, field in enumerate(fields):
+            # call the plot distribution function from graph_utils to draw that fields distribution
+            plot_distribution(
+                    axes=ax[i],
+                    type=chart_type,
+                    df=df_filtered,
+                    column=field,
+                    bins=bin_size,
+                    kde=(chart_type == "Histogram & KDE"),
+                    mean=show_mean,
+                    median=show_median,
+                    std=std_line,
+                    q1=show_q1,
+                    q3=show_q3,
+                    iqr=show_iqr,
+                    skew=show_skewness,
+                    kurtosis=show_kurtosis,
+                    count=show_count
+                )
     
-    # Hide unused subplots to make the layout cleaner
-    if(len(fields) == 0):
-        ax[0].set_visible(False)
-    else:
-        for j in range(i + 1, len(ax)):
-            ax[j].set_visible(False)
+        # Hide unused subplots to make the layout cleaner
+        if(len(fields) == 0):
+            ax[0].set_visible(False)
+        else:
+            for j in range(i + 1, len(ax)):
+                ax[j].set_visible(False)
 
-    # Adjust layout
-    plt.tight_layout()
-    st.pyplot(fig)
+        # Adjust layout
+        plt.tight_layout()
+        return fig
+
+    if plotly_utils.CHART_BACKEND == "plotly":
+        # Send the pre-aggregated data to the browser, two charts per row
+        cols = st.columns(2)
+        for i, field in enumerate(fields):
+            with cols[i % 2]:
+                options = dict(
+                    type=chart_type,
+                    column=field,
+                    bins=bin_size,
+                    kde=(chart_type == "Histogram & KDE"),
+                    mean=show_mean,
+                    median=show_median,
+                    std=std_line,
+                    q1=show_q1,
+                    q3=show_q3,
+                    iqr=show_iqr,
+                    skew=show_skewness,
+                    kurtosis=show_kurtosis,
+                    count=show_count
+                )
+                # Aggregated once for every session showing the same chart, the options are bound
+                # as the chart may be built in the background after the loop has moved on
+                show_plotly("plotly_distribution", options, filters,
+                            lambda options=options: plotly_utils.plot_distribution(df=df_filtered, **options),
+                            preview=previewed(lambda field=field: preview_utils.preview_distribution(sample, [field], chart_type, bin_size)))
+    else:
+        # Display the figure, reusing the cached image if these options have been drawn before
+        show_figure(
+            "distributions",
+            dict(fields=fields, chart_type=chart_type, bin_size=bin_size, show_mean=show_mean, show_median=show_median,
+                 std_line=std_line, show_q1=show_q1, show_q3=show_q3, show_iqr=show_iqr,
+                 show_skewness=show_skewness, show_kurtosis=show_kurtosis, show_count=show_count),
+            filters,
+            draw_distributions,
+            preview=previewed(lambda: preview_utils.preview_distribution(sample, fields, chart_type, bin_size))
+        )
 
     # Warning for IQR lines with box plots
     if(chart_type in ["Box Plot", "Violin Plot & Box Plot"] and show_iqr == True):
@@ -373,7 +349,8 @@ with tab2:
 
         
 
-with tab3:
+def frequencies_tab():
+    """Shows the frequency charts of the categorical features."""
     st.info(":material/bar_chart: Frequency Charts for categorical features")
 
     # Define fields for frequency plots
@@ -383,63 +360,83 @@ with tab3:
 
     # add multi select to pick fields to plot frequencies for features
     fields = st.multiselect("Select features to plot frequencies", 
-                            options=freq_fields, 
-                            default=[f for f in freq_fields if f not in ["interaction_negative_ratio", "week_number"]])
+                            **keep("frequencies_fields",
+                                   options=freq_fields, 
+                                   default=[f for f in freq_fields if f not in ["interaction_negative_ratio", "week_number"]]))
     
     
     # Add a toggle for including percentages
-    include_percentages = st.toggle("Include percentages on bars", value=False)
-
-    # Create subplots based on number of fields selected to change the grid layout dynamically
-    match len(fields):
-        case 0 | 1:
-            fig, ax = plt.subplots(1, 1, figsize=(20, 10))
-        case 2:
-            fig, ax = plt.subplots(1, 2, figsize=(20, 10))
-        case 3 | 4:
-            fig, ax = plt.subplots(2, 2, figsize=(20, 12))
-        case 5 | 6:
-            fig, ax = plt.subplots(3, 2, figsize=(20, 15))
-        case 7 | 8:
-            fig, ax = plt.subplots(4, 2, figsize=(20, 18))
-        case 9 | 10:
-            fig, ax = plt.subplots(5, 2, figsize=(20, 20))
-        case 11 | 12:
-            fig, ax = plt.subplots(6, 2, figsize=(20, 25))
-        case 13 | 14:
-            fig, ax = plt.subplots(7, 2, figsize=(20, 30))
+    include_percentages = st.toggle("Include percentages on bars", **keep("frequencies_percentages", value=False))
+
+    def draw_frequencies():
+        """Draws the frequency charts for the selected fields."""
+        import matplotlib.pyplot as plt
+        from utils.graph_utils import plot_frequency
+        # Create subplots based on number of fields selected to change the grid layout dynamically
+        match len(fields):
+            case 0 | 1:
+                fig, ax = plt.subplots(1, 1, figsize=(20, 10))
+            case 2:
+                fig, ax = plt.subplots(1, 2, figsize=(20, 10))
+            case 3 | 4:
+                fig, ax = plt.subplots(2, 2, figsize=(20, 12))
+            case 5 | 6:
+                fig, ax = plt.subplots(3, 2, figsize=(20, 15))
+            case 7 | 8:
+                fig, ax = plt.subplots(4, 2, figsize=(20, 18))
+            case 9 | 10:
+                fig, ax = plt.subplots(5, 2, figsize=(20, 20))
+            case 11 | 12:
+                fig, ax = plt.subplots(6, 2, figsize=(20, 25))
+            case 13 | 14:
+                fig, ax = plt.subplots(7, 2, figsize=(20, 30))
         
 
-    if isinstance(ax, np.ndarray):
-        # Flatten the 2D array of axes to 1D for easier indexing
-        ax = ax.flatten()
-    else:
-        # is only one plot, convert to list so for loop works
-        ax = [ax]
-
-    # for each field, plot the frequency
-    for i, field in enumerate(fields):
-        # call the plot frequency function from graph_utils to draw that fields frequency
-        plot_frequency(
-            axes=ax[i],
-            df=df_filtered,
-            column=field,
-            percentage_label=include_percentages
-        )
+        if isinstance(ax, np.ndarray):
+            # Flatten the 2D array of axes to 1D for easier indexing
+            ax = ax.flatten()
+        else:
+            # is only one plot, convert to list so for loop works
+            ax = [ax]
+
+        # for each field, plot the frequency
+        for i, field in enumerate(fields):
+            # call the plot frequency function from graph_utils to draw that fields frequency
+            plot_frequency(
+                axes=ax[i],
+                df=df_filtered,
+                column=field,
+                percentage_label=include_percentages
+            )
     
-    # Hide unused subplots to make the layout cleaner
-    if(len(fields) == 0):
-        ax[0].set_visible(False)
-    else:
-        for j in range(i + 1, len(ax)):
-            ax[j].set_visible(False)
+        # Hide unused subplots to make the layout cleaner
+        if(len(fields) == 0):
+            ax[0].set_visible(False)
+        else:
+            for j in range(i + 1, len(ax)):
+                ax[j].set_visible(False)
 
-    # Adjust layout
-    plt.tight_layout()
-    st.pyplot(fig)
+        # Adjust layout
+        plt.tight_layout()
+        return fig
+
+    if plotly_utils.CHART_BACKEND == "plotly":
+        # Send only the category counts to the browser, two charts per row
+        cols = st.columns(2)
+        for i, field in enumerate(fields):
+            with cols[i % 2]:
+                options = dict(column=field, percentage_label=include_percentages)
+                show_plotly("plotly_frequency", options, filters,
+                            lambda options=options: plotly_utils.plot_frequency(df=df_filtered, **options),
+                            preview=previewed(lambda field=field: preview_utils.preview_frequency(sample, [field])))
+    else:
+        # Display the figure, reusing the cached image if these options have been drawn before
+        show_figure("frequencies", dict(fields=fields, include_percentages=include_percentages), filters, draw_frequencies,
+                    preview=previewed(lambda: preview_utils.preview_frequency(sample, fields)))
     
 
-with tab4:
+def correlations_tab():
+    """Shows the correlations between the numerical features."""
     st.info(":material/grid_on: Correlation Matrix and Heatmaps")
 
     # Define numerical fields for correlation
@@ -449,18 +446,19 @@ with tab4:
 
     # add multi select to pick fields to plot correlations
     fields = st.multiselect("Select numerical features to compute correlations", 
-                           options=numeric_fields, 
-                           default=[f for f in numeric_fields if f not in ['year', 'month', 'week_number']])
+                           **keep("correlations_fields",
+                                  options=numeric_fields, 
+                                  default=[f for f in numeric_fields if f not in ['year', 'month', 'week_number']]))
     
     col1, col2 = st.columns(2)
 
     with col1:
         # Add a chart type dropdown
-        type = st.selectbox("Select chart type", ["Heatmap", "Correlation Matrix"])
+        type = st.selectbox("Select chart type", **keep("correlations_chart_type", options=["Heatmap", "Correlation Matrix"], index=0))
 
     with col2:
         # Add a correlation method dropdown
-        method = st.selectbox("Select correlation method", ["Pearson", "Spearman", "Kendall"])
+        method = st.selectbox("Select correlation method", **keep("correlations_method", options=["Pearson", "Spearman", "Kendall"], index=0))
 
     col1, col2 = st.columns(2)
 
@@ -472,7 +470,7 @@ with tab4:
             decimal_options = ["0", "1", "2", "3", "4", "5"]
 
         # User selects number of decimals
-        decimals = st.selectbox("Number format, the number of decimal places:", decimal_options, index=2 if type=="Heatmap" else 2)
+        decimals = st.selectbox("Number format, the number of decimal places:", **keep("correlations_decimals", options=decimal_options, index=2 if type=="Heatmap" else 2))
  
     with col2:
         if type == "Heatmap":
@@ -485,7 +483,7 @@ with tab4:
                                 {"name": "Magma", "value": "magma"},
                             ]
             # User selects colour name
-            colour_name = st.selectbox("Select colour for Heatmap", [c["name"] for c in colours_list])
+            colour_name = st.selectbox("Select colour for Heatmap", **keep("correlations_colour", options=[c["name"] for c in colours_list], index=0))
 
             # Get colour map value
             colour_map = next(c["value"] for c in colours_list if c["name"] == colour_name)
@@ -501,44 +499,62 @@ with tab4:
         table_fmt = f"{{:.{decimals}f}}"
 
     if len(fields) >= 2:
-        # Calculate the correlation values using the selected method
-        corr = df_filtered[fields].corr(method=method.lower())
+        def correlations():
+            """Calculates the correlation values using the selected method, once for every session."""
+            return shared_result("correlations", dict(fields=fields, method=method), filters,
+                                 lambda: df_filtered[fields].corr(method=method.lower()))
 
         if (type == "Heatmap"):
-            # set figure size
-            plt.figure(figsize=(12, 12))
-
-            # Create a heatmap to visually show the correlation
-            sns.heatmap(
-                corr,
-                cmap=colour_map,
-                square=True,
-                linewidths=1,
-                linecolor="white",
-                annot=show_values,
-                fmt=fmt,
+            def draw_heatmap(corr):
+                """Draws the correlation heatmap."""
+                import matplotlib.pyplot as plt
+                import seaborn as sns
+                # set figure size
+                fig = plt.figure(figsize=(12, 12))
+
+                # Create a heatmap to visually show the correlation
+                sns.heatmap(
+                    corr,
+                    cmap=colour_map,
+                    square=True,
+                    linewidths=1,
+                    linecolor="white",
+                    annot=show_values,
+                    fmt=fmt,
+                )
+                # Add a title
+                plt.title("Correlation Matrix" + f"\n({method} Method)", fontsize=16)
+                plt.tight_layout()
+                return fig
+
+            # Display the figure, reusing the cached image if these options have been drawn before. The
+            # correlations are calculated with the drawing, so a large selection shows its preview meanwhile
+            show_figure(
+                "correlation_heatmap",
+                dict(fields=fields, method=method, colour_map=colour_map, decimals=decimals),
+                filters,
+                draw_heatmap,
+                preview=previewed(lambda: preview_utils.preview_correlations(sample, fields, method, colour_map)),
+                prepare=correlations
             )
-            # Add a title
-            plt.title("Correlation Matrix" + f"\n({method} Method)", fontsize=16)
-            plt.tight_layout()
-            st.pyplot(plt)
         else:
             # Add a matrix title
             st.markdown("**Correlation Matrix**" + f" - ({method} Method)")
             # Display the correlation matrix as a styled dataframe
-            st.dataframe(corr.style.format(table_fmt), width="stretch")
+            st.dataframe(correlations().style.format(table_fmt), width="stretch")
     else:
         # Display a warning if less than two features are selected
         st.warning("Please select at least two numerical features to compute correlations.")
 
-with tab5:
+def category_vs_numeric_tab():
+    """Compares a numerical feature across the values of a category."""
     st.info(":material/search_insights: Comparing category vs numeric visualisations")
 
      # Define numerical fields for distribution plots
     numeric_fields = [ "age", "daily_screen_time_min", "social_media_time_min", "sleep_hours", "physical_activity_min" ]
 
     # add multi select to pick fields to plot
-    fields = st.multiselect("Select numerical features", options=numeric_fields)
+    fields = st.multiselect("Select numerical features", **keep("category_vs_numeric_fields", options=numeric_fields, default=[]))
 
     col1, col2 = st.columns(2)
 
@@ -547,56 +563,84 @@ with tab5:
         category_fields = [ 'platform', 'age_group', 'gender', 'mental_state', 'anxiety_level', 'stress_level', 'mood_level' ]
 
         # add dropdown to select category
-        category = st.selectbox("Select Category", options=category_fields, index=0)
+        category = st.selectbox("Select Category", **keep("category_vs_numeric_category", options=category_fields, index=0))
 
     with col2:
         if len(fields) == 0:
             chart_type = None
         else:
             # add dropdown to select chart type
-            chart_type = st.selectbox("Select chart type", ["Box Plot", "Violin Plot", "Bar Chart"] if len(fields) == 1 else ["Grouped Bar Chart"], index=0)
-
-    fig = plt.figure(figsize=(12, 8))
-    ax = fig.add_subplot(1, 1, 1)
-
-    match chart_type:
-        case "Box Plot":
-            # Add a box plot
-            sns.boxplot(data=df, x=category, y=fields[0], color="skyblue", ax=ax)
-            # Add a title and labels
-            ax.set_title(f"{fields[0].replace('_', ' ').title()} by {category.replace('_', ' ').title()}", fontsize=16)
-            ax.set_xlabel(category.replace('_', ' ').title())
-            ax.set_ylabel(fields[0].replace('_', ' ').title())
-        case "Violin Plot":
-            # Add a violin plot
-            sns.violinplot(data=df, x=category, y=fields[0], inner="quartile", color="skyblue", legend=False, ax=ax)
-            # Add a title and labels
-            ax.set_title(f"{fields[0].replace('_', ' ').title()} by {category.replace('_', ' ').title()}", fontsize=16)
-            ax.set_xlabel(category.replace('_', ' ').title())
-            ax.set_ylabel(fields[0].replace('_', ' ').title())
-        case "Bar Chart":
-            # Add a bar chart
-            sns.barplot(data=df, x=category, y=fields[0], color="skyblue", ax=ax)
-            # Add a title and labels
-            ax.set_title(f"{fields[0].replace('_', ' ').title()} by {category.replace('_', ' ').title()}", fontsize=16)
-            ax.set_xlabel(category.replace('_', ' ').title())
-            ax.set_ylabel(fields[0].replace('_', ' ').title())
-        case "Grouped Bar Chart":
-            plot_group_by_bar(
-                axes=ax,
-                df=df_filtered,
-                columns=fields,
-                group_by=category,
-                title=f"Comparison of " + ", ".join([f.replace('_', ' ').title() for f in fields]) + f" by {category.replace('_', ' ').title()}"
-            )
-    if chart_type is not None:
+            chart_type = st.selectbox("Select chart type", **keep("category_vs_numeric_chart_type", options=["Box Plot", "Violin Plot", "Bar Chart"] if len(fields) == 1 else ["Grouped Bar Chart"], index=0))
+
+    def draw_category_vs_numeric():
+        """Draws the selected category vs numeric chart."""
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        from utils.graph_utils import plot_group_by_bar
+        fig = plt.figure(figsize=(12, 8))
+        ax = fig.add_subplot(1, 1, 1)
+
+        match chart_type:
+            case "Box Plot":
+                # Add a box plot
+                sns.boxplot(data=df_filtered, x=category, y=fields[0], color="skyblue", ax=ax)
+                # Add a title and labels
+                ax.set_title(f"{fields[0].replace('_', ' ').title()} by {category.replace('_', ' ').title()}", fontsize=16)
+                ax.set_xlabel(category.replace('_', ' ').title())
+                ax.set_ylabel(fields[0].replace('_', ' ').title())
+            case "Violin Plot":
+                # Add a violin plot
+                sns.violinplot(data=df_filtered, x=category, y=fields[0], inner="quartile", color="skyblue", legend=False, ax=ax)
+                # Add a title and labels
+                ax.set_title(f"{fields[0].replace('_', ' ').title()} by {category.replace('_', ' ').title()}", fontsize=16)
+                ax.set_xlabel(category.replace('_', ' ').title())
+                ax.set_ylabel(fields[0].replace('_', ' ').title())
+            case "Bar Chart":
+                # Add a bar chart
+                sns.barplot(data=df_filtered, x=category, y=fields[0], color="skyblue", ax=ax)
+                # Add a title and labels
+                ax.set_title(f"{fields[0].replace('_', ' ').title()} by {category.replace('_', ' ').title()}", fontsize=16)
+                ax.set_xlabel(category.replace('_', ' ').title())
+                ax.set_ylabel(fields[0].replace('_', ' ').title())
+            case "Grouped Bar Chart":
+                plot_group_by_bar(
+                    axes=ax,
+                    df=df_filtered,
+                    columns=fields,
+                    group_by=category,
+                    title=f"Comparison of " + ", ".join([f.replace('_', ' ').title() for f in fields]) + f" by {category.replace('_', ' ').title()}"
+                )
         plt.tight_layout()
-        st.pyplot(fig)
+        return fig
+
+    if chart_type == "Grouped Bar Chart" and plotly_utils.CHART_BACKEND == "plotly":
+        # Send only the group means to the browser
+        options = dict(
+            columns=fields,
+            group_by=category,
+            title=f"Comparison of " + ", ".join([f.replace('_', ' ').title() for f in fields]) + f" by {category.replace('_', ' ').title()}"
+        )
+        show_plotly("plotly_group_by_bar", options, filters,
+                    lambda: plotly_utils.plot_group_by_bar(df=df_filtered, **options),
+                    preview=previewed(lambda: preview_utils.preview_category_vs_numeric(sample, chart_type, fields, category, options["title"])))
+    elif chart_type is not None:
+        # Display the figure, reusing the cached image if these options have been drawn before
+        show_figure(
+            "category_vs_numeric",
+            dict(fields=fields, category=category, chart_type=chart_type),
+            filters,
+            draw_category_vs_numeric,
+            preview=previewed(lambda: preview_utils.preview_category_vs_numeric(
+                sample, chart_type, fields, category,
+                f"{fields[0].replace('_', ' ').title()} by {category.replace('_', ' ').title()}" if len(fields) == 1
+                else f"Comparison of " + ", ".join([f.replace('_', ' ').title() for f in fields]) + f" by {category.replace('_', ' ').title()}"))
+        )
     else:
         st.warning("Please select at least one numerical feature to plot. More chart types become available when only one numerical feature is selected.")
 
 
-with tab6:
+def numeric_vs_numeric_tab():
+    """Compares two numerical features as a scatter plot."""
     st.info( ":material/looks_one: Comparing numeric vs numeric visualisations as a scatter plot")
 
     st.caption("Comparing numeric vs numeric visualisations as a scatter plot.")
@@ -611,43 +655,51 @@ with tab6:
 
     with col1:
         # add dropdown to select x axis
-        x_axis = st.selectbox("Select X-Axis", options=numeric_fields, index=0)
+        x_axis = st.selectbox("Select X-Axis", **keep("numeric_vs_numeric_x_axis", options=numeric_fields, index=0))
     
     with col2:
         # add dropdown to select y axis
-        y_axis = st.selectbox("Select Y-Axis", options=numeric_fields, index=1)
+        y_axis = st.selectbox("Select Y-Axis", **keep("numeric_vs_numeric_y_axis", options=numeric_fields, index=1))
 
     col1, col2 = st.columns(2)
 
     with col1:
         # add dropdown to select hue
-        hue = st.selectbox("Select Category to Colour (Optional)", options=["None"] + category_fields, index=0)
-
-    # create figure
-    fig = plt.figure(figsize=(12, 8))
-
-    # create scatter plot
-    sns.scatterplot(
-        data=df_filtered,
-        x=x_axis,
-        y=y_axis,
-        hue=None if hue == "None" else hue,
-        palette=None if hue == "None" else "Set2",
-        alpha=0.7
-    )
+        hue = st.selectbox("Select Category to Colour (Optional)", **keep("numeric_vs_numeric_hue", options=["None"] + category_fields, index=0))
+
+    def draw_scatter():
+        """Draws the numeric vs numeric scatter plot."""
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        # create figure
+        fig = plt.figure(figsize=(12, 8))
+
+        # create scatter plot
+        sns.scatterplot(
+            data=df_filtered,
+            x=x_axis,
+            y=y_axis,
+            hue=None if hue == "None" else hue,
+            palette=None if hue == "None" else "Set2",
+            alpha=0.7
+        )
+
+        # Add a title
+        plt.title(f"{x_axis.replace('_', ' ').title()} vs {y_axis.replace('_', ' ').title()}", fontsize=16)
+        plt.tight_layout()
 
-    # Add a title
-    plt.title(f"{x_axis.replace('_', ' ').title()} vs {y_axis.replace('_', ' ').title()}", fontsize=16)
-    plt.tight_layout()
+        # set axis labels
+        plt.xlabel(x_axis.replace('_', ' ').title())
+        plt.ylabel(y_axis.replace('_', ' ').title())
 
-    # set axis labels
-    plt.xlabel(x_axis.replace('_', ' ').title())
-    plt.ylabel(y_axis.replace('_', ' ').title())
+        return fig
 
-    # display figure
-    st.pyplot(fig)
+    # Display the figure, reusing the cached image if these options have been drawn before
+    show_figure("numeric_vs_numeric", dict(x_axis=x_axis, y_axis=y_axis, hue=hue), filters, draw_scatter,
+                preview=previewed(lambda: preview_utils.preview_scatter(sample, x_axis, y_axis, hue)))
 
-with tab7:
+def category_vs_category_tab():
+    """Compares two categories as a stacked bar chart."""
     st.info(":material/category: Comparing category vs category visualisation as a stacked bar chart")
 
     # define category fields that can be selected
@@ -657,70 +709,90 @@ with tab7:
 
     with col1:
         # add dropdown to select x axis
-        x_axis = st.selectbox("Select X-Axis category", options=category_fields[:-3], index=0)
+        x_axis = st.selectbox("Select X-Axis category", **keep("category_vs_category_x_axis", options=category_fields[:-3], index=0))
     
     with col2:
         # add dropdown to select y axis
-        colour_category = st.selectbox("Select colour category", options=category_fields, index=1)
+        colour_category = st.selectbox("Select colour category", **keep("category_vs_category_colour", options=category_fields, index=1))
 
     if x_axis == colour_category:
         st.warning("Please select different categories for X-Axis and Colour.")
     else:
-        # create figure
-        fig = plt.figure(figsize=(12, 8))
-        ax = fig.add_subplot(1, 1, 1)
-
-        # create stacked bar chart
-        plot_stacked_category(
-            axes=ax,
-            df=df_filtered,
-            group_one=x_axis,
-            group_two=colour_category,
-            title=f"{x_axis.replace('_', ' ').title()} vs {colour_category.replace('_', ' ').title()}"
-        )
-
-        # display figure
-        st.pyplot(fig)
-
-with tab8:
+        def draw_stacked():
+            """Draws the category vs category stacked bar chart."""
+            import matplotlib.pyplot as plt
+            from utils.graph_utils import plot_stacked_category
+            # create figure
+            fig = plt.figure(figsize=(12, 8))
+            ax = fig.add_subplot(1, 1, 1)
+
+            # create stacked bar chart
+            plot_stacked_category(
+                axes=ax,
+                df=df_filtered,
+                group_one=x_axis,
+                group_two=colour_category,
+                title=f"{x_axis.replace('_', ' ').title()} vs {colour_category.replace('_', ' ').title()}"
+            )
+            return fig
+
+        if plotly_utils.CHART_BACKEND == "plotly":
+            # Send only the proportions to the browser
+            options = dict(
+                group_one=x_axis,
+                group_two=colour_category,
+                title=f"{x_axis.replace('_', ' ').title()} vs {colour_category.replace('_', ' ').title()}"
+            )
+            show_plotly("plotly_stacked_category", options, filters,
+                        lambda: plotly_utils.plot_stacked_category(df=df_filtered, **options),
+                        preview=previewed(lambda: preview_utils.preview_stacked_category(sample, **options)))
+        else:
+            # Display the figure, reusing the cached image if these options have been drawn before
+            show_figure("category_vs_category", dict(x_axis=x_axis, colour_category=colour_category), filters, draw_stacked,
+                        preview=previewed(lambda: preview_utils.preview_stacked_category(
+                            sample, x_axis, colour_category,
+                            f"{x_axis.replace('_', ' ').title()} vs {colour_category.replace('_', ' ').title()}")))
+
+def trends_tab():
+    """Shows the trends of the numerical features over time."""
     st.info(":material/monitoring: Trends Over Time visualisations, with options for aggregation and rolling averages")
 
     # Define numerical fields for trend over time plots
     available_fields = [ "daily_screen_time_min", "social_media_time_min", "sleep_hours", "physical_activity_min" ]
 
     # add multi select to pick fields to plot
-    fields = st.multiselect("Select features", options=available_fields)
+    fields = st.multiselect("Select features", **keep("trends_fields", options=available_fields, default=[]))
 
     col1, col2 = st.columns(2)
 
     with col1:
         # sample frequency dropdown
-        frequency = st.selectbox("Select sample frequency", ["Daily", "Weekly", "Monthly"], index=1)
+        frequency = st.selectbox("Select sample frequency", **keep("trends_frequency", options=["Daily", "Weekly", "Monthly"], index=1))
 
     with col2:
         # select aggregation method
-        aggregation_method = st.selectbox("Select aggregation method", ["Mean", "Median", "Sum"], index=0)
+        aggregation_method = st.selectbox("Select aggregation method", **keep("trends_aggregation", options=["Mean", "Median", "Sum"], index=0))
 
     col1, col2, col3 = st.columns(3)
 
     with col1:
         # Force y-axis to start at 0 toggle
-        force_y_zero = st.toggle("Force Y-Axis to start at 0", value=False)
+        force_y_zero = st.toggle("Force Y-Axis to start at 0", **keep("trends_force_y_zero", value=False))
      
     with col2:
         # Show variability band toggle
-        show_variability = st.toggle("Show Variability Band", value=False)
+        show_variability = st.toggle("Show Variability Band", **keep("trends_variability", value=False))
     
     with col3:
         # show rolling average
-        show_rolling_average = st.toggle("Show Rolling Average", value=False)
+        show_rolling_average = st.toggle("Show Rolling Average", **keep("trends_rolling_average", value=False))
 
     col1, col2 = st.columns(2)
 
     with col1:
         # rolling window size slider
         if show_rolling_average:
-            rolling_window = st.slider("Rolling window size (periods)", 2, 12, 4)        
+            rolling_window = st.slider("Rolling window size (periods)", 2, 12, **keep("trends_rolling_window", value=4))        
         else:        
             rolling_window = None
     
@@ -728,22 +800,69 @@ with tab8:
     if len(fields) == 0:
         st.warning("Please select at least one feature to plot.")
     else:
-        # create figure
-        fig = plt.figure(figsize=(12, 8))
-        ax = fig.add_subplot(1, 1, 1)
+        def draw_trends():
+            """Draws the trends over time plot."""
+            import matplotlib.pyplot as plt
+            from utils.graph_utils import plot_trend_over_time
+            # create figure
+            fig = plt.figure(figsize=(12, 8))
+            ax = fig.add_subplot(1, 1, 1)
+
+            # create trend over time plot
+            plot_trend_over_time(
+                ax=ax,
+                df=df_filtered,
+                fields=fields,
+                frequency=frequency,
+                aggregation_method=aggregation_method,
+                force_y_zero=force_y_zero,
+                show_variability=show_variability,
+                show_rolling_average=show_rolling_average,
+                rolling_window=rolling_window,
+                rollup=rollup_filtered
+            )
+            return fig
+
+        if plotly_utils.CHART_BACKEND == "plotly":
+            # Send only the resampled series to the browser
+            options = dict(
+                fields=fields,
+                frequency=frequency,
+                aggregation_method=aggregation_method,
+                force_y_zero=force_y_zero,
+                show_variability=show_variability,
+                show_rolling_average=show_rolling_average,
+                rolling_window=rolling_window
+            )
+            # Trends are read from the daily rollup rather than the rows, so they are quick enough not to need a preview
+            show_plotly("plotly_trend_over_time", options, filters,
+                        lambda: plotly_utils.plot_trend_over_time(df=df_filtered, rollup=rollup_filtered, **options))
+        else:
+            # Display the figure, reusing the cached image if these options have been drawn before
+            show_figure(
+                "trends_over_time",
+                dict(fields=fields, frequency=frequency, aggregation_method=aggregation_method, force_y_zero=force_y_zero,
+                     show_variability=show_variability, show_rolling_average=show_rolling_average, rolling_window=rolling_window),
+                filters,
+                draw_trends
+            )
 
-        # create trend over time plot
-        plot_trend_over_time(
-            ax=ax,
-            df=df_filtered,
-            fields=fields,
-            frequency=frequency,
-            aggregation_method=aggregation_method,
-            force_y_zero=force_y_zero,
-            show_variability=show_variability,
-            show_rolling_average=show_rolling_average,
-            rolling_window=rolling_window
-        )
-        # display figure
-        st.pyplot(fig)
 
+# Tab names shown in the tab bar, with the function that shows each
+TABS = {
+    ":material/table: Table": table_tab,
+    ":material/leaderboard: Distributions": distributions_tab,
+    ":material/bar_chart: Frequency Charts": frequencies_tab,
+    ":material/grid_on: Correlations": correlations_tab,
+    ":material/search_insights: Category vs Numeric": category_vs_numeric_tab,
+    ":material/looks_one: Numeric vs Numeric": numeric_vs_numeric_tab,
+    ":material/category: Category vs Category": category_vs_category_tab,
+    ":material/monitoring: Trends Over Time": trends_tab,
+}
+
+# Unlike st.tabs, changing tab reruns the page, so only the selected tab has to run
+visible_tab = st.radio("Visualisation", options=list(TABS), horizontal=True, key="visible_tab", label_visibility="collapsed")
+TABS[visible_tab]()
+
+# Then work out the other tabs in the background, so switching to them is served from the caches
+prefetch_tabs(TABS, visible_tab, filters)
@@ -1,10 +1,28 @@
 import streamlit as st
+from utils.data_utils import load_data, filter_signature
+from utils.render_utils import show_figure
+from utils.stats_utils import ALPHA, HYPOTHESES, POSTHOC_METHODS, hypothesis_results, cached_group_summaries, posthoc_from_summaries
+from utils.stats_utils import format_p, eta_squared_size, correlation_strength
+from utils.ui_components import sidebar_filters
+from utils.resampling_utils import BOOTSTRAPS, CONFIDENCE, resampling_results
 
 st.set_page_config(layout="wide")
 
 st.write("# " + ":material/experiment:" + " Hypothesis & Statistical Testing")
 st.caption("Overview of the hypotheses tested, the statistical methods applied, and the conclusions drawn from the results.")
 
+# Load the cleaned dataset, shared read only by every session
+df = load_data()
+
+# Add the same sidebar filters as the data visualisation page
+start_date, end_date, gender, age_group, platform, mental_state = sidebar_filters(df)
+
+# Run the tests on the filtered rows, cached per filter selection and dataset version
+results = hypothesis_results(df, start_date, end_date, gender, age_group, platform, mental_state)
+
+# Signature of the filters, used as part of the render cache key
+filters = filter_signature(start_date, end_date, gender, age_group, platform, mental_state)
+
 st.markdown("---")
 
 st.subheader("Purpose of the Statistical Tests")
@@ -57,54 +75,138 @@ st.markdown("---")
 
 st.subheader("Results for Each Hypothesis")
 
+st.caption(
+    f"Results are worked out live from the **{results['Sleep vs Age Group']['n']:,}** records that match the sidebar filters. "
+    f"H₀ is rejected when p < {ALPHA}."
+)
+
+
+def is_significant(p):
+    """Whether a p-value is below the significance level, NaN when the test couldn't be run counts as not significant."""
+    return p < ALPHA
+
+
+def correlation_summary(r):
+    """Describes the strength and direction of a Pearson correlation."""
+    if r != r:
+        return "Pearson's r can't be worked out for the current selection."
+    return f"Pearson's r indicates a **{correlation_strength(r)} {'positive' if r >= 0 else 'negative'} relationship**."
+
+
+def anova_conclusion(result, rejected, retained):
+    """Builds the conclusion for an ANOVA result."""
+    if result["n"] == 0 or result["f"] != result["f"]:
+        return "There aren't enough records or groups in the current filter selection to run this test."
+    if is_significant(result["p"]):
+        return f"I **reject H₀** and accept **H₁** — {rejected}."
+    return f"I **fail to reject H₀** — {retained}."
+
+
+def correlation_conclusion(result, rejected, retained):
+    """Builds the conclusion for a correlation result."""
+    if result["pearson_r"] != result["pearson_r"]:
+        return "There aren't enough records in the current filter selection to run this test."
+    if is_significant(result["pearson_p"]):
+        return f"I **reject H₀** — {rejected}."
+    return f"I **fail to reject H₀** — {retained}."
+
+
+def show_posthoc(value, group):
+    """Shows the pairwise comparison heatmap for an ANOVA, built from the cached group summaries."""
+    st.markdown("**Post hoc pairwise comparisons:**  \nThe ANOVA only says that at least one group differs. "
+                "These tests compare every pair of groups, adjusting for the number of comparisons.")
+
+    method = st.selectbox("Select post hoc test", POSTHOC_METHODS, key=f"posthoc_{value}_{group}",
+                          help="Tukey HSD assumes the groups have equal variances, Games-Howell doesn't.")
+
+    summaries = cached_group_summaries(df, value, group, start_date, end_date, gender, age_group, platform, mental_state)
+    difference, p = posthoc_from_summaries(summaries, method)
+
+    if len(p) < 2:
+        st.warning("There aren't enough groups in the current filter selection for pairwise comparisons.")
+        return
+
+    def draw_posthoc():
+        """Draws the pairwise p-value heatmap, annotated with the mean differences."""
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        fig = plt.figure(figsize=(8, 6))
+
+        # Colour by p-value, with the significant pairs in the darker half of the scale
+        sns.heatmap(p, cmap="YlGnBu_r", vmin=0, vmax=2 * ALPHA, square=True, linewidths=1, linecolor="white",
+                    annot=difference.round(2), fmt="", cbar_kws={"label": "p-value"})
+        plt.title(f"{method}: {value.replace('_', ' ').title()} by {group.replace('_', ' ').title()}"
+                  "\n(values are row mean - column mean)", fontsize=12)
+        plt.xlabel("")
+        plt.ylabel("")
+        plt.tight_layout()
+        return fig
+
+    # Display the figure, reusing the cached image if these options have been drawn before
+    show_figure(f"posthoc_{value}_{group}", dict(method=method), filters, draw_posthoc)
+
+
 # Sleep vs Age Group expander
 with st.expander("**Sleep vs Age Group** — ANOVA"):
-    st.markdown("""
+    result = results["Sleep vs Age Group"]
+    st.markdown(f"""
 **Hypotheses:**
 
 - **H₀:** Mean sleep hours are equal across age groups  
 - **H₁:** At least one age group has a different mean sleep duration  
 
 **Results:**  
-A one-way ANOVA showed extremely large differences in sleep hours across age groups:
+A one-way ANOVA of sleep hours across age groups gave:
 
-- **F = 5898.93**  
-- **p < 0.001**  
-- **η² = 0.855** (very large effect)
+- **F = {result["f"]:.2f}**  
+- **{format_p(result["p"])}**  
+- **η² = {result["eta_squared"]:.3f}** ({eta_squared_size(result["eta_squared"])} effect)
 
-Age group alone explained **≈ 85%** of the variance in sleep, which is unusually high for behavioural data 
-and reflects the synthetic nature of the dataset.
+Age group alone explained **≈ {result["eta_squared"]:.0%}** of the variance in sleep.
 
 **Conclusion:**  
-I **reject H₀** and accept **H₁** — sleep duration differs significantly across age groups.
+{anova_conclusion(result, "sleep duration differs significantly across age groups", "there is no significant difference in sleep duration across age groups")}
 """)
 
+    show_posthoc("sleep_hours", "age_group")
+
 
 # Stress vs Platform expander
 with st.expander("**Stress vs Platform** — ANOVA"):
-    st.markdown("""
+    result = results["Stress vs Platform"]
+    st.markdown(f"""
 **Hypotheses:**
 
 - **H₀:** Mean stress level is equal across platforms  
 - **H₁:** At least one platform differs  
 
 **Results:**  
-ANOVA revealed a significant difference in stress levels across platforms:
+A one-way ANOVA of stress levels across platforms gave:
 
-- **F = 196.19**  
-- **p < 0.001**  
-- **η² = 0.191**
+- **F = {result["f"]:.2f}**  
+- **{format_p(result["p"])}**  
+- **η² = {result["eta_squared"]:.3f}** ({eta_squared_size(result["eta_squared"])} effect)
 
-Platforms explain about **19%** of the variance in stress.
+Platforms explain about **{result["eta_squared"]:.0%}** of the variance in stress.
 
 **Conclusion:**  
-We **reject H₀** — stress level varies significantly between platforms.
+{anova_conclusion(result, "stress level varies significantly between platforms", "there is no significant difference in stress level between platforms")}
 """)
 
+    show_posthoc("stress_level", "platform")
+
 
 # Platform vs Mental State expander
 with st.expander("**Platform vs Mental State** — Chi-Square Test"):
-    st.markdown("""
+    result = results["Platform vs Mental State"]
+    if result["chi2"] != result["chi2"]:
+        conclusion = "The current filter selection leaves fewer than two platforms or mental states, so the test can't be run."
+    elif is_significant(result["p"]):
+        conclusion = "I **reject H₀** — platform choice is significantly associated with mental state."
+    else:
+        conclusion = "I **fail to reject H₀** — there is no significant association between platform and mental state."
+
+    st.markdown(f"""
 **Hypotheses:**
 
 - **H₀:** No association between platform and mental state  
@@ -112,20 +214,19 @@ with st.expander("**Platform vs Mental State** — Chi-Square Test"):
 
 **Results:**  
 
-- **Chi-square = 466.00**  
-- **p < 0.001**  
-- **dof = 12**
-
-This shows a strong dependency between the two variables.
+- **Chi-square = {result["chi2"]:.2f}**  
+- **{format_p(result["p"])}**  
+- **dof = {result["dof"]}**
 
 **Conclusion:**  
- I **reject H₀** — platform choice is strongly associated with mental state.
+{conclusion}
 """)
 
 
 # Sleep vs Mental State expander
 with st.expander("**Sleep vs Mental State** — ANOVA"):
-    st.markdown("""
+    result = results["Sleep vs Mental State"]
+    st.markdown(f"""
 **Hypotheses:**
 
 - **H₀:** Sleep hours are equal across mental states  
@@ -133,20 +234,21 @@ with st.expander("**Sleep vs Mental State** — ANOVA"):
 
 **Results:**  
 
-- **F = 827.30**  
-- **p < 0.001**  
-- **η² = 0.249**
+- **F = {result["f"]:.2f}**  
+- **{format_p(result["p"])}**  
+- **η² = {result["eta_squared"]:.3f}** ({eta_squared_size(result["eta_squared"])} effect)
 
-Mental state explains ~25% of the variance in sleep duration.
+Mental state explains ~{result["eta_squared"]:.0%} of the variance in sleep duration.
 
 **Conclusion:**  
-I **reject H₀** — sleep differs significantly across mental-state categories.
+{anova_conclusion(result, "sleep differs significantly across mental-state categories", "there is no significant difference in sleep across mental-state categories")}
 """)
 
 
 # Screen Time vs Stress expander
 with st.expander("**Screen Time vs Stress** — Correlation"):
-    st.markdown("""
+    result = results["Screen Time vs Stress"]
+    st.markdown(f"""
 **Hypotheses:**
 
 - **H₀:** No linear correlation  
@@ -154,19 +256,20 @@ with st.expander("**Screen Time vs Stress** — Correlation"):
 
 **Results:**
 
-- **Pearson r = 0.836 (p < 0.001)**  
-- **Spearman ρ = 0.812 (p < 0.001)**  
+- **Pearson r = {result["pearson_r"]:.3f} ({format_p(result["pearson_p"])})**  
+- **Spearman ρ = {result["spearman_rho"]:.3f} ({format_p(result["spearman_p"])})**  
 
-Both indicate a **very strong positive relationship**.
+{correlation_summary(result["pearson_r"])}
 
 **Conclusion:**  
-I **reject H₀** — higher screen time is strongly associated with higher stress.
+{correlation_conclusion(result, "screen time is significantly correlated with stress", "there is no significant linear correlation between screen time and stress")}
 """)
 
 
-# Screen Time vs Stress expander
+# Negative Interaction Ratio vs Stress expander
 with st.expander("**Negative Interaction Ratio vs Stress** — Correlation"):
-    st.markdown("""
+    result = results["Negative Interaction Ratio vs Stress"]
+    st.markdown(f"""
 **Hypotheses:**
 
 - **H₀:** No linear correlation  
@@ -174,31 +277,91 @@ with st.expander("**Negative Interaction Ratio vs Stress** — Correlation"):
 
 **Results:**
 
-- **Pearson r = 0.443 (p < 0.001)**  
-- **Spearman ρ = 0.294 (p < 0.001)**  
+- **Pearson r = {result["pearson_r"]:.3f} ({format_p(result["pearson_p"])})**  
+- **Spearman ρ = {result["spearman_rho"]:.3f} ({format_p(result["spearman_p"])})**  
 
-This is a **moderate** positive correlation.
+{correlation_summary(result["pearson_r"])}
 
 **Conclusion:**  
-I **reject H₀** — a higher proportion of negative interactions relates to higher stress.
+{correlation_conclusion(result, "the proportion of negative interactions is significantly correlated with stress", "there is no significant linear correlation between the negative interaction ratio and stress")}
 """)
 
 
 st.markdown("---")
 
 
-st.subheader("Overall Interpretation")
+st.subheader("Resampling Checks")
 
-st.markdown("""
-The statistical tests strongly support the patterns found in the visual EDA:
+st.markdown(f"""
+The p-values above assume the usual distributions of the F, chi-square and t statistics. As a check that doesn't rely on them,
+a **permutation test** shuffles one variable against the other thousands of times and counts how often the statistic is at least
+as extreme as the one observed. It stops early once the p-value is clearly above or below {ALPHA}.
+A **bootstrap** of {BOOTSTRAPS:,} resamples gives a {CONFIDENCE:.0%} confidence interval for each effect size.
+""")
 
-- Sleep varies substantially across age groups and mental-state categories  
-- Platform choice relates meaningfully to stress and mental state  
-- Higher screen time strongly corresponds to higher stress  
-- Negative interaction ratio shows a moderate but significant correlation with stress  
+# Keep showing the checks on reruns once they have been requested
+if st.button("Run permutation tests and bootstrap intervals", icon=":material/shuffle:"):
+    st.session_state.show_resampling = True
+
+if st.session_state.get("show_resampling"):
+    with st.spinner("Resampling..."):
+        resampled = resampling_results(df, start_date, end_date, gender, age_group, platform, mental_state)
+
+    # The effect size each test's bootstrap interval is for
+    EFFECT_MEASURES = {"anova": "η²", "chi_square": "Cramér's V", "correlation": "Pearson r"}
+    tests = {hypothesis["name"]: hypothesis["test"] for hypothesis in HYPOTHESES}
+
+    rows = []
+    for name, result in resampled.items():
+        if result is None:
+            rows.append({"Hypothesis": name})
+            continue
+        rows.append({
+            "Hypothesis": name,
+            "Permutation p-value": result["p_value"],
+            f"p-value {CONFIDENCE:.0%} interval": f"{result['p_low']:.4f} to {result['p_high']:.4f}",
+            "Permutations": result["permutations"],
+            "Effect size": EFFECT_MEASURES[tests[name]],
+            f"Effect size {CONFIDENCE:.0%} interval": f"{result['effect_low']:.3f} to {result['effect_high']:.3f}",
+            "Significant": result["p_value"] < ALPHA,
+        })
+    st.dataframe(
+        rows,
+        hide_index=True,
+        width="stretch",
+        column_config={"Permutation p-value": st.column_config.NumberColumn(format="%.4f")}
+    )
 
-These effects are larger than typically seen in real-world behavioural datasets, 
-which is expected given the synthetic nature of the data.
 
-The combined results provide a clear confirmation of meaningful structure in the dataset.
+st.markdown("---")
+
+
+st.subheader("Overall Interpretation")
+
+# Summarise which relationships are significant for the current filters
+findings = [
+    ("Sleep varies significantly across age groups", results["Sleep vs Age Group"]["p"]),
+    ("Sleep varies significantly across mental-state categories", results["Sleep vs Mental State"]["p"]),
+    ("Stress varies significantly between platforms", results["Stress vs Platform"]["p"]),
+    ("Platform choice is significantly associated with mental state", results["Platform vs Mental State"]["p"]),
+    ("Screen time is significantly correlated with stress", results["Screen Time vs Stress"]["pearson_p"]),
+    ("Negative interaction ratio is significantly correlated with stress", results["Negative Interaction Ratio vs Stress"]["pearson_p"]),
+]
+significant = [text for text, p in findings if is_significant(p)]
+not_significant = [text.replace(" significantly", "") for text, p in findings if p >= ALPHA]
+untested = [text.replace(" significantly", "") for text, p in findings if p != p]
+
+if significant:
+    st.markdown("For the current selection, the statistical tests support these patterns from the visual EDA:\n\n"
+                + "\n".join(f"- {text}" for text in significant))
+if not_significant:
+    st.markdown("These relationships are **not** significant for the current selection:\n\n"
+                + "\n".join(f"- {text}" for text in not_significant))
+if untested:
+    st.markdown("These relationships can't be tested with the current selection:\n\n"
+                + "\n".join(f"- {text}" for text in untested))
+
+st.markdown("""
+On the full dataset the effects are larger than typically seen in real-world behavioural datasets, 
+which is expected given the synthetic nature of the data.
 """)
@@ -1,13 +1,35 @@
+import sys
+import time
 import streamlit as st
 
+# Run with "streamlit run dashboard_app/main.py -- --profile" to time every module import and the
+# first run of each page in this server process, written to .cache/startup_profile.json
+PROFILE = "--profile" in sys.argv
+if PROFILE:
+    from utils.profile_utils import install_import_profiler, record_first_paint, write_startup_report
+    install_import_profiler()
+else:
+    # Load the data, models and default page views in the background the first time the script runs
+    # in this process, dashboard_app/serve.py starts it when the server boots instead
+    from utils.warmup_utils import start_warmup
+    start_warmup()
+
 pages = [
     st.Page("introduction.py", title="Introduction", icon=":material/info:"),
     st.Page("data_visualisation.py", title="Data Visualisation", icon=":material/bar_chart:"),
     st.Page("hypothesis_statistical_testing.py", title="Hypothesis Testing", icon=":material/experiment:"),
+    st.Page("significance_screening.py", title="Significance Screening", icon=":material/grid_view:"),
     st.Page("clusters.py", title="Clusters", icon=":material/diversity_3:"),
     st.Page("models_overview.py", title="Models Overview", icon=":material/schema:"),
     st.Page("model_predictions.py", title="Model Predictions", icon=":material/psychology:"), 
 ]
 
 pg = st.navigation(pages)
-pg.run()
\ No newline at end of file
+start = time.perf_counter()
+pg.run()
+
+# Only a page's first run imports its modules, so only that one is recorded
+if PROFILE and record_first_paint(pg.title, time.perf_counter() - start):
+    report = write_startup_report()
+    print(f"First paint of {pg.title}: {report['first_paint'][pg.title]['seconds']:.2f}s, "
+          f"{report['modules_imported']} modules imported in {report['import_seconds']:.2f}s")
@@ -1,10 +1,9 @@
 import streamlit as st
 import pandas as pd
-import joblib
 from math import floor
 
 # Import utilities to load models, personas and section header
-from utils.model_utils import  MODELS
+from utils.model_utils import  MODELS, get_model
 from utils.persona_utils import clean_persona_values, PERSONAS
 from utils.ui_components import section_header
 
@@ -113,7 +112,7 @@ section_header(3, "Click to Predict:")
 # Predict Button
 if st.button("Predict"):
     # Get the model from the selected option
-    model = selected_model["model"]
+    model = get_model(selected_model_name)
 
     # Drop the target column from input if present
     df_input = df_input.drop(columns=[target])
@@ -0,0 +1,22 @@
+'''
+Starts the dashboard with the cache warm-up already running, so the data, models and default
+page views are loaded while the server boots rather than when the first user connects. Takes the
+same options as streamlit run, from the repo root:
+
+    python dashboard_app/serve.py --server.port 8501
+'''
+import os
+import sys
+from streamlit.web import cli
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+if __name__ == "__main__":
+    # The utils package is imported from the same folder as the pages do, so the warm-up fills the
+    # caches that the sessions read
+    from utils.warmup_utils import start_warmup
+    start_warmup()
+
+    # Run the server in this process so it shares the caches
+    sys.argv = ["streamlit", "run", MAIN_SCRIPT, *sys.argv[1:]]
+    sys.exit(cli.main())
@@ -0,0 +1,129 @@
+import streamlit as st
+import numpy as np
+from utils.data_utils import load_data, filter_signature
+from utils.render_utils import show_figure
+from utils.screening_utils import CORRECTIONS, SCREENING_NUMERIC, SCREENING_CATEGORICAL, screening_results, adjust_p_values
+from utils.ui_components import sidebar_filters
+
+st.set_page_config(
+    layout="wide",
+)
+
+# Load the cleaned dataset, shared read only by every session
+df = load_data()
+
+# Add the same sidebar filters as the data visualisation page
+start_date, end_date, gender, age_group, platform, mental_state = sidebar_filters(df)
+
+# Signature of the filters, used as part of the render cache key
+filters = filter_signature(start_date, end_date, gender, age_group, platform, mental_state)
+
+st.write("# " + ":material/grid_view:" + " Significance Screening")
+st.caption("Every pair of fields tested at once, to scan a new data drop for significant relationships.")
+
+st.markdown("""
+Every numerical × categorical pair is tested with a one-way **ANOVA**, every categorical × categorical pair
+with a **Chi-square test of independence** and every numerical × numerical pair with a **Pearson correlation**.
+Running this many tests makes false positives likely, so the p-values are corrected for multiple testing:
+
+- **Benjamini-Hochberg** controls the false discovery rate, the expected share of significant results that are false
+- **Bonferroni** controls the chance of any false positive, which is stricter
+""")
+
+col1, col2 = st.columns(2)
+
+with col1:
+    # Multiple testing correction dropdown
+    correction = st.selectbox("Multiple testing correction", options=CORRECTIONS)
+
+with col2:
+    # Significance level dropdown
+    alpha = st.selectbox("Significance level", options=[0.05, 0.01, 0.001])
+
+# Run every test on the filtered rows, cached per filter selection and dataset version
+results = screening_results(df, start_date, end_date, gender, age_group, platform, mental_state).copy()
+results["p_adjusted"] = adjust_p_values(results["p_value"], correction)
+results["significant"] = results["p_adjusted"] < alpha
+
+st.markdown(
+    f"**{results['significant'].sum()}** of **{results['p_value'].notna().sum()}** tests are significant "
+    f"at {alpha} after {correction if correction != 'None' else 'no'} correction."
+)
+
+tab1, tab2 = st.tabs([":material/table: Results Table", ":material/grid_on: Matrix"])
+
+with tab1:
+    st.info("All tests, click a column header to sort", icon=":material/table:")
+
+    # Filter the table by test type
+    tests = st.multiselect("Select tests", options=results["test"].unique().tolist(), default=results["test"].unique().tolist())
+    significant_only = st.toggle("Only show significant results")
+
+    table = results[results["test"].isin(tests)]
+    if significant_only:
+        table = table[table["significant"]]
+
+    # Show the strongest results first
+    st.dataframe(
+        table.sort_values(["p_adjusted", "statistic"], ascending=[True, False]),
+        hide_index=True,
+        width="stretch",
+        column_config={
+            "field_one": "Field One",
+            "field_two": "Field Two",
+            "statistic": st.column_config.NumberColumn("Statistic", format="%.2f"),
+            "dof": "Degrees of Freedom",
+            "effect_size": st.column_config.NumberColumn("Effect Size", format="%.3f"),
+            "effect_measure": "Effect Measure",
+            "p_value": st.column_config.NumberColumn("p-value", format="%.3g"),
+            "p_adjusted": st.column_config.NumberColumn("Adjusted p-value", format="%.3g"),
+            "significant": "Significant",
+        }
+    )
+
+with tab2:
+    st.info("Strength of evidence for every pair of fields", icon=":material/grid_on:")
+
+    # Matrix value dropdown
+    value = st.selectbox("Select matrix values", options=["-log10 adjusted p-value", "Effect size"])
+
+    # Build a symmetric matrix over all the screened fields
+    fields = SCREENING_NUMERIC + SCREENING_CATEGORICAL
+    if value == "Effect size":
+        # Correlations can be negative, the other measures can't, so compare strengths
+        cells = results["effect_size"].abs()
+    else:
+        # Cap at p = 1e-50, beyond that the evidence is overwhelming and would flatten the colour scale
+        cells = -np.log10(results["p_adjusted"].clip(lower=1e-50))
+
+    matrix = results.assign(cell=cells).pivot(index="field_one", columns="field_two", values="cell")
+    matrix = matrix.reindex(index=fields, columns=fields)
+    matrix = matrix.combine_first(matrix.T)
+
+    def draw_matrix():
+        """Draws the screening matrix heatmap."""
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        fig = plt.figure(figsize=(12, 10))
+
+        # Mark the significant pairs with a dot
+        significant = results[results["significant"]]
+        sns.heatmap(matrix, cmap="YlGnBu", square=True, linewidths=1, linecolor="white",
+                    vmin=0, vmax=1 if value == "Effect size" else 50, cbar_kws={"label": value})
+        for _, row in significant.iterrows():
+            for a, b in [(row["field_one"], row["field_two"]), (row["field_two"], row["field_one"])]:
+                plt.scatter(fields.index(b) + 0.5, fields.index(a) + 0.5, color="red", s=8)
+
+        plt.title(f"Significance Screening\n(dots are significant at {alpha} after {correction} correction)", fontsize=14)
+        plt.xlabel("")
+        plt.ylabel("")
+        plt.tight_layout()
+        return fig
+
+    # Display the figure, reusing the cached image if these options have been drawn before
+    show_figure(
+        "significance_matrix",
+        dict(correction=correction, alpha=alpha, value=value),
+        filters,
+        draw_matrix
+    )
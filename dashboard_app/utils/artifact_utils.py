@@ -0,0 +1,213 @@
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+# scikit-learn is imported inside the functions that build or inspect models, so the pages can
+# use the paths below without loading it
+
+# Name of the JSON file describing the pipeline inside an artifact folder
+STRUCTURE_FILE = "pipeline.json"
+
+# Bumped whenever the layout of the JSON or arrays changes
+ARTIFACT_FORMAT = 1
+
+
+def artifact_folder(model_path):
+    '''Returns the artifact folder saved next to a model's .pkl file.'''
+    return os.path.splitext(model_path)[0]
+
+
+def _save_array(folder, name, array):
+    '''Saves one array as an .npy file and returns its file name for the JSON.'''
+    file = f"{name}.npy"
+    np.save(os.path.join(folder, file), np.ascontiguousarray(array), allow_pickle=False)
+    return file
+
+
+def _export_transformer(folder, prefix, name, transformer, columns):
+    '''Describes one fitted transformer of a ColumnTransformer, saving its arrays.'''
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+    if isinstance(transformer, StandardScaler):
+        return {
+            "name": name, "type": "StandardScaler", "columns": list(columns),
+            "with_mean": transformer.with_mean, "with_std": transformer.with_std,
+            "n_samples_seen": int(np.max(transformer.n_samples_seen_)),
+            "arrays": {attribute: _save_array(folder, f"{prefix}.{name}.{attribute}", getattr(transformer, f"{attribute}_"))
+                       for attribute in ["mean", "var", "scale"]},
+        }
+    if isinstance(transformer, OneHotEncoder):
+        if transformer.drop is not None or transformer.min_frequency is not None or transformer.max_categories is not None:
+            raise ValueError(f"OneHotEncoder {name} uses drop or infrequent categories, which artifacts don't support")
+        return {
+            "name": name, "type": "OneHotEncoder", "columns": list(columns),
+            "handle_unknown": transformer.handle_unknown, "sparse_output": transformer.sparse_output,
+            "categories": [[str(category) for category in categories] for categories in transformer.categories_],
+        }
+    raise ValueError(f"Transformer {name} of type {type(transformer).__name__} isn't supported by artifacts")
+
+
+def _export_step(folder, name, step):
+    '''Describes one fitted pipeline step, saving its arrays into the folder.'''
+    from sklearn.compose import ColumnTransformer
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.linear_model import LinearRegression
+    if isinstance(step, ColumnTransformer):
+        if step.remainder != "drop":
+            raise ValueError(f"ColumnTransformer {name} must drop the remaining columns to be exported")
+        return {
+            "name": name, "type": "ColumnTransformer", "sparse_output": bool(step.sparse_output_),
+            "transformers": [_export_transformer(folder, name, transformer_name, transformer, columns)
+                             for transformer_name, transformer, columns in step.transformers_
+                             if transformer_name != "remainder"],
+        }
+    if isinstance(step, LinearRegression):
+        return {
+            "name": name, "type": "LinearRegression", "n_features": int(step.n_features_in_),
+            "arrays": {"coef": _save_array(folder, f"{name}.coef", step.coef_),
+                       "intercept": _save_array(folder, f"{name}.intercept", np.asarray(step.intercept_))},
+        }
+    if isinstance(step, RandomForestClassifier):
+        # Every tree's nodes and values are stored one after the other, with each tree's first node in offsets
+        states = [tree.tree_.__getstate__() for tree in step.estimators_]
+        offsets = np.cumsum([0] + [state["node_count"] for state in states])
+        return {
+            "name": name, "type": "RandomForestClassifier", "params": step.get_params(),
+            "classes": [str(c) for c in step.classes_], "n_features": int(step.n_features_in_),
+            "trees": [{"random_state": int(tree.random_state), "max_depth": int(state["max_depth"]),
+                       "max_features": int(tree.max_features_)} for tree, state in zip(step.estimators_, states)],
+            "arrays": {"nodes": _save_array(folder, f"{name}.nodes", np.concatenate([state["nodes"] for state in states])),
+                       "values": _save_array(folder, f"{name}.values", np.concatenate([state["values"] for state in states])),
+                       "offsets": _save_array(folder, f"{name}.offsets", offsets)},
+        }
+    raise ValueError(f"Step {name} of type {type(step).__name__} isn't supported by artifacts")
+
+
+def export_pipeline(pipeline, folder):
+    '''
+    Saves a fitted pipeline as a folder of plain files: a JSON description of its steps and an
+    .npy file for each array, such as the scaler means, the coefficients and the tree nodes.
+    Samplers such as SMOTE only run while fitting, so they are left out.
+
+    Parameters:
+    - pipeline: A fitted sklearn or imblearn Pipeline of a ColumnTransformer (StandardScaler and
+      OneHotEncoder) and a LinearRegression or RandomForestClassifier
+    - folder: Folder to write, it is replaced if it exists
+
+    Raises:
+    - ValueError if the pipeline has a step the format doesn't support
+    '''
+    if os.path.exists(folder):
+        shutil.rmtree(folder)
+    os.makedirs(folder)
+
+    steps = [_export_step(folder, name, step) for name, step in pipeline.steps
+             if step != "passthrough" and not hasattr(step, "fit_resample")]
+    with open(os.path.join(folder, STRUCTURE_FILE), "w") as f:
+        json.dump({"format": ARTIFACT_FORMAT, "steps": steps}, f, indent=2)
+
+
+def _load_column_transformer(folder, spec, mmap_mode):
+    '''Rebuilds a fitted ColumnTransformer from its description.'''
+    from sklearn.compose import ColumnTransformer
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+    # Fit on one row per category so the encoders are set up the way sklearn expects, then load the fitted arrays
+    encoders = [t for t in spec["transformers"] if t["type"] == "OneHotEncoder"]
+    rows = max([len(categories) for t in encoders for categories in t["categories"]], default=1)
+    sample = {}
+    transformers = []
+    for t in spec["transformers"]:
+        if t["type"] == "StandardScaler":
+            transformers.append((t["name"], StandardScaler(with_mean=t["with_mean"], with_std=t["with_std"]), t["columns"]))
+            sample.update({column: np.zeros(rows) for column in t["columns"]})
+        else:
+            transformers.append((t["name"], OneHotEncoder(handle_unknown=t["handle_unknown"], sparse_output=t["sparse_output"]), t["columns"]))
+            sample.update({column: np.resize(np.array(categories, dtype=object), rows)
+                           for column, categories in zip(t["columns"], t["categories"])})
+
+    columns = [column for t in spec["transformers"] for column in t["columns"]]
+    transformer = ColumnTransformer(transformers).fit(pd.DataFrame(sample)[columns])
+    # The sparse or dense output is decided from the data seen while fitting, so restore it
+    transformer.sparse_output_ = spec["sparse_output"]
+
+    for t in spec["transformers"]:
+        fitted = transformer.named_transformers_[t["name"]]
+        if t["type"] == "StandardScaler":
+            for attribute, file in t["arrays"].items():
+                setattr(fitted, f"{attribute}_", np.load(os.path.join(folder, file), mmap_mode=mmap_mode))
+            fitted.n_samples_seen_ = t["n_samples_seen"]
+        elif [list(categories) for categories in fitted.categories_] != t["categories"]:
+            raise ValueError(f"Categories of {t['name']} weren't saved in sorted order")
+    return transformer
+
+
+def _load_forest(folder, spec, mmap_mode):
+    '''Rebuilds a fitted RandomForestClassifier from its description.'''
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.tree import DecisionTreeClassifier
+    from sklearn.tree._tree import Tree
+    arrays = {key: np.load(os.path.join(folder, file), mmap_mode=mmap_mode) for key, file in spec["arrays"].items()}
+    offsets = arrays["offsets"]
+    n_classes = len(spec["classes"])
+
+    forest = RandomForestClassifier(**spec["params"])
+    forest.classes_ = np.array(spec["classes"], dtype=object)
+    forest.n_classes_, forest.n_outputs_, forest.n_features_in_ = n_classes, 1, spec["n_features"]
+    forest.estimator_ = DecisionTreeClassifier()
+
+    # Tree's setstate copies the node and value arrays into memory the tree owns, so the trees
+    # are read from the mapped files once rather than shared, but without unpickling anything
+    tree_params = {name: value for name, value in spec["params"].items()
+                   if name in DecisionTreeClassifier().get_params() and name != "random_state"}
+    forest.estimators_ = []
+    for i, tree_spec in enumerate(spec["trees"]):
+        start, end = offsets[i], offsets[i + 1]
+        tree = DecisionTreeClassifier(**tree_params, random_state=tree_spec["random_state"])
+        tree.tree_ = Tree(spec["n_features"], np.array([n_classes], dtype=np.intp), 1)
+        tree.tree_.__setstate__({"max_depth": tree_spec["max_depth"], "node_count": int(end - start),
+                                 "nodes": arrays["nodes"][start:end], "values": arrays["values"][start:end]})
+        tree.classes_ = np.arange(n_classes, dtype=np.float64)
+        tree.n_classes_, tree.n_outputs_, tree.n_features_in_ = n_classes, 1, spec["n_features"]
+        tree.max_features_ = tree_spec["max_features"]
+        forest.estimators_.append(tree)
+    return forest
+
+
+def load_pipeline(folder, mmap_mode="r"):
+    '''
+    Loads a pipeline saved by export_pipeline without unpickling anything, so artifacts from a
+    shared store can't run code when loaded. With mmap_mode the scaler and regression arrays stay
+    memory mapped, so processes loading the same folder share their pages.
+
+    Parameters:
+    - folder: Folder written by export_pipeline
+    - mmap_mode: Passed to np.load, None to read the arrays into memory
+
+    Returns:
+    - A fitted sklearn Pipeline that predicts like the exported one
+
+    Raises:
+    - ValueError if the folder was written in a different format
+    '''
+    from sklearn.linear_model import LinearRegression
+    from sklearn.pipeline import Pipeline
+
+    with open(os.path.join(folder, STRUCTURE_FILE)) as f:
+        structure = json.load(f)
+    if structure["format"] != ARTIFACT_FORMAT:
+        raise ValueError(f"{folder} is artifact format {structure['format']}, expected {ARTIFACT_FORMAT}")
+
+    steps = []
+    for spec in structure["steps"]:
+        if spec["type"] == "ColumnTransformer":
+            step = _load_column_transformer(folder, spec, mmap_mode)
+        elif spec["type"] == "LinearRegression":
+            step = LinearRegression()
+            step.coef_ = np.load(os.path.join(folder, spec["arrays"]["coef"]), mmap_mode=mmap_mode)
+            step.intercept_ = np.load(os.path.join(folder, spec["arrays"]["intercept"]), mmap_mode=mmap_mode)[()]
+            step.n_features_in_ = spec["n_features"]
+        else:
+            step = _load_forest(folder, spec, mmap_mode)
+        steps.append((spec["name"], step))
+    return Pipeline(steps)
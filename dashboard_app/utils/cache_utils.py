@@ -0,0 +1,134 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class LRUCache:
+    '''
+    A thread safe least recently used cache that is bounded by the total size of the values.
+    Module level instances live for the whole server process so they are shared by every session.
+    '''
+
+    def __init__(self, max_size, sizeof=len):
+        '''
+        Parameters:
+        - max_size: The maximum total size of the cached values
+        - sizeof: Function that returns the size of a value, defaults to len for bytes
+        '''
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        '''
+        Returns the cached value for the key and marks it as recently used, or the default if missing.
+        '''
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key][0]
+
+    def set(self, key, value):
+        '''
+        Adds a value to the cache, evicting the least recently used values until it fits.
+        Values larger than the whole cache are not stored.
+        '''
+        size = self.sizeof(value)
+        if size > self.max_size:
+            return
+
+        with self._lock:
+            if key in self._items:
+                self.size -= self._items.pop(key)[1]
+            self._items[key] = (value, size)
+            self.size += size
+
+            # Evict the oldest values until the cache is back under its limit
+            while self.size > self.max_size:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.size -= evicted_size
+
+    def pop(self, key, default=None):
+        '''
+        Removes the value for the key and returns it, or the default if missing.
+        '''
+        with self._lock:
+            if key not in self._items:
+                return default
+            value, size = self._items.pop(key)
+            self.size -= size
+            return value
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+
+class SingleFlight:
+    '''
+    Runs a computation once for every caller asking for the same key at the same time. The first
+    caller runs it and the others wait for its result, or its exception. Results aren't kept once
+    the computation finishes, so it goes in front of a cache rather than replacing one.
+    '''
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, compute, wait=True):
+        '''
+        Returns compute's result, waiting for the call already running for the key if there is one.
+
+        Parameters:
+        - key: Hashable key of the computation
+        - compute: Function with no arguments that computes the result
+        - wait: If False and a call is already running, compute runs again instead of waiting for it
+
+        Returns:
+        - The result of compute
+        '''
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+
+        if not leader:
+            return call.result() if wait else compute()
+
+        try:
+            result = compute()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._calls)
+
+
+def make_key(*parts):
+    '''
+    Builds a content address from any number of key parts.
+
+    Parameters:
+    - parts: Values that identify a cached result, their repr must be stable between runs
+
+    Returns:
+    - A hex SHA-256 digest of the parts
+    '''
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()
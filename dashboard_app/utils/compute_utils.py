@@ -0,0 +1,141 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.cache_utils import LRUCache, SingleFlight, make_key
+from utils.data_utils import dataset_version
+
+# Heavy computations, such as drawing figures, sorting the table and aggregating for a chart,
+# running at once across every session
+HEAVY_WORKERS = max(2, os.cpu_count() or 1)
+
+# Most heavy computations queued or running at once. Each one holds its session's filtered data,
+# so under a burst of sessions the callers past this wait for a place instead of queuing more
+HEAVY_QUEUE = 16
+
+# Aggregations kept by shared_result, counted by entry
+RESULT_CACHE_ENTRIES = 256
+
+# Process wide pool, places in its queue, computations in flight and aggregation results
+_pool = ThreadPoolExecutor(HEAVY_WORKERS, thread_name_prefix="heavy")
+_slots = threading.BoundedSemaphore(HEAVY_QUEUE)
+_flights = SingleFlight()
+_results = LRUCache(RESULT_CACHE_ENTRIES, sizeof=lambda result: 1)
+
+# Set on the pool's threads, so a computation that starts another runs it itself rather than
+# waiting for a place, or for a run of the same key that may still be queued behind it
+_local = threading.local()
+
+# Threads that wait on the pool for the computations started in the background, one per place in
+# its queue, and those computations by key
+_starters = ThreadPoolExecutor(HEAVY_QUEUE, thread_name_prefix="heavy_start")
+_background = {}
+_background_lock = threading.Lock()
+
+
+def _run_on_worker(compute):
+    '''Runs a computation on a pool thread.'''
+    _local.worker = True
+    try:
+        return compute()
+    finally:
+        _local.worker = False
+
+
+def _submit(compute):
+    '''Runs a computation on the pool, waiting for a place in its queue first.'''
+    # Waiting for a second worker from inside a worker could deadlock the pool, so run it here
+    if getattr(_local, "worker", False):
+        return compute()
+    with _slots:
+        return _pool.submit(_run_on_worker, compute).result()
+
+
+def run_heavy(key, compute):
+    '''
+    Runs an expensive computation on the process wide worker pool. Sessions that ask for the same
+    key while it is running wait for that run and share its result instead of starting their own,
+    so a link opened by many people at once is only computed once.
+
+    Parameters:
+    - key: Hashable key that identifies the result, equal keys must give equal results
+    - compute: Function with no arguments that computes the result
+
+    Returns:
+    - The result of compute
+
+    Raises:
+    - Whatever compute raises, in every caller waiting on it
+    '''
+    # A pool thread never waits on another caller's run, which could be queued behind this thread
+    return _flights.do(key, lambda: _submit(compute), wait=not getattr(_local, "worker", False))
+
+
+def start_heavy(key, compute):
+    '''
+    Starts a computation on a background thread and returns straight away, so a session can show
+    something else while it runs. Calls for a key that is still running get the same Future.
+
+    Parameters:
+    - key: Hashable key that identifies the computation
+    - compute: Function with no arguments that computes the result, through run_heavy so that it
+      is shared with sessions asking for the same result in the foreground
+
+    Returns:
+    - A Future for the result of compute
+    '''
+    with _background_lock:
+        future = _background.get(key)
+        if future is not None:
+            return future
+        future = _background[key] = _starters.submit(compute)
+
+    # Added outside the lock, as it runs straight away if the computation has already finished
+    future.add_done_callback(lambda future: _forget(key))
+    return future
+
+
+def _forget(key):
+    '''Forgets a finished background computation, its result is in the caches by then.'''
+    with _background_lock:
+        _background.pop(key, None)
+
+
+def _result_key(name, params, filters):
+    '''Builds the cache key of an aggregation from its name, options, filters and the data version.'''
+    return make_key(name, sorted(params.items()), filters, dataset_version())
+
+
+def result_ready(name, params, filters):
+    '''Returns True if shared_result already has this aggregation cached, without computing it.'''
+    return _result_key(name, params, filters) in _results
+
+
+def shared_result(name, params, filters, compute):
+    '''
+    Returns an aggregation for a chart or table, computing it once through run_heavy and then
+    serving it from a cache shared by every session. The result is shared, so it must not be
+    changed in place.
+
+    Parameters:
+    - name: Name of the aggregation
+    - params: Dictionary of every option that changes the result
+    - filters: The sidebar filter signature
+    - compute: Function with no arguments that computes the result
+
+    Returns:
+    - The result of compute
+    '''
+    key = _result_key(name, params, filters)
+    result = _results.get(key)
+    if result is None:
+        result = run_heavy(key, lambda: _compute_result(key, compute))
+    return result
+
+
+def _compute_result(key, compute):
+    '''Computes and caches a result, unless a run that finished just before this one already has.'''
+    result = _results.get(key)
+    if result is None:
+        result = compute()
+        _results.set(key, result)
+    return result
@@ -0,0 +1,395 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from utils.residency_utils import acquire
+from utils.schema import validate_schema
+
+# Data files that the dashboard reads, used to work out the dataset version
+DATA_FILES = ["./data/mental_health_social_media_dataset_cleaned.parquet", "./data/daily_rollup.parquet"]
+
+# Cluster profiles used by the personas
+CLUSTER_PROFILES_FILE = "./data/cluster_profiles.parquet"
+
+# Folder for the uncompressed Arrow IPC copies of the parquet files, which can be memory mapped
+ARROW_CACHE_DIR = "./.cache/arrow"
+
+# Process wide handles to the memory mapped tables and the DataFrames that view them, by parquet path
+_shared_tables = {}
+_shared_frames = {}
+_shared_lock = threading.Lock()
+
+# Numerical fields that the trends over time tab can plot
+TREND_FIELDS = ["daily_screen_time_min", "social_media_time_min", "sleep_hours", "physical_activity_min"]
+
+# Categorical fields that make up a single rollup cell, these match the sidebar filters
+ROLLUP_CELLS = ["gender", "age_group", "platform", "mental_state"]
+
+# Rows sampled from each rollup cell for the chart previews, so a preview's size depends on the
+# number of cells rather than the number of rows
+RESERVOIR_SIZE = 10
+
+# Seed of the sample priorities, so every process draws the same sample from the same data
+RESERVOIR_SEED = 0
+
+# Sampled row positions, by dataset version
+_reservoirs = {}
+
+# Map the sample frequency options to pandas resample rules
+RESAMPLE_RATE_MAP = {
+    "Daily": "D",
+    "Weekly": "W",
+    "Monthly": "M"
+}
+
+
+def build_daily_rollup(df):
+    '''
+    Builds a compact daily rollup of the cleaned dataset. Each row holds the sufficient
+    statistics (count, sum and sum of squares) of the trend fields for one day and one
+    gender / age group / platform / mental state cell.
+
+    Parameters:
+    - df: The cleaned DataFrame with a date column and the rollup cell columns.
+
+    Returns:
+    - A DataFrame with one row per day and cell that has at least one record.
+    '''
+
+    # Cast to float64 so the sums of squares can't overflow the integer columns
+    values = df[TREND_FIELDS].astype("float64")
+
+    # Add the squared values alongside the raw values
+    squares = (values ** 2).add_suffix("_sumsq")
+    values = values.add_suffix("_sum")
+
+    # Combine the keys and values so a single groupby can build every statistic
+    grouped = pd.concat([df[["date"] + ROLLUP_CELLS], values, squares], axis=1).groupby(
+        ["date"] + ROLLUP_CELLS, observed=True
+    )
+
+    # Sum the values and squares, then add the record count for each cell
+    rollup = grouped.sum()
+    rollup.insert(0, "count", grouped.size().astype("int64"))
+
+    return rollup.reset_index()
+
+
+def _arrow_cache_path(path):
+    '''Returns the Arrow IPC cache path for a parquet file, versioned by its size and modified time.'''
+    stat = os.stat(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(ARROW_CACHE_DIR, f"{name}-{stat.st_mtime_ns}-{stat.st_size}.arrow")
+
+
+def _write_arrow_cache(path, cache_path):
+    '''Converts a parquet file to an uncompressed Arrow IPC file.'''
+    os.makedirs(ARROW_CACHE_DIR, exist_ok=True)
+    table = pq.read_table(path)
+
+    # Write to a temporary file first so other processes never map a partial file
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with pa.OSFile(temp_path, "wb") as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(temp_path, cache_path)
+
+
+def shared_table(path):
+    '''
+    Returns a read only pyarrow Table for a parquet file that is shared by the whole process.
+    The first call converts the parquet file to an Arrow IPC file, then every call memory maps
+    that file, so the columns are read straight from the page cache without being copied.
+    The file is registered with the residency manifest, so only the first dashboard process
+    converts each version and the others map the same pages, and older versions are deleted
+    once no process holds them.
+
+    Parameters:
+    - path: Path of the parquet file
+
+    Returns:
+    - A pyarrow Table backed by the memory mapped file
+    '''
+    cache_path = _arrow_cache_path(path)
+
+    with _shared_lock:
+        # Map the file again if the parquet file has been rewritten since it was last mapped
+        if _shared_tables.get(path, (None, None))[0] != cache_path:
+            acquire(f"arrow:{path}", os.path.basename(cache_path), cache_path,
+                    populate=lambda target: os.path.exists(target) or _write_arrow_cache(path, target))
+            source = pa.memory_map(cache_path, "r")
+            _shared_tables[path] = (cache_path, ipc.open_file(source).read_all())
+        return _shared_tables[path][1]
+
+
+def shared_frame(path):
+    '''
+    Returns a pandas DataFrame view of shared_table that is shared by the whole process.
+    Numeric and date columns point at the memory mapped Arrow buffers without a copy and are
+    read only, so the DataFrame must not be changed in place. Filtering and selecting columns
+    return new DataFrames and are fine.
+
+    Parameters:
+    - path: Path of the parquet file
+
+    Returns:
+    - A read only pandas DataFrame
+    '''
+    table = shared_table(path)
+
+    with _shared_lock:
+        if _shared_frames.get(path, (None, None))[0] is not table:
+            # split_blocks stops pandas merging the columns into new 2D blocks, which would copy them
+            _shared_frames[path] = (table, table.to_pandas(split_blocks=True))
+        return _shared_frames[path][1]
+
+
+def load_data():
+    '''
+    Loads the cleaned dataset as a DataFrame shared by every session in this process.
+
+    Returns:
+    - A read only pandas DataFrame containing the cleaned dataset.
+    '''
+    df = shared_frame(DATA_FILES[0])
+
+    # Check the file was written with the compact schema, only the dtypes are checked so this is cheap
+    validate_schema(df)
+
+    return df
+
+
+def load_daily_rollup():
+    '''
+    Loads the daily rollup as a DataFrame shared by every session in this process.
+
+    Returns:
+    - A read only pandas DataFrame containing the daily rollup.
+    '''
+    return shared_frame(DATA_FILES[1])
+
+
+def load_table():
+    '''
+    Loads the cleaned dataset as a pyarrow Table shared by every session in this process,
+    used by views that gather a few rows at a time.
+
+    Returns:
+    - A pyarrow Table with the same rows and columns as load_data
+    '''
+    return shared_table(DATA_FILES[0])
+
+
+def build_cell_reservoirs(df, size=RESERVOIR_SIZE, seed=RESERVOIR_SEED):
+    '''
+    Draws a uniform random sample of up to size rows from every gender / age group / platform /
+    mental state cell. Each row is given a random priority and each cell keeps its rows with the
+    lowest priorities, which is the sample a reservoir would hold after reading the cell's rows in
+    any order. Rows added to a cell later only have to beat the highest priority it keeps.
+
+    Parameters:
+    - df: The cleaned DataFrame with the rollup cell columns
+    - size: Most rows kept from each cell, smaller cells are kept whole
+    - seed: Seed of the random priorities
+
+    Returns:
+    - A sorted numpy array of the sampled row positions in df
+    '''
+    priorities = np.random.default_rng(seed).random(len(df))
+    cells = df.groupby(ROLLUP_CELLS, observed=True).ngroup().to_numpy()
+
+    # Sort the rows by cell, then by priority within each cell
+    order = np.lexsort((priorities, cells))
+    sorted_cells = cells[order]
+
+    # Rank each row within its cell and keep the first size of them
+    starts = np.flatnonzero(np.r_[True, sorted_cells[1:] != sorted_cells[:-1]])
+    ranks = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    return np.sort(order[ranks < size])
+
+
+def load_cell_reservoirs():
+    '''
+    Loads the sampled row positions of every rollup cell, drawn once per dataset version and
+    shared by every session in this process.
+
+    Returns:
+    - A sorted numpy array of row positions in load_data
+    '''
+    version = dataset_version()
+    with _shared_lock:
+        positions = _reservoirs.get(version)
+    if positions is None:
+        positions = build_cell_reservoirs(load_data())
+        with _shared_lock:
+            # Only the current version is needed, so the older samples are dropped
+            _reservoirs.clear()
+            _reservoirs[version] = positions
+    return positions
+
+
+def resample_rollup(rollup, fields, frequency, aggregation_method):
+    '''
+    Rolls the daily rollup up to the selected frequency by merging the sufficient statistics
+    of every day and cell in each period.
+
+    Parameters:
+    - rollup: The (filtered) daily rollup DataFrame
+    - fields: List of trend fields to aggregate
+    - frequency: Resampling frequency ("Daily", "Weekly", "Monthly")
+    - aggregation_method: Aggregation method, only "Mean" and "Sum" can be built from the rollup
+
+    Returns:
+    - A tuple of (aggregated values, standard deviations), both DataFrames with a date column
+    '''
+
+    # Merge the cells and days into one row per period
+    columns = ["count"] + [f"{field}_sum" for field in fields] + [f"{field}_sumsq" for field in fields]
+    totals = (
+        rollup[["date"] + columns]
+        .set_index("date")
+        .resample(RESAMPLE_RATE_MAP[frequency])
+        .sum()
+    )
+
+    count = totals["count"]
+    values = pd.DataFrame(index=totals.index)
+    std_dev = pd.DataFrame(index=totals.index)
+
+    for field in fields:
+        field_sum = totals[f"{field}_sum"]
+        field_sumsq = totals[f"{field}_sumsq"]
+
+        # Empty periods have a mean of NaN but a sum of 0, same as resampling the rows
+        if aggregation_method == "Sum":
+            values[field] = field_sum
+        else:
+            values[field] = field_sum / count.where(count > 0)
+
+        # Sample variance from the sufficient statistics, clipped to avoid tiny negative rounding errors
+        variance = (field_sumsq - field_sum ** 2 / count.where(count > 0)) / (count - 1).where(count > 1)
+        std_dev[field] = np.sqrt(variance.clip(lower=0))
+
+    return values.reset_index(), std_dev.reset_index()
+
+
+def resample_trend(df, fields, frequency, aggregation_method, show_variability, rollup=None):
+    '''
+    Aggregates the trend fields to the selected frequency, using the daily rollup when one is
+    given and the aggregation can be built from it, otherwise resampling the rows.
+
+    Parameters:
+    - df: The (filtered) row level DataFrame
+    - fields: List of trend fields to aggregate
+    - frequency: Resampling frequency ("Daily", "Weekly", "Monthly")
+    - aggregation_method: Aggregation method ("Mean", "Sum", "Median")
+    - show_variability: Whether the standard deviations are needed
+    - rollup: Optional daily rollup with the same filters applied
+
+    Returns:
+    - A tuple of (aggregated values, standard deviations or None), both DataFrames with a date column
+    '''
+
+    if rollup is not None and aggregation_method in ["Mean", "Sum"]:
+        # Merge the pre-aggregated daily rows, the median can't be built from these so uses the rows below
+        return resample_rollup(rollup, fields, frequency, aggregation_method)
+
+    # select only date + fields
+    numeric_df = df[["date"] + fields]
+
+    # Resample only the needed numeric columns, e.g. "Mean" → "mean"
+    resampler = numeric_df.set_index("date").resample(RESAMPLE_RATE_MAP[frequency])
+    df_resampled = resampler.agg(aggregation_method.lower()).reset_index()
+
+    # Calculate standard deviation
+    std_resampled = resampler.std().reset_index() if show_variability else None
+
+    return df_resampled, std_resampled
+
+def filter_mask(df, start_date, end_date, gender, age_group, platform, mental_state):
+    '''
+    Builds a boolean mask of the rows that pass the sidebar filters. Works on both the row level
+    dataset and the daily rollup as they share the date and cell columns.
+
+    Parameters:
+    - df: The DataFrame to filter
+    - start_date: Start of the date range, or None
+    - end_date: End of the date range, or None
+    - gender: List of genders to keep, empty keeps all
+    - age_group: List of age groups to keep, empty keeps all
+    - platform: List of platforms to keep, empty keeps all
+    - mental_state: List of mental states to keep, empty keeps all
+
+    Returns:
+    - A numpy boolean array with one value per row
+    '''
+    mask = np.ones(len(df), dtype=bool)
+
+    # Apply date range filter
+    if start_date and end_date:
+        dates = df["date"]
+        mask &= ((dates >= pd.to_datetime(start_date)) & (dates <= pd.to_datetime(end_date))).to_numpy()
+
+    # Apply the category filters, an empty selection means no filter
+    for column, selected in zip(ROLLUP_CELLS, [gender, age_group, platform, mental_state]):
+        if len(selected) > 0:
+            mask &= df[column].isin(selected).to_numpy()
+
+    return mask
+
+
+def filter_positions(df, start_date, end_date, gender, age_group, platform, mental_state):
+    '''
+    Returns the positions of the rows that pass the sidebar filters, so views can gather only
+    the rows and columns they show instead of copying a filtered DataFrame.
+
+    Returns:
+    - A numpy array of row positions in df
+    '''
+    return np.flatnonzero(filter_mask(df, start_date, end_date, gender, age_group, platform, mental_state))
+
+
+def apply_filters(df, start_date, end_date, gender, age_group, platform, mental_state):
+    '''
+    Applies the sidebar filters to a DataFrame, see filter_mask for the parameters.
+
+    Returns:
+    - The filtered DataFrame
+    '''
+    return df[filter_mask(df, start_date, end_date, gender, age_group, platform, mental_state)]
+
+
+def filter_signature(start_date, end_date, gender, age_group, platform, mental_state):
+    '''
+    Builds a hashable signature of the sidebar filters. The order of the multiselect options
+    doesn't change the filtered data so they are sorted.
+
+    Returns:
+    - A tuple that is equal for any two filter selections that give the same data
+    '''
+    return (
+        str(start_date) if start_date and end_date else None,
+        str(end_date) if start_date and end_date else None,
+        tuple(sorted(gender)),
+        tuple(sorted(age_group)),
+        tuple(sorted(platform)),
+        tuple(sorted(mental_state)),
+    )
+
+
+def dataset_version():
+    '''
+    Works out a version for the data files from their size and modified time, so anything
+    cached against the data is invalidated when the ETL rewrites them.
+
+    Returns:
+    - A version string
+    '''
+    parts = []
+    for path in DATA_FILES:
+        stat = os.stat(path)
+        parts.append(f"{stat.st_mtime_ns}-{stat.st_size}")
+    return "_".join(parts)
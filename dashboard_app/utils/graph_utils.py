@@ -2,6 +2,7 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
+from utils.data_utils import resample_trend
 
 def plot_distribution(
     axes, type, df, column, bins, kde,
@@ -309,7 +310,8 @@ def plot_group_by_bar(axes, df, group_by, columns, title):
 
 
 def plot_trend_over_time(ax, df, fields, frequency, aggregation_method,
-                         force_y_zero, show_variability, show_rolling_average, rolling_window):
+                         force_y_zero, show_variability, show_rolling_average, rolling_window,
+                         rollup=None):
     """
     Plots a trend over time plot for selected fields.
 
@@ -323,50 +325,24 @@ def plot_trend_over_time(ax, df, fields, frequency, aggregation_method,
     - show_variability : Whether to show variability (standard deviation)
     - show_rolling_average : Whether to show rolling average
     - rolling_window : Window size for rolling average
+    - rollup : Optional daily rollup with the same filters applied, used instead of the rows for Mean and Sum
     Returns:
     - None
     """
 
-    resample_rate_map = {
-        "Daily": "D",
-        "Weekly": "W",
-        "Monthly": "M"
-    }
-
-    # select only date + fields
-    numeric_df = df[["date"] + fields].copy()
-
-    # Convert aggregation_method ("Mean") → "mean"
-    agg_func = aggregation_method.lower()
-
-    # Resample only the needed numeric columns
-    df_resampled = (
-        numeric_df
-        .set_index("date")
-        .resample(resample_rate_map[frequency])
-        .agg(agg_func)
-        .reset_index()
-    )
+    # Resample the fields to the selected frequency
+    df_resampled, std_resampled = resample_trend(df, fields, frequency, aggregation_method, show_variability, rollup)
 
     # Plot each field
     for field in fields:
         ax.plot(df_resampled["date"], df_resampled[field], label=field.replace("_", " ").title())
 
         if show_variability:
-            # Calculate standard deviation
-            std_dev = (
-                numeric_df
-                .set_index("date")
-                .resample(resample_rate_map[frequency])[field]
-                .std()
-                .reset_index(drop=True)
-            )
-
             # Plot shaded area for variability
             ax.fill_between(
                 df_resampled["date"],
-                df_resampled[field] - std_dev,
-                df_resampled[field] + std_dev,
+                df_resampled[field] - std_resampled[field],
+                df_resampled[field] + std_resampled[field],
                 alpha=0.2
             )
 
@@ -1,40 +1,75 @@
-import joblib
+import os
 import streamlit as st
+from utils.artifact_utils import STRUCTURE_FILE, artifact_folder
+from utils.residency_utils import RESIDENCY_DIR, acquire, copy_folder
 
-@st.cache_resource
-def load_model(path):
+@st.cache_resource(max_entries=10)
+def load_model(path, mtime_ns):
     '''
-    This function uses joblib to load the model and is cached to improve performance.
+    This function loads a model and is cached to improve performance. Artifact folders are
+    loaded without unpickling and with their arrays memory mapped, other paths with joblib.
+    The file's modification time is part of the cache key, so a model replaced by the
+    training commands is loaded again on the next run instead of serving the old one.
     
     Parameters:
-    - path (str): The file path to the saved model.
+    - path (str): The file path to the saved model or its artifact folder.
+    - mtime_ns (int): The file's modification time, used only as a cache key.
     
     Returns:
     - The loaded model object.
     '''
+    # scikit-learn is only imported when a model is first needed, not when the page first loads
+    if os.path.isdir(path):
+        from utils.artifact_utils import load_pipeline
+        return load_pipeline(path)
+    import joblib
     return joblib.load(path)
 
 
-# Constant dictionary mapping model names to their loaded models and target variables
+def get_model(name):
+    '''
+    Returns the current model for an entry of MODELS, loading it if its file has changed.
+    The artifact folder next to the .pkl is used when there is one. Each version of it is copied
+    once into the residency folder, where every dashboard process maps the same files and a newly
+    published model can't replace files that processes still have mapped.
+    
+    Parameters:
+    - name (str): A key of MODELS.
+    
+    Returns:
+    - The loaded model object.
+    '''
+    path = MODELS[name]["path"]
+    folder = artifact_folder(path)
+    if os.path.isdir(folder):
+        version = os.stat(os.path.join(folder, STRUCTURE_FILE)).st_mtime_ns
+        name = os.path.basename(folder)
+        resident = acquire(f"model:{name}", str(version), os.path.join(RESIDENCY_DIR, "models", f"{name}-{version}"),
+                           populate=lambda path: copy_folder(folder, path))
+        return load_model(resident, version)
+    return load_model(path, os.stat(path).st_mtime_ns)
+
+
+# Constant dictionary mapping model names to their saved model files and target variables
 MODELS = {
     "Mental State": {
-        "model": load_model("./models/predicting_mental_state_random_forest_model.pkl"),
+        "path": "./models/predicting_mental_state_random_forest_model.pkl",
         "target": "mental_state",
     },
     "Sleep Hours": {
-        "model": load_model("./models/predicting_sleep_linear_regression_model.pkl"),
+        "path": "./models/predicting_sleep_linear_regression_model.pkl",
         "target": "sleep_hours",
     },
     "Stress Level": {
-        "model": load_model("./models/predicting_stress_level_linear_regression_model.pkl"),
+        "path": "./models/predicting_stress_level_linear_regression_model.pkl",
         "target": "stress_level",
     },
     "Anxiety Level": {
-        "model": load_model("./models/predicting_anxiety_level_linear_regression_model.pkl"),
+        "path": "./models/predicting_anxiety_level_linear_regression_model.pkl",
         "target": "anxiety_level",
     },
     "Mood Level": {
-        "model": load_model("./models/predicting_mood_level_linear_regression_model.pkl"),
+        "path": "./models/predicting_mood_level_linear_regression_model.pkl",
         "target": "mood_level",
     },
-}
\ No newline at end of file
+}
@@ -1,6 +1,5 @@
-import joblib
-import streamlit as st
 import pandas as pd
+from utils.data_utils import shared_frame, CLUSTER_PROFILES_FILE
 
 def clean_persona_values(persona: dict) -> dict:
     '''
@@ -38,15 +37,14 @@ def clean_persona_values(persona: dict) -> dict:
     return cleaned
 
 
-@st.cache_data
 def load_cluster_profiles():
     '''
-    This function loads the cluster profiles data from a parquet file and is cached to improve performance.
+    This function loads the cluster profiles data, shared read only by every session in this process.
     
     Returns:
     - A pandas DataFrame containing the cluster profiles.
     '''
-    return pd.read_parquet("./data/cluster_profiles.parquet")
+    return shared_frame(CLUSTER_PROFILES_FILE)
 
 
 CLUSTER_NAMES = {
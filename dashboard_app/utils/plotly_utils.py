@@ -0,0 +1,326 @@
+import os
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from utils.data_utils import resample_trend
+
+# Plotly's JSON encoder takes PIL.Image from sys.modules if it is there, where it can find it half
+# imported by a background thread loading matplotlib, so it is imported whole here first
+import PIL.Image  # noqa: F401
+
+# Chart rendering backend for this deployment, "matplotlib" renders PNGs on the server
+# and "plotly" sends the pre-aggregated data to the browser to be drawn there
+CHART_BACKEND = os.environ.get("CHART_BACKEND", "matplotlib").lower()
+
+# Number of points the KDE curves are evaluated at
+KDE_POINTS = 200
+
+# Colours to match the seaborn charts
+SKY_BLUE = "skyblue"
+PASTEL = ["#a1c9f4", "#ffb482", "#8de5a1", "#ff9f9b", "#d0bbff", "#debb9b", "#fab0e4", "#cfcfcf", "#fffea3", "#b9f2f0"]
+
+
+def _kde_curve(series):
+    '''
+    Evaluates a gaussian KDE of a series on an even grid, so only the curve is sent to the browser.
+
+    Returns:
+    - A tuple of (x values, density values), or None if the KDE can't be estimated
+    '''
+    values = series.dropna().to_numpy(dtype="float64")
+    if len(values) < 2 or values.min() == values.max():
+        return None
+    grid = np.linspace(values.min(), values.max(), KDE_POINTS)
+    # Imported here as scipy.stats is slow to import and only the distributions chart needs it
+    from scipy.stats import gaussian_kde
+    return grid, gaussian_kde(values)(grid)
+
+
+def plot_distribution(
+    type, df, column, bins, kde,
+    mean, median, std, q1, q3, iqr,
+    skew, kurtosis, count
+):
+    """
+    Plotly version of graph_utils.plot_distribution. The histogram counts, KDE curves and
+    box plot quartiles are worked out on the server and only those are sent to the browser.
+
+    Parameters:
+    - type : The type of plot to create. Options: "Histogram", "Histogram & KDE", "Violin Plot", "Box Plot", "Violin Plot & Box Plot"
+    - df : The DataFrame containing the data
+    - column : The column name of the numerical data to plot
+    - bins : Number of bins for histogram
+    - kde : Whether to include KDE in histogram
+    - mean : Whether to annotate mean
+    - median : Whether to annotate median
+    - std : Standard deviation annotation option: "None", "1 SD", "2 SD", "3 SD"
+    - q1 : Whether to annotate first quartile
+    - q3 : Whether to annotate third quartile
+    - iqr : Whether to annotate interquartile range fences
+    - skew : Whether to include skewness in subtitle
+    - kurtosis : Whether to include kurtosis in subtitle
+    - count : Whether to include count in subtitle
+
+    Returns:
+    - A plotly Figure
+    """
+
+    # Get series and formatted title
+    series = df[column].dropna()
+    col_title = column.replace("_", " ").title()
+    fig = go.Figure()
+
+    # Summary stats calculations for the box plot and annotations
+    mean_val = series.mean()
+    median_val = series.median()
+    std_val = series.std()
+    q1_val = series.quantile(0.25)
+    q3_val = series.quantile(0.75)
+    iqr_val = q3_val - q1_val
+
+    # plot based on type
+    if type in ["Histogram", "Histogram & KDE"]:
+        # Bin the values on the server and send only the bin counts
+        counts, edges = np.histogram(series, bins=bins)
+        fig.add_bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges), marker_color=SKY_BLUE, name="Count")
+
+        # Scale the KDE to the histogram counts, like seaborn does
+        curve = _kde_curve(series) if kde else None
+        if curve is not None:
+            fig.add_scatter(x=curve[0], y=curve[1] * len(series) * np.diff(edges).mean(), mode="lines", name="KDE")
+
+    if type in ["Violin Plot", "Violin Plot & Box Plot"]:
+        # Draw the violin as a filled outline of the KDE curve
+        curve = _kde_curve(series)
+        if curve is not None:
+            grid, density = curve
+            half_width = 0.4 * density / density.max()
+            fig.add_scatter(
+                x=np.concatenate([grid, grid[::-1]]),
+                y=np.concatenate([half_width, -half_width[::-1]]),
+                fill="toself", mode="lines", line_color="grey", fillcolor=SKY_BLUE, name="Density"
+            )
+
+    if type in ["Box Plot", "Violin Plot & Box Plot"] and len(series):
+        # Whiskers reach the furthest values inside 1.5 IQR, matching seaborn
+        lower_fence = series[series >= q1_val - 1.5 * iqr_val].min()
+        upper_fence = series[series <= q3_val + 1.5 * iqr_val].max()
+        outliers = np.unique(series[(series < lower_fence) | (series > upper_fence)])
+
+        fig.add_box(
+            q1=[q1_val], median=[median_val], q3=[q3_val],
+            lowerfence=[lower_fence], upperfence=[upper_fence],
+            y=[0], orientation="h", boxpoints=False, width=0.2 if type == "Violin Plot & Box Plot" else 0.6,
+            fillcolor="white" if type == "Violin Plot & Box Plot" else SKY_BLUE, line_color="grey", name="Box"
+        )
+        if len(outliers):
+            fig.add_scatter(x=outliers, y=np.zeros(len(outliers)), mode="markers", marker_color="grey", name="Outliers")
+
+    # Build subtitle
+    sub_parts = []
+    if skew:
+        sub_parts.append(f"Skewness: {series.skew():.2f}")
+    if kurtosis:
+        sub_parts.append(f"Kurtosis: {series.kurtosis():.2f}")
+    if count:
+        sub_parts.append(f"Count: {series.count()}")
+
+    # Format subtitle to add pipe separators if multiple parts
+    sub_text = " | ".join(sub_parts)
+
+    # Collect the annotation lines based on user selections
+    lines = []
+    if mean:
+        lines.append((mean_val, "Mean", "red"))
+    if median:
+        lines.append((median_val, "Median", "blue"))
+    if q1:
+        lines.append((q1_val, "Q1", "magenta"))
+    if q3:
+        lines.append((q3_val, "Q3", "magenta"))
+    if iqr:
+        lines.append((q1_val - 1.5*iqr_val, "Q1 - 1.5 IQR", "gold"))
+        lines.append((q3_val + 1.5*iqr_val, "Q3 + 1.5 IQR", "gold"))
+    for n, colour in [(1, "green"), (2, "orange"), (3, "purple")]:
+        if std in ("1 SD", "2 SD", "3 SD")[n - 1:]:
+            lines.append((mean_val + n*std_val, f"+{n}σ", colour))
+            lines.append((mean_val - n*std_val, f"-{n}σ", colour))
+
+    # Add the annotation lines, stepping the labels down so they don't overlap
+    for i, (x, label, colour) in enumerate(lines):
+        fig.add_vline(x=x, line_dash="dash", line_color=colour, line_width=2)
+        fig.add_annotation(x=x, y=0.95 - 0.05 * i, yref="paper", text=label, showarrow=False, font_color=colour)
+
+    fig.update_layout(
+        title=f"{col_title}<br><sup>{sub_text}</sup>" if sub_text else col_title,
+        xaxis_title=col_title,
+        yaxis_title="Frequency" if type in ["Histogram", "Histogram & KDE"] else None,
+        yaxis_showticklabels=type in ["Histogram", "Histogram & KDE"],
+        showlegend=False,
+        bargap=0
+    )
+    return fig
+
+
+def plot_frequency(df, column, percentage_label):
+    """
+    Plotly version of graph_utils.plot_frequency, only the category counts are sent to the browser.
+
+    Parameters:
+    - df : The DataFrame containing the data
+    - column : The column name of the categorical data to plot
+    - percentage_label : Whether to include percentage labels on bars
+
+    Returns:
+    - A plotly Figure
+    """
+
+    # Count each category, keeping the category order like seaborn's countplot
+    counts = df[column].value_counts(sort=False)
+    if not isinstance(df[column].dtype, pd.CategoricalDtype):
+        counts = counts.sort_index()
+
+    fig = go.Figure(go.Bar(
+        x=counts.index.astype(str),
+        y=counts.to_numpy(),
+        marker_color=SKY_BLUE,
+        text=[f"{100 * c / len(df):.1f}%" for c in counts] if percentage_label and len(df) else None,
+        textposition="outside"
+    ))
+
+    # Set labels
+    fig.update_layout(
+        title=column.replace("_", " ").title(),
+        xaxis_title=column.replace("_", " ").title(),
+        yaxis_title="Frequency",
+        xaxis_type="category"
+    )
+    return fig
+
+
+def plot_stacked_category(df, group_one, group_two, title):
+    """
+    Plotly version of graph_utils.plot_stacked_category, only the proportions are sent to the browser.
+
+    Parameters:
+    - df: DataFrame
+    - group_one: main x-axis category
+    - group_two: sub-category stacked in each bar
+    - title: chart title
+
+    Returns:
+    - A plotly Figure
+    """
+
+    # Count each pair of categories and convert to proportions of each main category
+    counts = df.groupby([group_one, group_two], observed=False).size().unstack(fill_value=0)
+    stacked = counts.div(counts.sum(axis=1).replace(0, np.nan), axis=0).fillna(0)
+
+    fig = go.Figure()
+    for i, col in enumerate(stacked.columns):
+        # Only show values > 3% due to space
+        fig.add_bar(
+            x=stacked.index.astype(str),
+            y=stacked[col],
+            name=str(col),
+            marker_color=PASTEL[i % len(PASTEL)],
+            text=[f"{v*100:.0f}%" if v > 0.03 else "" for v in stacked[col]],
+            textposition="inside"
+        )
+
+    # Set titles and labels
+    fig.update_layout(
+        barmode="stack",
+        title=title,
+        yaxis_title="Proportion",
+        xaxis_title=group_one.replace("_", " ").title(),
+        legend_title=group_two,
+        xaxis_type="category"
+    )
+    return fig
+
+
+def plot_group_by_bar(df, group_by, columns, title):
+    """
+    Plotly version of graph_utils.plot_group_by_bar, only the group means are sent to the browser.
+
+    Parameters:
+    - df: DataFrame containing the data.
+    - group_by: Column name to group the data by (categorical).
+    - columns: List of column names to plot (numerical).
+    - title: Title of the grouped bar plot.
+
+    Returns:
+    - A plotly Figure
+    """
+
+    # Group by mean
+    df_grouped = df.groupby(group_by, observed=False)[columns].mean()
+
+    fig = go.Figure()
+    for i, column in enumerate(columns):
+        fig.add_bar(x=df_grouped.index.astype(str), y=df_grouped[column], name=column, marker_color=PASTEL[i % len(PASTEL)])
+
+    # Set plot title and labels
+    fig.update_layout(
+        barmode="group",
+        title=title,
+        yaxis_title="Mean Value",
+        xaxis_title=group_by.replace("_", " ").title(),
+        legend_title="Metric",
+        xaxis_type="category"
+    )
+    return fig
+
+
+def plot_trend_over_time(df, fields, frequency, aggregation_method,
+                         force_y_zero, show_variability, show_rolling_average, rolling_window,
+                         rollup=None):
+    """
+    Plotly version of graph_utils.plot_trend_over_time, only the resampled series are sent to the browser.
+
+    Parameters:
+    - df : The DataFrame containing the data
+    - fields : List of numerical fields to plot
+    - frequency : Resampling frequency ("Daily", "Weekly", "Monthly")
+    - aggregation_method : Aggregation method ("Mean", "Sum", "Median")
+    - force_y_zero : Whether to force y-axis to start at zero
+    - show_variability : Whether to show variability (standard deviation)
+    - show_rolling_average : Whether to show rolling average
+    - rolling_window : Window size for rolling average
+    - rollup : Optional daily rollup with the same filters applied, used instead of the rows for Mean and Sum
+
+    Returns:
+    - A plotly Figure
+    """
+
+    # Resample the fields to the selected frequency
+    df_resampled, std_resampled = resample_trend(df, fields, frequency, aggregation_method, show_variability, rollup)
+    dates = df_resampled["date"]
+
+    fig = go.Figure()
+    for field in fields:
+        label = field.replace("_", " ").title()
+
+        if show_variability:
+            # Plot shaded area for variability as a band between the lower and upper lines
+            fig.add_scatter(x=dates, y=df_resampled[field] - std_resampled[field], mode="lines",
+                            line_width=0, showlegend=False, hoverinfo="skip")
+            fig.add_scatter(x=dates, y=df_resampled[field] + std_resampled[field], mode="lines",
+                            line_width=0, fill="tonexty", opacity=0.2, showlegend=False, hoverinfo="skip")
+
+        fig.add_scatter(x=dates, y=df_resampled[field], mode="lines", name=label)
+
+        if show_rolling_average:
+            # Calculate rolling average
+            rolling_avg = df_resampled[field].rolling(window=rolling_window, min_periods=1).mean()
+            fig.add_scatter(x=dates, y=rolling_avg, mode="lines", line_dash="dash", name=f"{label} (Rolling Avg)")
+
+    # Titles
+    fig.update_layout(title="Trends Over Time", xaxis_title="Date", yaxis_title="Value")
+
+    if force_y_zero:
+        # Force y-axis to start at zero
+        fig.update_yaxes(rangemode="tozero")
+
+    return fig
@@ -0,0 +1,373 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from utils.data_utils import ROLLUP_CELLS, apply_filters, load_cell_reservoirs
+from utils.plotly_utils import PASTEL, SKY_BLUE
+
+# Filtered selections with fewer rows than this are drawn exactly straight away
+PREVIEW_MIN_ROWS = 2000
+
+# Width of the error bars in standard errors, for 95% confidence intervals
+Z_95 = 1.96
+
+# Previews whose sampled cells hold less than this share of the filtered rows are marked as unreliable,
+# as the other cells' values are only guessed from them
+MIN_COVERAGE = 0.8
+
+# Plotly's names for the heatmap colour maps that matplotlib names differently
+PLOTLY_COLOUR_MAPS = {"coolwarm": "RdBu_r"}
+
+
+def stratified_sample(df, rollup, start_date, end_date, gender, age_group, platform, mental_state):
+    '''
+    Takes the rows of the cell reservoirs that pass the sidebar filters, with what is needed to
+    scale them up to every filtered row. Each rollup cell is a stratum, and the number of filtered
+    rows in it is read from the filtered daily rollup, so this takes the same time for any number
+    of rows.
+
+    Parameters:
+    - df: The cleaned dataset
+    - rollup: The daily rollup with the same filters applied
+    - The sidebar filters, see data_utils.filter_mask
+
+    Returns:
+    - A dictionary of the sampled "rows", the "strata" number of each row, the "population"
+      (filtered rows) and "sampled" rows of each stratum, the "uncovered" filtered rows of each
+      cell with none of its sampled rows, the "coverage", the share of the filtered rows that are
+      in a stratum, and the exact filtered row count of every cell as "cell_counts"
+    '''
+    rows = apply_filters(df.iloc[load_cell_reservoirs()], start_date, end_date, gender, age_group, platform, mental_state)
+
+    # Number the cells that have sampled rows, then count the filtered rows of each in the rollup
+    strata, cells = pd.MultiIndex.from_frame(rows[ROLLUP_CELLS]).factorize()
+    cell_counts = rollup.groupby(ROLLUP_CELLS, observed=True)["count"].sum()
+    cell_counts = cell_counts[cell_counts > 0]
+    population = cell_counts.reindex(cells).to_numpy(dtype="float64")
+
+    # A narrow date range can leave cells with filtered rows but none of their sampled rows
+    uncovered = cell_counts[~cell_counts.index.isin(cells)].to_numpy(dtype="float64")
+    filtered_rows = cell_counts.sum()
+
+    return {
+        "rows": rows,
+        "strata": strata,
+        "population": population,
+        "sampled": np.bincount(strata, minlength=len(cells)).astype("float64"),
+        "uncovered": uncovered,
+        "coverage": population.sum() / filtered_rows if filtered_rows else 1.0,
+        "cell_counts": cell_counts,
+    }
+
+
+def _estimate_total(sample, values):
+    '''
+    Estimates the total of a value over every filtered row, and its standard error, from the
+    mean of each stratum. Strata that were sampled whole add no error. A stratum with one sampled
+    row can't show its own spread, so those strata are collapsed into one group and their error
+    is taken from how their totals differ. The cells with no sampled rows are assumed to have the
+    mean of the others, with their error from how much the sampled cells' means differ.
+    '''
+    strata, population, sampled = sample["strata"], sample["population"], sample["sampled"]
+    values = np.asarray(values, dtype="float64")
+    if len(sampled) == 0:
+        return np.nan, np.nan
+    means = np.bincount(strata, weights=values, minlength=len(sampled)) / sampled
+    squares = np.bincount(strata, weights=values ** 2, minlength=len(sampled))
+    variances = np.maximum(squares - sampled * means ** 2, 0) / np.maximum(sampled - 1, 1)
+
+    total = (population * means).sum()
+    partial = sampled < population
+    variance = (population ** 2 * (1 - sampled / population) * variances / sampled)[partial & (sampled > 1)].sum()
+
+    # Collapse the strata with one sampled row, comparing each total with its share of the group's
+    singles = partial & (sampled == 1)
+    if singles.sum() > 1:
+        totals = population[singles] * means[singles]
+        shares = population[singles] / population[singles].sum()
+        variance += singles.sum() / (singles.sum() - 1) * ((totals - shares * totals.sum()) ** 2).sum()
+    elif singles.any():
+        # A single one is given the spread of every sampled row
+        variance += (population[singles] ** 2 * (1 - 1 / population[singles])).sum() * values.var(ddof=1 if len(values) > 1 else 0)
+
+    # Scale up to the cells with no sampled rows, whose own means could be anywhere the sampled cells' are
+    uncovered = sample["uncovered"]
+    if len(uncovered):
+        scale = (population.sum() + uncovered.sum()) / population.sum()
+        total *= scale
+        variance = variance * scale ** 2 + (means.var(ddof=1) if len(means) > 1 else values.var()) * (uncovered ** 2).sum()
+    return total, np.sqrt(variance)
+
+
+def _estimate_ratio(sample, numerator, denominator):
+    '''
+    Estimates the ratio of two totals, such as a mean within a group or a share of a group,
+    and its standard error by linearisation.
+    '''
+    numerator = np.asarray(numerator, dtype="float64")
+    denominator = np.asarray(denominator, dtype="float64")
+    total, _ = _estimate_total(sample, denominator)
+    if not total:
+        return np.nan, np.nan
+    ratio = _estimate_total(sample, numerator)[0] / total
+    _, error = _estimate_total(sample, numerator - ratio * denominator)
+    return ratio, error / total
+
+
+def _cell_counts(sample, columns):
+    '''Counts the filtered rows exactly for each value of one or more rollup cell columns.'''
+    return sample["cell_counts"].groupby(level=columns, observed=True).sum()
+
+
+def _preview_title(sample, title):
+    '''Marks a chart title as a preview, warning under it if the sample covers too few of the filtered rows.'''
+    if sample["coverage"] >= MIN_COVERAGE:
+        return f"{title} (preview)"
+    return (f"{title} (preview)<br><sup>Low coverage: only {sample['coverage']:.0%} of the filtered rows are in "
+            "sampled cells, so the estimates may be unreliable</sup>")
+
+
+def _weights(sample):
+    '''Returns how many filtered rows each sampled row stands for.'''
+    return (sample["population"] / sample["sampled"])[sample["strata"]]
+
+
+def _categories(series):
+    '''Lists a column's values in the order the exact charts use.'''
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return list(series.cat.categories)
+    return sorted(series.dropna().unique())
+
+
+def _weighted_quantiles(values, weights, quantiles):
+    '''Interpolates quantiles of values where each value counts weights times.'''
+    order = np.argsort(values)
+    values, weights = values[order], weights[order]
+    positions = (np.cumsum(weights) - weights / 2) / weights.sum()
+    return np.interp(quantiles, positions, values)
+
+
+def _add_box(fig, values, weights, name, colour, **position):
+    '''Adds a box plot of the weighted quartiles, with whiskers to the furthest values inside 1.5 IQR.'''
+    if len(values) == 0:
+        return
+    q1, median, q3 = _weighted_quantiles(values, weights, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    fig.add_box(
+        q1=[q1], median=[median], q3=[q3],
+        lowerfence=[values[values >= q1 - 1.5 * iqr].min()], upperfence=[values[values <= q3 + 1.5 * iqr].max()],
+        boxpoints=False, fillcolor=colour, line_color="grey", name=name, **position
+    )
+
+
+def _grid(titles):
+    '''Creates a figure with a subplot for each title, two per row.'''
+    return make_subplots(rows=max(1, (len(titles) + 1) // 2), cols=2 if len(titles) > 1 else 1,
+                         subplot_titles=titles)
+
+
+def preview_distribution(sample, columns, type, bins):
+    '''
+    Previews the distributions chart. Histograms show the estimated count of filtered rows in
+    each bin with 95% confidence intervals, the other chart types show a box of the weighted quartiles.
+
+    Parameters:
+    - sample: A sample from stratified_sample
+    - columns: The numerical columns to plot
+    - type: The chart type picked for the exact chart
+    - bins: Number of bins for histograms
+
+    Returns:
+    - A plotly Figure
+    '''
+    fig = _grid([column.replace("_", " ").title() for column in columns])
+    for i, column in enumerate(columns):
+        position = dict(row=i // 2 + 1, col=i % 2 + 1)
+        values = sample["rows"][column].to_numpy(dtype="float64")
+
+        if type in ["Histogram", "Histogram & KDE"]:
+            # Estimate how many filtered rows fall in each bin of the sampled values' range
+            edges = np.histogram_bin_edges(values, bins=bins)
+            bin_numbers = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, len(edges) - 2)
+            estimates = np.array([_estimate_total(sample, bin_numbers == b) for b in range(len(edges) - 1)])
+            fig.add_bar(x=(edges[:-1] + edges[1:]) / 2, y=estimates[:, 0], width=np.diff(edges), marker_color=SKY_BLUE,
+                        error_y=dict(array=Z_95 * estimates[:, 1]), name=column, **position)
+        else:
+            _add_box(fig, values, _weights(sample), column, SKY_BLUE, orientation="h", **position)
+
+    fig.update_layout(title=_preview_title(sample, "Distributions"), showlegend=False, bargap=0)
+    return fig
+
+
+def preview_frequency(sample, columns):
+    '''
+    Previews the frequency charts, the estimated count of filtered rows in each category with
+    95% confidence intervals. The gender, age group, platform and mental state counts are read
+    exactly from the rollup.
+
+    Parameters:
+    - sample: A sample from stratified_sample
+    - columns: The categorical columns to plot
+
+    Returns:
+    - A plotly Figure
+    '''
+    fig = _grid([column.replace("_", " ").title() for column in columns])
+    for i, column in enumerate(columns):
+        series = sample["rows"][column]
+        categories = _categories(series)
+        if column in ROLLUP_CELLS:
+            counts = _cell_counts(sample, column).reindex(categories, fill_value=0).to_numpy(dtype="float64")
+            estimates = np.column_stack([counts, np.zeros(len(counts))])
+        else:
+            estimates = np.array([_estimate_total(sample, series == category) for category in categories]).reshape(-1, 2)
+        fig.add_bar(x=[str(c) for c in categories], y=estimates[:, 0], marker_color=SKY_BLUE,
+                    error_y=dict(array=Z_95 * estimates[:, 1]), name=column, row=i // 2 + 1, col=i % 2 + 1)
+
+    fig.update_layout(title=_preview_title(sample, "Frequencies"), showlegend=False)
+    fig.update_xaxes(type="category")
+    return fig
+
+
+def preview_correlations(sample, fields, method, colour_map):
+    '''
+    Previews the correlation heatmap from the sampled rows, labelling each correlation with the
+    half width of its 95% confidence interval, from Fisher's z transform.
+
+    Parameters:
+    - sample: A sample from stratified_sample
+    - fields: The numerical columns to correlate
+    - method: "Pearson", "Spearman" or "Kendall"
+    - colour_map: The matplotlib colour map picked for the exact heatmap
+
+    Returns:
+    - A plotly Figure
+    '''
+    corr = sample["rows"][fields].corr(method=method.lower())
+    rows = len(sample["rows"])
+
+    # Kendall's tau has a smaller standard error than the other two
+    error = np.sqrt((0.437 if method == "Kendall" else 1) / max(rows - 3, 1))
+    z = np.arctanh(corr.clip(-0.999999, 0.999999).to_numpy())
+    half_width = (np.tanh(z + Z_95 * error) - np.tanh(z - Z_95 * error)) / 2
+
+    fig = go.Figure(go.Heatmap(
+        z=corr.to_numpy(), x=fields, y=fields, zmin=-1, zmax=1,
+        colorscale=PLOTLY_COLOUR_MAPS.get(colour_map, colour_map),
+        text=[[f"{r:.2f} ± {h:.2f}" for r, h in zip(*row)] for row in zip(corr.to_numpy(), half_width)],
+        texttemplate="%{text}"
+    ))
+    fig.update_layout(title=_preview_title(sample, f"Correlation Matrix ({method} Method)"), yaxis_autorange="reversed")
+    return fig
+
+
+def preview_category_vs_numeric(sample, chart_type, columns, category, title):
+    '''
+    Previews the category vs numeric chart. Bar charts show the estimated mean of each column in
+    each category with 95% confidence intervals, box and violin plots a box of the weighted quartiles.
+
+    Parameters:
+    - sample: A sample from stratified_sample
+    - chart_type: The chart type picked for the exact chart
+    - columns: The numerical columns to plot
+    - category: The categorical column to group by
+    - title: The chart title
+
+    Returns:
+    - A plotly Figure
+    '''
+    rows = sample["rows"]
+    categories = _categories(rows[category])
+    fig = go.Figure()
+
+    if chart_type in ["Box Plot", "Violin Plot"]:
+        weights = _weights(sample)
+        for value in categories:
+            in_category = (rows[category] == value).to_numpy()
+            _add_box(fig, rows[columns[0]].to_numpy(dtype="float64")[in_category], weights[in_category],
+                     str(value), SKY_BLUE, x=[str(value)])
+        fig.update_layout(showlegend=False, yaxis_title=columns[0].replace("_", " ").title())
+    else:
+        for i, column in enumerate(columns):
+            values = rows[column].to_numpy(dtype="float64")
+            estimates = np.array([_estimate_ratio(sample, values * (rows[category] == value), rows[category] == value)
+                                  for value in categories]).reshape(-1, 2)
+            fig.add_bar(x=[str(c) for c in categories], y=estimates[:, 0], name=column, marker_color=PASTEL[i % len(PASTEL)],
+                        error_y=dict(array=Z_95 * estimates[:, 1]))
+        fig.update_layout(barmode="group", yaxis_title="Mean Value", legend_title="Metric")
+
+    fig.update_layout(title=_preview_title(sample, title), xaxis_title=category.replace("_", " ").title(), xaxis_type="category")
+    return fig
+
+
+def preview_scatter(sample, x_axis, y_axis, hue):
+    '''
+    Previews the scatter plot with the sampled rows only.
+
+    Parameters:
+    - sample: A sample from stratified_sample
+    - x_axis: The numerical column on the x axis
+    - y_axis: The numerical column on the y axis
+    - hue: The categorical column to colour by, or "None"
+
+    Returns:
+    - A plotly Figure
+    '''
+    rows = sample["rows"]
+    fig = go.Figure()
+    groups = [(None, rows)] if hue == "None" else [(value, rows[rows[hue] == value]) for value in _categories(rows[hue])]
+    for i, (value, group) in enumerate(groups):
+        fig.add_scattergl(x=group[x_axis], y=group[y_axis], mode="markers", opacity=0.7,
+                          marker_color=SKY_BLUE if value is None else PASTEL[i % len(PASTEL)], name=str(value))
+
+    fig.update_layout(
+        title=_preview_title(sample, f"{x_axis.replace('_', ' ').title()} vs {y_axis.replace('_', ' ').title()}"),
+        xaxis_title=x_axis.replace("_", " ").title(),
+        yaxis_title=y_axis.replace("_", " ").title(),
+        showlegend=hue != "None",
+        legend_title=None if hue == "None" else hue
+    )
+    return fig
+
+
+def preview_stacked_category(sample, group_one, group_two, title):
+    '''
+    Previews the stacked category chart, the estimated share of each group_two value within each
+    group_one value with 95% confidence intervals. Shares between two of gender, age group,
+    platform and mental state are read exactly from the rollup.
+
+    Parameters:
+    - sample: A sample from stratified_sample
+    - group_one: main x-axis category
+    - group_two: sub-category stacked in each bar
+    - title: chart title
+
+    Returns:
+    - A plotly Figure
+    '''
+    rows = sample["rows"]
+    ones = _categories(rows[group_one])
+    twos = _categories(rows[group_two])
+    if group_one in ROLLUP_CELLS and group_two in ROLLUP_CELLS:
+        counts = _cell_counts(sample, [group_one, group_two]).unstack(fill_value=0).reindex(index=ones, columns=twos, fill_value=0)
+        shares = counts.div(counts.sum(axis=1).replace(0, np.nan), axis=0).to_numpy()
+
+    fig = go.Figure()
+    for i, two in enumerate(twos):
+        if group_one in ROLLUP_CELLS and group_two in ROLLUP_CELLS:
+            estimates = np.column_stack([shares[:, i], np.zeros(len(ones))])
+        else:
+            estimates = np.array([_estimate_ratio(sample, (rows[group_one] == one) & (rows[group_two] == two), rows[group_one] == one)
+                                  for one in ones]).reshape(-1, 2)
+        fig.add_bar(x=[str(one) for one in ones], y=estimates[:, 0], name=str(two), marker_color=PASTEL[i % len(PASTEL)],
+                    error_y=dict(array=Z_95 * estimates[:, 1]))
+
+    fig.update_layout(
+        barmode="stack",
+        title=_preview_title(sample, title),
+        yaxis_title="Proportion",
+        xaxis_title=group_one.replace("_", " ").title(),
+        legend_title=group_two,
+        xaxis_type="category"
+    )
+    return fig
@@ -0,0 +1,115 @@
+import importlib.abc
+import json
+import os
+import sys
+import threading
+import time
+
+# File the startup report is written to, next to the other caches
+PROFILE_FILE = "./.cache/startup_profile.json"
+
+# Process start, the import times and first paints are measured from here
+_started = time.perf_counter()
+
+# Self time of each module's import, the time of the first run of each page, and a lock for both
+_import_seconds = {}
+_first_paint = {}
+_profile_lock = threading.Lock()
+
+
+class _TimedLoader(importlib.abc.Loader):
+    '''Wraps a module loader to time its exec_module, not counting the modules it imports itself.'''
+
+    # Stack of [module name, start time, time spent importing other modules], one per import in progress
+    _stack = []
+
+    def __init__(self, loader):
+        self._loader = loader
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        start = time.perf_counter()
+        _TimedLoader._stack.append([module.__name__, start, 0.0])
+        try:
+            self._loader.exec_module(module)
+        finally:
+            name, _, nested = _TimedLoader._stack.pop()
+            total = time.perf_counter() - start
+            if _TimedLoader._stack:
+                _TimedLoader._stack[-1][2] += total
+            with _profile_lock:
+                _import_seconds[name] = total - nested
+
+    def __getattr__(self, name):
+        # Anything else, e.g. get_resource_reader, comes from the wrapped loader
+        return getattr(self._loader, name)
+
+
+class _ImportProfiler(importlib.abc.MetaPathFinder):
+    '''Finds modules with the other finders and wraps their loaders in _TimedLoader.'''
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader)
+                return spec
+        return None
+
+
+def install_import_profiler():
+    '''Starts timing every module imported from now on, doing nothing if it is already running.'''
+    if not any(isinstance(finder, _ImportProfiler) for finder in sys.meta_path):
+        sys.meta_path.insert(0, _ImportProfiler())
+
+
+def record_first_paint(page, seconds):
+    '''
+    Records how long a page's first run in this process took, which includes importing its modules.
+    Later runs are ignored as they reuse the imported modules.
+
+    Returns:
+    - True if this was the page's first run
+    '''
+    with _profile_lock:
+        if page in _first_paint:
+            return False
+        _first_paint[page] = {"seconds": seconds, "since_start": time.perf_counter() - _started}
+        return True
+
+
+def startup_report(top=25):
+    '''
+    Builds the startup report from what has been recorded so far.
+
+    Parameters:
+    - top: Number of slowest modules to list
+
+    Returns:
+    - Dictionary with the total import time, the slowest modules by self time and the first paint of each page
+    '''
+    with _profile_lock:
+        slowest = sorted(_import_seconds.items(), key=lambda item: item[1], reverse=True)[:top]
+        return {
+            "modules_imported": len(_import_seconds),
+            "import_seconds": round(sum(_import_seconds.values()), 4),
+            "slowest_imports": {name: round(seconds, 4) for name, seconds in slowest},
+            "first_paint": {page: {key: round(value, 4) for key, value in paint.items()}
+                            for page, paint in _first_paint.items()},
+        }
+
+
+def write_startup_report(path=PROFILE_FILE):
+    '''Writes the startup report to a JSON file and returns it.'''
+    report = startup_report()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(temp_path, path)
+    return report
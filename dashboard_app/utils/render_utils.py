@@ -0,0 +1,258 @@
+import io
+import os
+import hashlib
+import threading
+import streamlit as st
+from functools import lru_cache
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from utils.cache_utils import LRUCache, make_key
+from utils.compute_utils import result_ready, run_heavy, shared_result, start_heavy
+from utils.data_utils import dataset_version
+
+# The graph utils, versioned with each chart's own code. Found by path rather than imported, so a
+# cached image can be served without loading matplotlib and seaborn
+GRAPH_UTILS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "graph_utils.py")
+
+# Folder for the rendered images that are kept between server restarts
+FIGURE_CACHE_DIR = "./.cache/figures"
+
+# Size limits for the in memory and on disk caches
+MEMORY_CACHE_BYTES = 64 * 1024 * 1024
+DISK_CACHE_BYTES = 256 * 1024 * 1024
+
+# Process wide cache, shared by every session connected to this server
+_memory_cache = LRUCache(MEMORY_CACHE_BYTES)
+
+# Stops two sessions trimming the disk cache at the same time
+_disk_lock = threading.Lock()
+
+# Pyplot keeps one current figure for the whole process, so only one thread draws at a time
+_draw_lock = threading.Lock()
+
+# Seconds between checks for an exact chart computing behind a preview
+REFINE_POLL_SECONDS = 1
+
+# Shown under every preview
+PREVIEW_CAPTION = ("Estimated from a stratified sample of the filtered rows, error bars show 95% confidence intervals. "
+                   "The exact chart replaces it when it is ready.")
+
+
+def render_figure(fig, fmt="png"):
+    '''
+    Renders a matplotlib figure to image bytes and closes it.
+    Uses the same settings as st.pyplot so cached images look the same.
+
+    Parameters:
+    - fig: The matplotlib figure to render
+    - fmt: The image format, "png" or "svg"
+
+    Returns:
+    - The rendered image as bytes
+    '''
+    import matplotlib.pyplot as plt
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=200, bbox_inches="tight")
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=32)
+def _source_hash(path, mtime_ns):
+    '''Hashes a source file, cached until the file is modified.'''
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def code_version(draw):
+    '''
+    Versions the code that draws a chart, from the file the draw function is defined in
+    and the graph utils it calls, so editing either invalidates the old images.
+    '''
+    paths = [draw.__code__.co_filename, GRAPH_UTILS_FILE]
+    return tuple(_source_hash(path, os.stat(path).st_mtime_ns) for path in paths)
+
+
+def _disk_path(key, fmt):
+    '''Returns the on disk path for a cache key.'''
+    return os.path.join(FIGURE_CACHE_DIR, f"{key}.{fmt}")
+
+
+def _read_disk(key, fmt):
+    '''Reads a cached image from disk and marks it as recently used, or returns None if missing.'''
+    path = _disk_path(key, fmt)
+    try:
+        with open(path, "rb") as f:
+            image = f.read()
+        os.utime(path)
+        return image
+    except OSError:
+        return None
+
+
+def _write_disk(key, fmt, image):
+    '''Writes an image to the disk cache, then removes the least recently used images over the size limit.'''
+    with _disk_lock:
+        os.makedirs(FIGURE_CACHE_DIR, exist_ok=True)
+
+        # Write to a temporary file first so other processes never read a partial image
+        path = _disk_path(key, fmt)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(image)
+        os.replace(temp_path, path)
+
+        # Trim the oldest images until the folder is under its limit
+        entries = [entry for entry in os.scandir(FIGURE_CACHE_DIR) if not entry.name.endswith(".tmp")]
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in sorted(entries, key=lambda e: e.stat().st_mtime):
+            if total <= DISK_CACHE_BYTES:
+                break
+            total -= entry.stat().st_size
+            os.remove(entry.path)
+
+
+def cached_figure(name, params, filters, draw, fmt="png", prepare=None):
+    '''
+    Returns the rendered image for a chart, only calling draw if this exact chart
+    hasn't been rendered before. Charts are looked up in memory, then on disk.
+
+    Parameters:
+    - name: Name of the chart
+    - params: Dictionary of every option that changes the chart
+    - filters: The sidebar filter signature
+    - draw: Function that builds and returns the matplotlib figure
+    - fmt: The image format, "png" or "svg"
+    - prepare: Optional function that computes the data to draw, such as a shared_result, which is
+      passed to draw. Draw functions must not call run_heavy or shared_result themselves
+
+    Returns:
+    - The rendered image as bytes
+    '''
+
+    key = make_key(name, code_version(draw), sorted(params.items()), filters, dataset_version())
+
+    image = _memory_cache.get(key)
+    if image is None:
+        # Sessions asking for the same chart at once wait for one render on the shared worker pool
+        image = run_heavy(("figure", key, fmt), lambda: _render_cached(key, fmt, draw, prepare))
+
+    return image
+
+
+def _render_cached(key, fmt, draw, prepare=None):
+    '''Reads a chart from disk, or draws and saves it, then adds it to the memory cache.'''
+    # A render that finished just before this one started may have cached it already
+    image = _memory_cache.get(key)
+    if image is not None:
+        return image
+
+    image = _read_disk(key, fmt)
+    if image is None:
+        # Prepared before taking the draw lock, as waiting on the pool while holding it could deadlock
+        data = () if prepare is None else (prepare(),)
+        with _draw_lock:
+            image = render_figure(draw(*data), fmt)
+        try:
+            _write_disk(key, fmt, image)
+        except OSError:
+            # The disk cache is optional, e.g. on a read only file system
+            pass
+    _memory_cache.set(key, image)
+    return image
+
+
+def show_progressive(key, ready, exact, show, preview):
+    '''
+    Displays a chart straight away if it is cached, otherwise displays a preview and computes the
+    exact chart in the background. The preview is swapped for the exact chart once it is ready,
+    by a fragment that polls for it and then reruns the page.
+
+    Parameters:
+    - key: Hashable key of the exact chart, so sessions waiting for the same one share a computation
+    - ready: Function that returns True if the exact chart is cached
+    - exact: Function that returns the exact chart, computing it if it isn't cached
+    - show: Function that displays the exact chart
+    - preview: Function that returns a plotly Figure to show until the exact chart is ready
+    '''
+    # Without a session nobody sees the preview, so the warm-up and prefetch compute the exact chart
+    if get_script_run_ctx() is None or ready():
+        show(exact())
+        return
+
+    future = start_heavy(key, exact)
+
+    # Each preview gets its own container, as fragments in the same container would share an id
+    with st.container():
+        st.badge("Preview", icon=":material/hourglass_top:", color="orange")
+        st.plotly_chart(preview())
+        st.caption(PREVIEW_CAPTION)
+
+        @st.fragment(run_every=REFINE_POLL_SECONDS)
+        def refine():
+            """Reruns the page once the exact chart is ready, which then shows it from the cache."""
+            if not future.done():
+                return
+            if future.exception() is None:
+                st.rerun()
+            st.warning(f"The exact chart couldn't be computed, so the preview is shown: {future.exception()}")
+
+        refine()
+
+
+def _show_image(image, fmt):
+    '''Displays a rendered image.'''
+    if fmt == "svg":
+        st.image(image.decode("utf-8"), width="stretch")
+    else:
+        st.image(image, width="stretch")
+
+
+def show_figure(name, params, filters, draw, fmt="png", preview=None, prepare=None):
+    '''
+    Displays a chart through the render cache, in place of st.pyplot.
+
+    Parameters:
+    - name: Name of the chart
+    - params: Dictionary of every option that changes the chart
+    - filters: The sidebar filter signature
+    - draw: Function that builds and returns the matplotlib figure
+    - fmt: The image format, "png" or "svg"
+    - preview: Optional function that returns a plotly Figure to show while an uncached chart is drawn
+    - prepare: Optional function that computes the data passed to draw, see cached_figure
+    '''
+    if preview is None:
+        _show_image(cached_figure(name, params, filters, draw, fmt, prepare), fmt)
+        return
+
+    key = make_key(name, code_version(draw), sorted(params.items()), filters, dataset_version())
+    show_progressive(
+        ("figure", key, fmt),
+        lambda: key in _memory_cache or os.path.exists(_disk_path(key, fmt)),
+        lambda: cached_figure(name, params, filters, draw, fmt, prepare),
+        lambda image: _show_image(image, fmt),
+        preview
+    )
+
+
+def show_plotly(name, params, filters, build, preview=None):
+    '''
+    Displays a plotly chart, building its figure once for every session showing the same chart.
+
+    Parameters:
+    - name: Name of the chart
+    - params: Dictionary of every option that changes the chart
+    - filters: The sidebar filter signature
+    - build: Function that aggregates the data and returns the plotly Figure
+    - preview: Optional function that returns a plotly Figure to show while an uncached chart is built
+    '''
+    if preview is None:
+        st.plotly_chart(shared_result(name, params, filters, build))
+        return
+
+    show_progressive(
+        ("plotly", make_key(name, sorted(params.items()), filters, dataset_version())),
+        lambda: result_ready(name, params, filters),
+        lambda: shared_result(name, params, filters, build),
+        st.plotly_chart,
+        preview
+    )
@@ -0,0 +1,359 @@
+import math
+import os
+import threading
+import numpy as np
+from scipy import stats
+from utils.cache_utils import LRUCache
+from utils.data_utils import dataset_version, filter_mask, filter_signature
+from utils.stats_utils import ALPHA, HYPOTHESES
+
+# Resamples drawn by each task
+BATCH_SIZE = 1000
+
+# Most cells in an index matrix evaluated in one vectorised call. Each chunk's index matrix and
+# the copies gathered from it are this size, about 10 MB per int64 or float64 array, so the chunk
+# has fewer resamples the more rows there are. 250 resamples at a time for the 5,000 row dataset
+MAX_CHUNK_CELLS = 1_250_000
+
+# Limits on the number of permutations and bootstrap resamples
+MAX_PERMUTATIONS = 20_000
+BOOTSTRAPS = 2000
+
+# Confidence level of the bootstrap intervals, and of the interval around the permutation p-value
+# that decides when enough permutations have been run
+CONFIDENCE = 0.95
+
+# Worker processes for the resampling tasks
+WORKERS = min(4, os.cpu_count() or 1)
+
+# Process wide pool, created on first use and shared by every session
+_pool = None
+_pool_lock = threading.Lock()
+
+# Process wide cache of results per filter selection and dataset version, counted in entries
+_resampling_cache = LRUCache(64, sizeof=lambda results: 1)
+
+
+def _get_pool():
+    '''Returns the shared process pool, started with spawn as forking a threaded server isn't safe.'''
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Imported here so the page only loads multiprocessing once the checks are requested
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def prepare(df, hypothesis):
+    '''
+    Converts the columns one of the HYPOTHESES needs into plain numpy arrays, which are cheap to
+    send to the worker processes. Rows with missing values are dropped.
+
+    Returns:
+    - Dictionary of arrays for the statistic functions
+    '''
+    if hypothesis["test"] == "anova":
+        data = df[[hypothesis["value"], hypothesis["group"]]].dropna()
+        codes = data[hypothesis["group"]].cat.codes.to_numpy()
+        # Renumber the groups that are present so empty categories don't count as groups
+        _, codes = np.unique(codes, return_inverse=True)
+        return {"test": "anova", "values": data[hypothesis["value"]].to_numpy(dtype="float64"), "codes": codes}
+
+    if hypothesis["test"] == "chi_square":
+        data = df[[hypothesis["rows"], hypothesis["columns"]]].dropna()
+        _, rows = np.unique(data[hypothesis["rows"]].cat.codes.to_numpy(), return_inverse=True)
+        _, columns = np.unique(data[hypothesis["columns"]].cat.codes.to_numpy(), return_inverse=True)
+        return {"test": "chi_square", "rows": rows, "columns": columns}
+
+    data = df[[hypothesis["x"], hypothesis["y"]]].dropna()
+    return {"test": "correlation", "x": data[hypothesis["x"]].to_numpy(dtype="float64"), "y": data[hypothesis["y"]].to_numpy(dtype="float64")}
+
+
+def _rows(data):
+    '''Returns the number of rows in a dictionary from prepare.'''
+    return len(data["values"] if data["test"] == "anova" else data["rows"] if data["test"] == "chi_square" else data["x"])
+
+
+def _grouped_sums(codes, weights, groups):
+    '''
+    Sums weights per group for every row of a batch at once, by offsetting each row's group codes
+    so a single bincount covers the whole batch.
+
+    Parameters:
+    - codes: (batch, n) array of group codes
+    - weights: (batch, n) array of values to sum, or None to count
+    - groups: Number of groups
+
+    Returns:
+    - A (batch, groups) array of sums
+    '''
+    batch = codes.shape[0]
+    offsets = (np.arange(batch) * groups)[:, None]
+    sums = np.bincount((codes + offsets).ravel(), weights=None if weights is None else weights.ravel(), minlength=batch * groups)
+    return sums.reshape(batch, groups)
+
+
+def anova_f(values, codes):
+    '''
+    One way ANOVA F and η² for a batch of resamples.
+
+    Parameters:
+    - values: (batch, n) array of values
+    - codes: (batch, n) array of group codes
+
+    Returns:
+    - A tuple of (F, η²) arrays with one value per resample
+    '''
+    groups = int(codes.max()) + 1
+    n = values.shape[1]
+    count = _grouped_sums(codes, None, groups)
+    total = _grouped_sums(codes, values, groups)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        grand_total = values.sum(axis=1)
+        ss_total = (values ** 2).sum(axis=1) - grand_total ** 2 / n
+        ss_between = np.where(count > 0, total ** 2 / count, 0.0).sum(axis=1) - grand_total ** 2 / n
+        ss_within = ss_total - ss_between
+        k = (count > 0).sum(axis=1)
+        f = (ss_between / (k - 1)) / (ss_within / (n - k))
+        eta_squared = ss_between / ss_total
+    return f, eta_squared
+
+
+def chi_square_statistic(rows, columns):
+    '''
+    Chi-square statistic and Cramér's V for a batch of resamples.
+
+    Parameters:
+    - rows: (batch, n) array of row category codes
+    - columns: (batch, n) array of column category codes
+
+    Returns:
+    - A tuple of (chi-square, Cramér's V) arrays with one value per resample
+    '''
+    n_rows = int(rows.max()) + 1
+    n_columns = int(columns.max()) + 1
+    n = rows.shape[1]
+    table = _grouped_sums(rows * n_columns + columns, None, n_rows * n_columns).reshape(-1, n_rows, n_columns)
+
+    expected = table.sum(axis=2, keepdims=True) * table.sum(axis=1, keepdims=True) / n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Categories missing from a resample have zero expected counts and add nothing
+        chi2 = np.where(expected > 0, (table - expected) ** 2 / expected, 0.0).sum(axis=(1, 2))
+        cramers_v = np.sqrt(chi2 / (n * (min(n_rows, n_columns) - 1)))
+    return chi2, cramers_v
+
+
+def pearson_r(x, y):
+    '''
+    Pearson correlation for a batch of resamples.
+
+    Parameters:
+    - x, y: (batch, n) arrays of values
+
+    Returns:
+    - An array with one r per resample
+    '''
+    x = x - x.mean(axis=1, keepdims=True)
+    y = y - y.mean(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (x * y).sum(axis=1) / np.sqrt((x ** 2).sum(axis=1) * (y ** 2).sum(axis=1))
+
+
+def statistic(data, index, permute):
+    '''
+    Evaluates the test statistic and effect size on a batch of resamples.
+
+    Parameters:
+    - data: Dictionary from prepare
+    - index: (batch, n) index matrix, one resample per row
+    - permute: True if index permutes one variable against the other, False if it resamples whole rows
+
+    Returns:
+    - A tuple of (statistic, effect size) arrays with one value per resample
+    '''
+    if data["test"] == "anova":
+        # Permutations shuffle the group labels against the values, bootstraps resample rows
+        values = np.broadcast_to(data["values"], index.shape) if permute else data["values"][index]
+        return anova_f(values, data["codes"][index])
+
+    if data["test"] == "chi_square":
+        rows = np.broadcast_to(data["rows"], index.shape) if permute else data["rows"][index]
+        return chi_square_statistic(rows, data["columns"][index])
+
+    x = np.broadcast_to(data["x"], index.shape) if permute else data["x"][index]
+    r = pearson_r(x, data["y"][index])
+    return np.abs(r), r
+
+
+def resample_batch(data, seed, size, permute, observed=None):
+    '''
+    Runs one batch of resamples, in a worker process. The index matrices are generated and
+    evaluated a chunk at a time, with at most MAX_CHUNK_CELLS cells each, to bound memory.
+
+    Parameters:
+    - data: Dictionary from prepare
+    - seed: SeedSequence for this batch, so results don't depend on which worker runs it
+    - size: Number of resamples in the batch
+    - permute: True for permutations, False for bootstrap resamples
+    - observed: The observed statistic, permutations count the resamples at least this extreme
+
+    Returns:
+    - The number of permutations at least as extreme as observed, or the bootstrap effect sizes
+    '''
+    rng = np.random.default_rng(seed)
+    n = _rows(data)
+
+    # At least one resample per chunk, even when a single one has more rows than the limit
+    chunk_size = max(1, MAX_CHUNK_CELLS // n)
+
+    extreme = 0
+    effects = []
+    for start in range(0, size, chunk_size):
+        batch = min(chunk_size, size - start)
+        if permute:
+            index = rng.permuted(np.tile(np.arange(n), (batch, 1)), axis=1)
+            values, _ = statistic(data, index, permute=True)
+            extreme += int((values >= observed).sum())
+        else:
+            index = rng.integers(0, n, size=(batch, n))
+            effects.append(statistic(data, index, permute=False)[1])
+
+    return extreme if permute else np.concatenate(effects)
+
+
+def p_value_interval(extreme, permutations):
+    '''Clopper-Pearson interval for the permutation p-value after a number of permutations.'''
+    tail = (1 - CONFIDENCE) / 2
+    low = stats.beta.ppf(tail, extreme, permutations - extreme + 1) if extreme > 0 else 0.0
+    high = stats.beta.ppf(1 - tail, extreme + 1, permutations - extreme) if extreme < permutations else 1.0
+    return low, high
+
+
+def permutation_test(data, seed=42, alpha=ALPHA, max_permutations=MAX_PERMUTATIONS, pool=None):
+    '''
+    Permutation test of one hypothesis. Batches are run a round at a time, one per worker, and the
+    test stops once the confidence interval of the p-value lies entirely on one side of alpha.
+
+    Parameters:
+    - data: Dictionary from prepare
+    - seed: Seed for the permutations, the result is the same for any number of workers
+    - alpha: The significance level the p-value is compared with
+    - max_permutations: The most permutations to run
+    - pool: Executor for the batches, or None to run them in this process
+
+    Returns:
+    - Dictionary with observed, p_value, p_low, p_high, permutations and stopped_early
+    '''
+    # The identity permutation gives the statistic of the data as observed
+    observed = statistic(data, np.arange(_rows(data))[None, :], permute=True)[0][0]
+    batches = math.ceil(max_permutations / BATCH_SIZE)
+    seeds = np.random.SeedSequence(seed).spawn(batches)
+    round_size = WORKERS if pool is not None else 1
+
+    extreme = permutations = 0
+    stopped_early = False
+    for start in range(0, batches, round_size):
+        round_seeds = seeds[start:start + round_size]
+        if pool is None:
+            counts = [resample_batch(data, s, BATCH_SIZE, True, observed) for s in round_seeds]
+        else:
+            counts = [f.result() for f in [pool.submit(resample_batch, data, s, BATCH_SIZE, True, observed) for s in round_seeds]]
+
+        # Add the batches in seed order and check after each one, so the stopping point
+        # and the result don't depend on how many batches ran in parallel
+        for count in counts:
+            extreme += count
+            permutations += BATCH_SIZE
+
+            # Stop once more permutations couldn't change the conclusion
+            low, high = p_value_interval(extreme, permutations)
+            if (high < alpha or low > alpha) and permutations < batches * BATCH_SIZE:
+                stopped_early = True
+                break
+
+        if stopped_early:
+            break
+
+    low, high = p_value_interval(extreme, permutations)
+    return {
+        "observed": observed,
+        # Count the observed data as one of the permutations so the p-value is never 0
+        "p_value": (extreme + 1) / (permutations + 1),
+        "p_low": low,
+        "p_high": high,
+        "permutations": permutations,
+        "stopped_early": stopped_early,
+    }
+
+
+def bootstrap_interval(data, seed=42, bootstraps=BOOTSTRAPS, pool=None):
+    '''
+    Percentile bootstrap confidence interval of the effect size, η², Cramér's V or Pearson r.
+
+    Parameters:
+    - data: Dictionary from prepare
+    - seed: Seed for the resamples, the result is the same for any number of workers
+    - bootstraps: Number of bootstrap resamples
+    - pool: Executor for the batches, or None to run them in this process
+
+    Returns:
+    - A tuple of (low, high)
+    '''
+    batches = math.ceil(bootstraps / BATCH_SIZE)
+    seeds = np.random.SeedSequence([seed, 1]).spawn(batches)
+    sizes = [min(BATCH_SIZE, bootstraps - i * BATCH_SIZE) for i in range(batches)]
+
+    if pool is None:
+        effects = [resample_batch(data, s, size, False) for s, size in zip(seeds, sizes)]
+    else:
+        effects = [f.result() for f in [pool.submit(resample_batch, data, s, size, False) for s, size in zip(seeds, sizes)]]
+
+    tail = (1 - CONFIDENCE) / 2
+    low, high = np.nanquantile(np.concatenate(effects), [tail, 1 - tail])
+    return low, high
+
+
+def resampling_results(df, start_date, end_date, gender, age_group, platform, mental_state):
+    '''
+    Runs a permutation test and bootstrap interval for every hypothesis on the rows that pass the
+    sidebar filters, on the shared process pool. Cached per filter selection and dataset version.
+
+    Parameters:
+    - df: The full, unfiltered dataset
+    - start_date, end_date, gender, age_group, platform, mental_state: The sidebar filters
+
+    Returns:
+    - Dictionary mapping each hypothesis name to its result dictionary, None if there are too few rows
+    '''
+    key = (filter_signature(start_date, end_date, gender, age_group, platform, mental_state), dataset_version())
+    results = _resampling_cache.get(key)
+
+    if results is None:
+        df_filtered = df[filter_mask(df, start_date, end_date, gender, age_group, platform, mental_state)]
+        pool = _get_pool()
+
+        results = {}
+        for hypothesis in HYPOTHESES:
+            data = prepare(df_filtered, hypothesis)
+            if not _testable(data):
+                results[hypothesis["name"]] = None
+                continue
+            result = permutation_test(data, pool=pool)
+            result["effect_low"], result["effect_high"] = bootstrap_interval(data, pool=pool)
+            results[hypothesis["name"]] = result
+
+        _resampling_cache.set(key, results)
+
+    return results
+
+
+def _testable(data):
+    '''Whether there are enough rows and distinct values to resample.'''
+    if data["test"] == "anova":
+        return len(data["values"]) > 2 and data["codes"].max(initial=0) >= 1 and np.ptp(data["values"]) > 0
+    if data["test"] == "chi_square":
+        return len(data["rows"]) > 2 and data["rows"].max(initial=0) >= 1 and data["columns"].max(initial=0) >= 1
+    return len(data["x"]) > 2 and np.ptp(data["x"]) > 0 and np.ptp(data["y"]) > 0
@@ -0,0 +1,180 @@
+import atexit
+import fcntl
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Folder shared by every dashboard process on the machine, holding the manifest, its lock and
+# versioned copies of resources that have no other home
+RESIDENCY_DIR = "./.cache/residency"
+
+# The manifest lists each resource's versions, where they are and which processes hold them
+MANIFEST_FILE = os.path.join(RESIDENCY_DIR, "manifest.json")
+LOCK_FILE = os.path.join(RESIDENCY_DIR, "manifest.lock")
+
+# Versions this process holds, by resource name
+_held = {}
+_thread_lock = threading.Lock()
+
+
+@contextmanager
+def manifest_lock():
+    '''
+    Holds an exclusive lock on the manifest across every process on the machine, and across the
+    threads of this one, since flock locks are shared by a process's threads.
+    '''
+    os.makedirs(RESIDENCY_DIR, exist_ok=True)
+    with _thread_lock, open(LOCK_FILE, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read_manifest():
+    '''Reads the manifest, or an empty one if no process has written it yet. Call with the lock held.'''
+    if not os.path.exists(MANIFEST_FILE):
+        return {"resources": {}}
+    with open(MANIFEST_FILE) as f:
+        return json.load(f)
+
+
+def _write_manifest(manifest):
+    '''Replaces the manifest in one rename. Call with the lock held.'''
+    temp_path = f"{MANIFEST_FILE}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, MANIFEST_FILE)
+
+
+def _is_alive(pid):
+    '''Checks whether a process is still running.'''
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _remove(path):
+    '''Deletes a resource's file or folder. Processes that still map it keep their pages until they unmap them.'''
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def _collect(manifest):
+    '''
+    Drops holders that are no longer running, then deletes every version that no process holds
+    except each resource's newest, which stays for the next process to attach to.
+    '''
+    for resource in manifest["resources"].values():
+        for version in list(resource["versions"]):
+            entry = resource["versions"][version]
+            entry["holders"] = [pid for pid in entry["holders"] if _is_alive(pid)]
+            if version != resource["current"] and not entry["holders"]:
+                _remove(entry["path"])
+                del resource["versions"][version]
+
+
+def copy_folder(source, path):
+    '''Copies a folder to path through a temporary folder, for use as a populate function.'''
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    shutil.rmtree(temp_path, ignore_errors=True)
+    shutil.copytree(source, temp_path)
+    os.replace(temp_path, path)
+
+
+def acquire(name, version, path, populate=None):
+    '''
+    Attaches this process to a version of a shared resource. The first process to ask for a
+    version creates it with populate while holding the manifest lock, so the others wait and then
+    attach to the same files instead of building their own copy. The process is recorded as a
+    holder, so the version isn't deleted while it's in use, and its hold on any older version of
+    the resource is released.
+
+    Parameters:
+    - name: Name of the resource, e.g. the dataset file
+    - version: Version string, usually from the source file's size and modified time
+    - path: Where the version's files live
+    - populate: Function that writes the files at path, None if they already exist
+
+    Returns:
+    - The path, ready to be memory mapped read only
+    '''
+    with _thread_lock:
+        if _held.get(name) == (version, path):
+            return path
+
+    with manifest_lock():
+        manifest = _read_manifest()
+        resource = manifest["resources"].setdefault(name, {"current": version, "versions": {}})
+        entry = resource["versions"].get(version)
+
+        # Build the version unless another process already has, a new version becomes the current one
+        if entry is None or not os.path.exists(entry["path"]):
+            if populate is not None:
+                populate(path)
+            entry = {"path": path, "created": datetime.now(timezone.utc).isoformat(timespec="seconds"), "holders": []}
+            resource["versions"][version] = entry
+            resource["current"] = version
+
+        pid = os.getpid()
+        for other_version, other in resource["versions"].items():
+            if other_version != version and pid in other["holders"]:
+                other["holders"].remove(pid)
+        if pid not in entry["holders"]:
+            entry["holders"].append(pid)
+
+        _collect(manifest)
+        _write_manifest(manifest)
+
+    with _thread_lock:
+        _held[name] = (version, path)
+    return path
+
+
+def release_all():
+    '''Releases every resource this process holds, run when the process exits.'''
+    with _thread_lock:
+        if not _held:
+            return
+        _held.clear()
+
+    with manifest_lock():
+        manifest = _read_manifest()
+        for resource in manifest["resources"].values():
+            for entry in resource["versions"].values():
+                if os.getpid() in entry["holders"]:
+                    entry["holders"].remove(os.getpid())
+        _collect(manifest)
+        _write_manifest(manifest)
+
+
+def residency_status():
+    '''
+    Returns a summary of the shared resources for monitoring.
+
+    Returns:
+    - Dictionary by resource name with the current version and each version's live holder count
+    '''
+    with manifest_lock():
+        manifest = _read_manifest()
+    return {
+        name: {
+            "current": resource["current"],
+            "versions": {version: len([pid for pid in entry["holders"] if _is_alive(pid)])
+                         for version, entry in resource["versions"].items()},
+        }
+        for name, resource in manifest["resources"].items()
+    }
+
+
+atexit.register(release_all)
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+# Category values for each categorical column, in display order
+CATEGORIES = {
+    "month_name": ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"],
+    "day_of_week": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
+    "age_group": ["<18", "18-24", "25-34", "35-44", "45-54", "55+"],
+    "gender": ["Female", "Male", "Other"],
+    "platform": ["Facebook", "Instagram", "Snapchat", "TikTok", "Twitter", "WhatsApp", "YouTube"],
+    "mental_state": ["Healthy", "Stressed", "At Risk"],
+}
+
+# Categorical columns whose categories have a natural order
+ORDERED_CATEGORIES = ["month_name", "day_of_week", "age_group", "mental_state"]
+
+
+def _category(column):
+    '''Returns the CategoricalDtype for a categorical column.'''
+    return pd.CategoricalDtype(CATEGORIES[column], ordered=column in ORDERED_CATEGORIES)
+
+
+# Each row's position in the raw CSV. The cleaned file is sorted by date, so the notebooks and the
+# training code order the rows by this before splitting them, which keeps the splits the same
+ROW_ID_COLUMN = "row_id"
+
+# Compact schema of the cleaned dataset, shared by the ETL notebook, the dashboard and the training code.
+# The smallest types that fit each column are used: ages and 1-10 levels fit in int8,
+# minute and interaction counts in int16, and the categorical columns are dictionary encoded
+CLEANED_SCHEMA = {
+    ROW_ID_COLUMN: np.dtype("int32"),
+    "date": np.dtype("datetime64[ns]"),
+    "year": np.dtype("int16"),
+    "month": np.dtype("int8"),
+    "month_name": _category("month_name"),
+    "week_number": np.dtype("int8"),
+    "day_of_week": _category("day_of_week"),
+    "age": np.dtype("int8"),
+    "age_group": _category("age_group"),
+    "gender": _category("gender"),
+    "platform": _category("platform"),
+    "daily_screen_time_min": np.dtype("int16"),
+    "social_media_time_min": np.dtype("int16"),
+    "sleep_hours": np.dtype("float32"),
+    "physical_activity_min": np.dtype("int16"),
+    "negative_interactions_count": np.dtype("int16"),
+    "positive_interactions_count": np.dtype("int16"),
+    "interaction_total": np.dtype("int16"),
+    "interaction_negative_ratio": np.dtype("float32"),
+    "anxiety_level": np.dtype("int8"),
+    "stress_level": np.dtype("int8"),
+    "mood_level": np.dtype("int8"),
+    "mental_state": _category("mental_state"),
+}
+
+# Schema of the new rows given to the training commands, which aren't from the raw CSV so have no row id
+NEW_ROWS_SCHEMA = {column: dtype for column, dtype in CLEANED_SCHEMA.items() if column != ROW_ID_COLUMN}
+
+
+def apply_schema(df, schema=CLEANED_SCHEMA):
+    '''
+    Casts a DataFrame to a schema, checking that no values are lost on the way.
+
+    Parameters:
+    - df: The DataFrame to cast, it must have every column in the schema
+    - schema: Dictionary mapping each column to its dtype
+
+    Returns:
+    - A new DataFrame with only the schema columns, in schema order and with the schema dtypes
+
+    Raises:
+    - ValueError if a column is missing, an integer column has missing or out of range values,
+      or a categorical column has values that aren't in its categories
+    '''
+    missing = [column for column in schema if column not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {missing}")
+
+    columns = {}
+    for column, dtype in schema.items():
+        series = df[column]
+
+        if isinstance(dtype, pd.CategoricalDtype):
+            # Values that aren't in the categories would silently become NaN
+            unknown = set(series.dropna().unique()) - set(dtype.categories)
+            if unknown:
+                raise ValueError(f"Column {column} has values that aren't in its categories: {sorted(map(str, unknown))}")
+            columns[column] = series.astype(dtype)
+
+        elif dtype.kind in "iu":
+            # Integer columns can't hold missing values and must fit the smaller type
+            if series.isna().any():
+                raise ValueError(f"Column {column} has missing values so can't be stored as {dtype}")
+            info = np.iinfo(dtype)
+            if len(series) and (series.min() < info.min or series.max() > info.max):
+                raise ValueError(f"Column {column} has values outside the {dtype} range {info.min} to {info.max}")
+            columns[column] = series.astype(dtype)
+
+        else:
+            columns[column] = series.astype(dtype)
+
+    return pd.DataFrame(columns, index=df.index)
+
+
+def validate_schema(df, schema=CLEANED_SCHEMA):
+    '''
+    Checks that a DataFrame already matches a schema, e.g. after loading a file written by the ETL.
+
+    Parameters:
+    - df: The DataFrame to check
+    - schema: Dictionary mapping each column to its dtype
+
+    Raises:
+    - ValueError listing every column that is missing or has a different dtype
+    '''
+    problems = []
+    for column, dtype in schema.items():
+        if column not in df.columns:
+            problems.append(f"{column} is missing")
+        elif df[column].dtype != dtype:
+            problems.append(f"{column} is {df[column].dtype}, expected {dtype}")
+
+    if problems:
+        raise ValueError("Dataset doesn't match the schema: " + "; ".join(problems))
@@ -0,0 +1,253 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from concurrent.futures import ThreadPoolExecutor
+from scipy import stats
+from utils.cache_utils import LRUCache
+from utils.data_utils import dataset_version, filter_mask, filter_signature
+
+# Numerical fields from the data visualisation page that are screened against every other field
+SCREENING_NUMERIC = [
+    "age", "daily_screen_time_min", "social_media_time_min", "sleep_hours", "physical_activity_min",
+    "negative_interactions_count", "positive_interactions_count", "interaction_total", "interaction_negative_ratio",
+    "anxiety_level", "stress_level", "mood_level",
+]
+
+# Categorical fields from the data visualisation page that are screened against every other field
+SCREENING_CATEGORICAL = ["age_group", "gender", "platform", "mental_state", "month_name", "day_of_week"]
+
+# Multiple testing corrections offered on the screening page
+CORRECTIONS = ["Benjamini-Hochberg", "Bonferroni", "None"]
+
+# Process wide cache of screening results per filter selection and dataset version, counted in entries
+_screening_cache = LRUCache(64, sizeof=lambda results: 1)
+
+
+def _one_hot(df, categoricals):
+    '''
+    Builds one sparse one hot matrix covering every categorical column, so a single matrix product
+    gives the grouped moments or contingency tables for all of them. Missing categories get no column.
+
+    Returns:
+    - A tuple of (n rows x total categories CSR matrix, list of category counts per column)
+    '''
+    sizes = [len(df[column].cat.categories) for column in categoricals]
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    rows, columns = [], []
+    for column, offset in zip(categoricals, offsets):
+        codes = df[column].cat.codes.to_numpy()
+        present = np.flatnonzero(codes >= 0)
+        rows.append(present)
+        columns.append(codes[present].astype("int64") + offset)
+
+    rows = np.concatenate(rows)
+    columns = np.concatenate(columns)
+    matrix = sp.csr_matrix((np.ones(len(rows)), (rows, columns)), shape=(len(df), sum(sizes)))
+    return matrix, sizes
+
+
+def _numeric_matrix(df, numerics):
+    '''
+    Stacks the numerical columns into a float64 matrix with missing values set to 0, plus a mask of the present values.
+    '''
+    values = np.column_stack([df[column].to_numpy(dtype="float64", na_value=np.nan) for column in numerics])
+    present = ~np.isnan(values)
+    return np.where(present, values, 0.0), present.astype("float64")
+
+
+def screen_anova(one_hot, sizes, values, present, numerics, categoricals):
+    '''
+    One way ANOVA of every numerical column across every categorical column. The counts, sums and
+    sums of squares of every group of every categorical column come from one sparse matrix product.
+
+    Returns:
+    - A DataFrame with one row per pair
+    '''
+    # Grouped moments for every category of every categorical column and every numerical column at once
+    moments = one_hot.T @ np.hstack([present, values, values ** 2])
+    count, total, sumsq = np.split(np.asarray(moments), 3, axis=1)
+
+    # Per categorical column totals, using the start of each block of categories
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    n = np.add.reduceat(count, starts, axis=0)
+    grand_mean = np.add.reduceat(total, starts, axis=0) / np.where(n > 0, n, np.nan)
+
+    # Between and within group sums of squares for every group, empty groups add nothing
+    with np.errstate(divide="ignore", invalid="ignore"):
+        group_mean = np.where(count > 0, total / count, 0.0)
+        between = np.where(count > 0, count * (group_mean - np.repeat(grand_mean, sizes, axis=0)) ** 2, 0.0)
+        within = np.where(count > 0, sumsq - total ** 2 / count, 0.0)
+
+    ss_between = np.add.reduceat(between, starts, axis=0)
+    ss_within = np.add.reduceat(within, starts, axis=0)
+    groups = np.add.reduceat((count > 0).astype("float64"), starts, axis=0)
+    df_between = groups - 1
+    df_within = n - groups
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        valid = (df_between >= 1) & (df_within >= 1) & (ss_within > 0)
+        f = np.where(valid, (ss_between / df_between) / (ss_within / df_within), np.nan)
+        eta_squared = ss_between / (ss_between + ss_within)
+    p = stats.f.sf(f, df_between, df_within)
+
+    return pd.DataFrame({
+        "test": "ANOVA",
+        "field_one": np.repeat(numerics, len(categoricals)).tolist(),
+        "field_two": np.tile(categoricals, len(numerics)).tolist(),
+        "statistic": f.T.ravel(),
+        "dof": [f"{a:.0f}, {b:.0f}" for a, b in zip(df_between.T.ravel(), df_within.T.ravel())],
+        "effect_size": eta_squared.T.ravel(),
+        "effect_measure": "η²",
+        "n": n.T.ravel().astype("int64"),
+        "p_value": p.T.ravel(),
+    })
+
+
+def screen_chi_square(one_hot, sizes, categoricals):
+    '''
+    Chi-square test of independence for every pair of categorical columns. Every contingency table
+    is a block of one co-occurrence matrix built with a single sparse matrix product.
+
+    Returns:
+    - A DataFrame with one row per pair
+    '''
+    co_occurrence = (one_hot.T @ one_hot).toarray()
+    starts = np.concatenate([[0], np.cumsum(sizes)])
+
+    records = []
+    for i in range(len(categoricals)):
+        for j in range(i + 1, len(categoricals)):
+            table = co_occurrence[starts[i]:starts[i + 1], starts[j]:starts[j + 1]]
+
+            # Categories that the filters removed would give zero expected counts
+            table = table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0]
+            n = table.sum()
+            rows, columns = table.shape
+
+            if rows < 2 or columns < 2:
+                chi2, dof, cramers_v = np.nan, 0, np.nan
+            else:
+                expected = np.outer(table.sum(axis=1), table.sum(axis=0)) / n
+                chi2 = ((table - expected) ** 2 / expected).sum()
+                dof = (rows - 1) * (columns - 1)
+                cramers_v = np.sqrt(chi2 / (n * (min(rows, columns) - 1)))
+
+            records.append((categoricals[i], categoricals[j], chi2, dof, cramers_v, int(n)))
+
+    results = pd.DataFrame(records, columns=["field_one", "field_two", "statistic", "dof", "effect_size", "n"])
+    results["p_value"] = stats.chi2.sf(results["statistic"], results["dof"].replace(0, np.nan))
+    results["dof"] = results["dof"].astype(str)
+    results.insert(0, "test", "Chi-square")
+    results.insert(6, "effect_measure", "Cramér's V")
+    return results
+
+
+def screen_correlation(values, present, numerics):
+    '''
+    Pearson correlation of every pair of numerical columns, using the rows where both are present.
+    Every pairwise count, sum and cross product comes from a matrix product, and the p-values from the t statistic.
+
+    Returns:
+    - A DataFrame with one row per pair
+    '''
+    n = present.T @ present
+    sum_x = values.T @ present
+    sum_xx = (values ** 2).T @ present
+    sum_xy = values.T @ values
+
+    # Pearson r from the pairwise sums, sum_x.T holds the sums of the second column over the same rows
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = n * sum_xy - sum_x * sum_x.T
+        r = covariance / np.sqrt((n * sum_xx - sum_x ** 2) * (n * sum_xx.T - sum_x.T ** 2))
+        r = np.clip(r, -1.0, 1.0)
+        t = r * np.sqrt((n - 2) / (1 - r ** 2))
+    p = 2 * stats.t.sf(np.abs(t), n - 2)
+
+    i, j = np.triu_indices(len(numerics), k=1)
+    return pd.DataFrame({
+        "test": "Pearson correlation",
+        "field_one": np.array(numerics)[i],
+        "field_two": np.array(numerics)[j],
+        "statistic": t[i, j],
+        "dof": (n[i, j] - 2).astype("int64").astype(str),
+        "effect_size": r[i, j],
+        "effect_measure": "r",
+        "n": n[i, j].astype("int64"),
+        "p_value": p[i, j],
+    })
+
+
+def run_screening(df, numerics=SCREENING_NUMERIC, categoricals=SCREENING_CATEGORICAL):
+    '''
+    Runs every numerical x categorical ANOVA, categorical x categorical chi-square and numerical x
+    numerical correlation. The three families run in parallel threads, numpy and scipy release the GIL
+    for the matrix products.
+
+    Parameters:
+    - df: The DataFrame to screen
+    - numerics: The numerical columns
+    - categoricals: The categorical columns
+
+    Returns:
+    - A DataFrame with one row per tested pair and the raw p-values
+    '''
+    one_hot, sizes = _one_hot(df, categoricals)
+    values, present = _numeric_matrix(df, numerics)
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        families = [
+            executor.submit(screen_anova, one_hot, sizes, values, present, numerics, categoricals),
+            executor.submit(screen_chi_square, one_hot, sizes, categoricals),
+            executor.submit(screen_correlation, values, present, numerics),
+        ]
+        return pd.concat([family.result() for family in families], ignore_index=True)
+
+
+def adjust_p_values(p_values, method):
+    '''
+    Corrects p-values for multiple testing. Tests that couldn't be run keep a NaN p-value and aren't counted.
+
+    Parameters:
+    - p_values: Array of p-values
+    - method: One of CORRECTIONS
+
+    Returns:
+    - A numpy array of adjusted p-values
+    '''
+    p_values = np.asarray(p_values, dtype="float64")
+    adjusted = p_values.copy()
+    tested = np.flatnonzero(~np.isnan(p_values))
+    m = len(tested)
+
+    if method == "Bonferroni":
+        adjusted[tested] = np.minimum(p_values[tested] * m, 1.0)
+
+    elif method == "Benjamini-Hochberg":
+        # Scale each p-value by m / rank, then make them monotonic from the largest down
+        order = tested[np.argsort(p_values[tested])]
+        scaled = p_values[order] * m / np.arange(1, m + 1)
+        adjusted[order] = np.minimum(np.minimum.accumulate(scaled[::-1])[::-1], 1.0)
+
+    return adjusted
+
+
+def screening_results(df, start_date, end_date, gender, age_group, platform, mental_state):
+    '''
+    Screens the rows that pass the sidebar filters, cached per filter selection and dataset version.
+
+    Parameters:
+    - df: The full, unfiltered dataset
+    - start_date, end_date, gender, age_group, platform, mental_state: The sidebar filters
+
+    Returns:
+    - The DataFrame from run_screening
+    '''
+    key = (filter_signature(start_date, end_date, gender, age_group, platform, mental_state), dataset_version())
+    results = _screening_cache.get(key)
+
+    if results is None:
+        results = run_screening(df[filter_mask(df, start_date, end_date, gender, age_group, platform, mental_state)])
+        _screening_cache.set(key, results)
+
+    return results
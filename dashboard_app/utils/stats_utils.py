@@ -0,0 +1,274 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+from utils.cache_utils import LRUCache
+from utils.data_utils import dataset_version, filter_mask, filter_signature
+
+# Significance level used for every conclusion on the hypothesis page
+ALPHA = 0.05
+
+# The hypotheses shown on the hypothesis page, tested in this order
+HYPOTHESES = [
+    {"name": "Sleep vs Age Group", "test": "anova", "value": "sleep_hours", "group": "age_group"},
+    {"name": "Stress vs Platform", "test": "anova", "value": "stress_level", "group": "platform"},
+    {"name": "Platform vs Mental State", "test": "chi_square", "rows": "platform", "columns": "mental_state"},
+    {"name": "Sleep vs Mental State", "test": "anova", "value": "sleep_hours", "group": "mental_state"},
+    {"name": "Screen Time vs Stress", "test": "correlation", "x": "daily_screen_time_min", "y": "stress_level"},
+    {"name": "Negative Interaction Ratio vs Stress", "test": "correlation", "x": "interaction_negative_ratio", "y": "stress_level"},
+]
+
+# Post hoc comparisons offered for the ANOVA hypotheses
+POSTHOC_METHODS = ["Tukey HSD", "Games-Howell"]
+
+# Process wide cache of test results per filter selection and dataset version, counted in entries
+_results_cache = LRUCache(256, sizeof=lambda results: 1)
+
+# Process wide cache of group summaries per column pair, filter selection and dataset version
+_summaries_cache = LRUCache(1024, sizeof=lambda summaries: 1)
+
+
+def group_summaries(df, value, group):
+    '''
+    Works out the count, sum and sum of squares of a numerical column for each group in one groupby.
+    These are enough for ANOVA and post hoc tests without going back to the rows.
+
+    Parameters:
+    - df: The DataFrame containing the data
+    - value: The numerical column
+    - group: The categorical column to group by
+
+    Returns:
+    - A DataFrame indexed by group with count, sum and sumsq columns, groups with no rows are dropped
+    '''
+    values = df[value].astype("float64")
+    summaries = (
+        pd.DataFrame({"value": values, "square": values ** 2, group: df[group]})
+        .dropna(subset=["value"])
+        .groupby(group, observed=True)
+        .agg(count=("value", "size"), sum=("value", "sum"), sumsq=("square", "sum"))
+    )
+    return summaries[summaries["count"] > 0]
+
+
+def anova_from_summaries(summaries):
+    '''
+    One way ANOVA from per group counts, sums and sums of squares.
+
+    Parameters:
+    - summaries: DataFrame with count, sum and sumsq columns, one row per group
+
+    Returns:
+    - Dictionary with f, p, eta_squared, df_between, df_within and n, f and p are NaN if the test can't be run
+    '''
+    count = summaries["count"].to_numpy(dtype="float64")
+    total = summaries["sum"].to_numpy(dtype="float64")
+    sumsq = summaries["sumsq"].to_numpy(dtype="float64")
+
+    n = count.sum()
+    k = len(count)
+    df_between = max(k - 1, 0)
+    df_within = max(n - k, 0)
+
+    # Split the total sum of squares into the part between the group means and the part within the groups
+    grand_mean = total.sum() / n if n else np.nan
+    ss_between = (count * (total / count - grand_mean) ** 2).sum()
+    ss_within = (sumsq - total ** 2 / count).sum()
+    ss_total = ss_between + ss_within
+
+    if df_between < 1 or df_within < 1 or ss_within <= 0:
+        f = p = np.nan
+    else:
+        f = (ss_between / df_between) / (ss_within / df_within)
+        p = stats.f.sf(f, df_between, df_within)
+
+    return {
+        "f": f,
+        "p": p,
+        "eta_squared": ss_between / ss_total if ss_total > 0 else np.nan,
+        "df_between": int(df_between),
+        "df_within": int(df_within),
+        "n": int(n),
+    }
+
+
+def chi_square(df, rows, columns):
+    '''
+    Chi-square test of independence on a contingency table built in one groupby.
+
+    Parameters:
+    - df: The DataFrame containing the data
+    - rows: The first categorical column
+    - columns: The second categorical column
+
+    Returns:
+    - Dictionary with chi2, p, dof and n, chi2 and p are NaN if the table is smaller than 2x2
+    '''
+    table = df.groupby([rows, columns], observed=True).size().unstack(fill_value=0)
+
+    # Categories that the filters removed would give zero expected counts
+    table = table.loc[table.sum(axis=1) > 0, table.sum(axis=0) > 0]
+    n = int(table.to_numpy().sum())
+
+    if table.shape[0] < 2 or table.shape[1] < 2:
+        return {"chi2": np.nan, "p": np.nan, "dof": 0, "n": n}
+
+    chi2, p, dof, _ = stats.chi2_contingency(table.to_numpy())
+    return {"chi2": chi2, "p": p, "dof": int(dof), "n": n}
+
+
+def correlation(df, x, y):
+    '''
+    Pearson and Spearman correlations between two numerical columns, skipping rows with missing values.
+
+    Returns:
+    - Dictionary with pearson_r, pearson_p, spearman_rho, spearman_p and n, NaN if there are too few rows
+    '''
+    data = df[[x, y]].dropna().astype("float64")
+    n = len(data)
+
+    if n < 3 or data[x].nunique() < 2 or data[y].nunique() < 2:
+        return {"pearson_r": np.nan, "pearson_p": np.nan, "spearman_rho": np.nan, "spearman_p": np.nan, "n": n}
+
+    pearson_r, pearson_p = stats.pearsonr(data[x], data[y])
+    spearman_rho, spearman_p = stats.spearmanr(data[x], data[y])
+    return {"pearson_r": pearson_r, "pearson_p": pearson_p, "spearman_rho": spearman_rho, "spearman_p": spearman_p, "n": n}
+
+
+def run_hypothesis(df, hypothesis):
+    '''
+    Runs one of the HYPOTHESES on a DataFrame.
+
+    Returns:
+    - The result dictionary from the matching test
+    '''
+    if hypothesis["test"] == "anova":
+        return anova_from_summaries(group_summaries(df, hypothesis["value"], hypothesis["group"]))
+    if hypothesis["test"] == "chi_square":
+        return chi_square(df, hypothesis["rows"], hypothesis["columns"])
+    return correlation(df, hypothesis["x"], hypothesis["y"])
+
+
+def hypothesis_results(df, start_date, end_date, gender, age_group, platform, mental_state):
+    '''
+    Runs every hypothesis test on the rows that pass the sidebar filters. Results are cached per
+    filter selection and dataset version, so they are only worked out again when either changes.
+
+    Parameters:
+    - df: The full, unfiltered dataset
+    - start_date, end_date, gender, age_group, platform, mental_state: The sidebar filters
+
+    Returns:
+    - Dictionary mapping each hypothesis name to its result dictionary
+    '''
+    key = (filter_signature(start_date, end_date, gender, age_group, platform, mental_state), dataset_version())
+    results = _results_cache.get(key)
+
+    if results is None:
+        df_filtered = df[filter_mask(df, start_date, end_date, gender, age_group, platform, mental_state)]
+        results = {hypothesis["name"]: run_hypothesis(df_filtered, hypothesis) for hypothesis in HYPOTHESES}
+        _results_cache.set(key, results)
+
+    return results
+
+
+def cached_group_summaries(df, value, group, start_date, end_date, gender, age_group, platform, mental_state):
+    '''
+    Returns group_summaries for the rows that pass the sidebar filters, cached per filter selection
+    and dataset version so post hoc tests never go back to the rows once the summaries are known.
+
+    Parameters:
+    - df: The full, unfiltered dataset
+    - value: The numerical column
+    - group: The categorical column to group by
+    - start_date, end_date, gender, age_group, platform, mental_state: The sidebar filters
+
+    Returns:
+    - The DataFrame from group_summaries
+    '''
+    key = (value, group, filter_signature(start_date, end_date, gender, age_group, platform, mental_state), dataset_version())
+    summaries = _summaries_cache.get(key)
+
+    if summaries is None:
+        summaries = group_summaries(df[filter_mask(df, start_date, end_date, gender, age_group, platform, mental_state)], value, group)
+        _summaries_cache.set(key, summaries)
+
+    return summaries
+
+
+def posthoc_from_summaries(summaries, method):
+    '''
+    Pairwise comparisons of every pair of group means, from per group counts, sums and sums of
+    squares, so the cost depends only on the number of groups. Tukey HSD uses the pooled variance
+    and assumes equal variances, Games-Howell uses each group's own variance and Welch's degrees of freedom.
+
+    Parameters:
+    - summaries: DataFrame with count, sum and sumsq columns, one row per group
+    - method: One of POSTHOC_METHODS
+
+    Returns:
+    - A tuple of (mean difference, p-value) DataFrames indexed by group on both axes, the
+      difference is the row group's mean minus the column group's mean
+    '''
+    # Groups need two rows for a variance
+    summaries = summaries[summaries["count"] >= 2]
+    groups = summaries.index
+    count = summaries["count"].to_numpy(dtype="float64")
+    mean = summaries["sum"].to_numpy(dtype="float64") / count
+    variance = (summaries["sumsq"].to_numpy(dtype="float64") - count * mean ** 2) / (count - 1)
+    k = len(groups)
+
+    difference = mean[:, None] - mean[None, :]
+    p = np.full((k, k), np.nan)
+    i, j = np.triu_indices(k, k=1)
+
+    if len(i):
+        if method == "Tukey HSD":
+            # Pooled within group variance with the ANOVA's degrees of freedom
+            df_within = count.sum() - k
+            mse = ((count - 1) * variance).sum() / df_within
+            standard_error = np.sqrt(mse / 2 * (1 / count[i] + 1 / count[j]))
+            dof = np.full(len(i), df_within)
+        else:
+            # Each pair's own variances with Welch's degrees of freedom
+            share_i = variance[i] / count[i]
+            share_j = variance[j] / count[j]
+            standard_error = np.sqrt((share_i + share_j) / 2)
+            dof = (share_i + share_j) ** 2 / (share_i ** 2 / (count[i] - 1) + share_j ** 2 / (count[j] - 1))
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            q = np.abs(difference[i, j]) / standard_error
+        p[i, j] = p[j, i] = stats.studentized_range.sf(q, k, dof)
+
+    return pd.DataFrame(difference, index=groups, columns=groups), pd.DataFrame(p, index=groups, columns=groups)
+
+
+def format_p(p):
+    '''Formats a p-value for display, very small values are shown as p < 0.001.'''
+    if np.isnan(p):
+        return "p = n/a"
+    return "p < 0.001" if p < 0.001 else f"p = {p:.3f}"
+
+
+def eta_squared_size(eta_squared):
+    '''Describes an η² effect size using Cohen's thresholds of 0.01, 0.06 and 0.14.'''
+    if np.isnan(eta_squared):
+        return "unknown"
+    if eta_squared >= 0.14:
+        return "large"
+    if eta_squared >= 0.06:
+        return "medium"
+    return "small" if eta_squared >= 0.01 else "negligible"
+
+
+def correlation_strength(r):
+    '''Describes the strength of a correlation coefficient.'''
+    if np.isnan(r):
+        return "unknown"
+    r = abs(r)
+    if r >= 0.8:
+        return "very strong"
+    if r >= 0.6:
+        return "strong"
+    if r >= 0.4:
+        return "moderate"
+    return "weak" if r >= 0.2 else "very weak"
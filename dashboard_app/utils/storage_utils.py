@@ -0,0 +1,86 @@
+import json
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Sort order of the cleaned dataset, date first so date range filters can skip row groups
+CLEANED_SORT_COLUMNS = ["date", "platform"]
+
+# Row groups aim to hold about a month of rows, within these limits. Smaller row groups let date
+# filters skip more of the file but each one has a fixed cost to read, so tiny ones slow down full scans
+MIN_ROW_GROUP_ROWS = 16_384
+MAX_ROW_GROUP_ROWS = 1_048_576
+
+# zstd gave the smallest files in benchmarks/parquet_layout.py. Its scans are a little slower than snappy
+# but the dashboard only scans the file once, when it builds its Arrow cache
+COMPRESSION = "zstd"
+
+# Key in the parquet file metadata that records the layout it was written with
+LAYOUT_METADATA_KEY = b"dashboard.layout"
+
+
+def choose_row_group_size(df, date_column="date"):
+    '''
+    Picks a row group size so each row group holds about one month of data.
+
+    Parameters:
+    - df: The DataFrame that will be written
+    - date_column: The date column used by the date range filters
+
+    Returns:
+    - The number of rows per row group
+    '''
+    if len(df) == 0:
+        return MIN_ROW_GROUP_ROWS
+
+    # Average number of rows in each month that has data
+    rows_per_period = len(df) / df[date_column].dt.to_period("M").nunique()
+    return int(min(MAX_ROW_GROUP_ROWS, max(MIN_ROW_GROUP_ROWS, rows_per_period)))
+
+
+def write_parquet(df, path, sort_by=CLEANED_SORT_COLUMNS, row_group_size=None, compression=COMPRESSION):
+    '''
+    Writes a DataFrame to parquet with a layout suited to the dashboard's queries: sorted, sized
+    row groups, dictionary encoding and column and page statistics so readers can skip row groups
+    and pages that a filter rules out. The layout is recorded in the file metadata.
+
+    Parameters:
+    - df: The DataFrame to write
+    - path: The parquet file path
+    - sort_by: Columns to sort by, the first should be the most common filter
+    - row_group_size: Rows per row group, defaults to choose_row_group_size
+    - compression: The compression codec
+
+    Returns:
+    - The layout that was written, as a dictionary
+    '''
+    if row_group_size is None:
+        row_group_size = choose_row_group_size(df)
+
+    # Sort the rows, keeping the existing order for ties, and renumber them
+    df = df.sort_values(sort_by, kind="stable").reset_index(drop=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    layout = {
+        "sort_by": sort_by,
+        "row_group_size": row_group_size,
+        "compression": compression,
+        "dictionary_encoding": True,
+        "page_index": True,
+    }
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        LAYOUT_METADATA_KEY: json.dumps(layout).encode("utf-8"),
+    })
+
+    pq.write_table(
+        table,
+        path,
+        row_group_size=row_group_size,
+        compression=compression,
+        use_dictionary=True,
+        write_statistics=True,
+        write_page_index=True,
+        sorting_columns=pq.SortingColumn.from_ordering(table.schema, [(column, "ascending") for column in sort_by]),
+    )
+    return layout
+
@@ -0,0 +1,155 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+import streamlit as st
+from utils.cache_utils import LRUCache, make_key
+from utils.data_utils import dataset_version
+
+# Hidden tabs computed at once across every session, kept small so prefetching can't crowd out
+# the sessions' own runs
+PREFETCH_WORKERS = 2
+
+# Prefetches already queued, by tab, filters, widget values and data version, so each runs once
+_prefetched = LRUCache(4096, sizeof=lambda value: 1)
+
+# The prefetch pool, created on first use, and the prefetches that haven't finished
+_pool = None
+_pending = set()
+_pool_lock = threading.Lock()
+
+# Session values of the prefetch running on this thread, None on the sessions' own threads
+_local = threading.local()
+
+# Marks a widget that hasn't had its value kept yet
+_MISSING = object()
+
+
+def session_value(key, default=None):
+    '''
+    Reads a value from session state. On a prefetch thread there is no session, so the value is
+    read from a copy of the session state taken when the prefetch was queued.
+    '''
+    values = getattr(_local, "values", None)
+    if values is not None:
+        return values.get(key, default)
+    return st.session_state.get(key, default)
+
+
+def _keep_value(key, on_change):
+    '''Copies a widget's new value to a key Streamlit keeps while the widget isn't shown.'''
+    st.session_state[f"kept_{key}"] = st.session_state[key]
+    if on_change is not None:
+        on_change()
+
+
+def keep(key, on_change=None, **kwargs):
+    '''
+    Builds the keyword arguments for a widget inside a tab, so its value is kept while another tab
+    is shown. Streamlit forgets a widget's value when a run doesn't show it, so the value is copied
+    to session state on each change and passed back as the widget's default.
+
+    Parameters:
+    - key: The widget's key, unique within the page
+    - on_change: Optional callback to also run when the value changes
+    - kwargs: The widget's other arguments, including its default as default (multiselect),
+      value (slider, toggle) or index (selectbox, which must also be given its options)
+
+    Returns:
+    - A dictionary of keyword arguments for the widget
+    '''
+    kept = session_value(f"kept_{key}", _MISSING)
+    if kept is not _MISSING:
+        if "index" in kwargs:
+            # The options can depend on other widgets, so only restore a value that is still one of them
+            options = list(kwargs["options"])
+            if kept in options:
+                kwargs["index"] = options.index(kept)
+        elif "default" in kwargs:
+            kwargs["default"] = kept
+        else:
+            kwargs["value"] = kept
+    return {**kwargs, "key": key, "on_change": _keep_value, "args": (key, on_change)}
+
+
+def _get_pool():
+    '''Returns the process wide prefetch pool, creating it on first use.'''
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from utils.warmup_utils import quiet_background_logs
+            quiet_background_logs()
+            _pool = ThreadPoolExecutor(PREFETCH_WORKERS, thread_name_prefix="prefetch")
+        return _pool
+
+
+def _run_prefetch(key, tab, values, cancelled):
+    '''
+    Runs a tab function with no session, where every widget returns its default, unless cancelled
+    first. The prefetch is forgotten if it is cancelled or fails, so a later run can queue it again.
+    '''
+    if cancelled.is_set():
+        _prefetched.pop(key)
+        return
+    _local.values = values
+    try:
+        tab()
+    except Exception:
+        # The tab runs again when it is opened, which shows the error to the user
+        _prefetched.pop(key)
+        logging.getLogger(__name__).exception("Prefetching a tab failed")
+    finally:
+        _local.values = None
+
+
+def prefetch_tabs(tabs, visible, filters):
+    '''
+    Queues every tab except the visible one to run on the prefetch pool, so their figures and
+    aggregates are in the caches by the time they are opened. The tabs run outside the session
+    with the values their widgets last had, so they compute what the user would see. Prefetches
+    queued for earlier filters are cancelled if they haven't started.
+
+    Parameters:
+    - tabs: Dictionary of tab name to the function that shows it
+    - visible: Name of the visible tab, which has already run
+    - filters: The sidebar filter signature
+    '''
+    # A prefetch thread has no session to queue more work for
+    if getattr(_local, "values", None) is not None:
+        return
+
+    # Cancel the queued prefetches of earlier filters, the new filters need new results
+    current = st.session_state.get("prefetch")
+    if current is None or current[0] != filters:
+        if current is not None:
+            current[1].set()
+        current = (filters, threading.Event())
+        st.session_state["prefetch"] = current
+
+    # The widget values and page number the tabs read, copied as the session can change them meanwhile
+    values = {key: value for key, value in st.session_state.to_dict().items() if key.startswith("kept_") or key == "page"}
+    version = dataset_version()
+
+    pool = _get_pool()
+    for name, tab in tabs.items():
+        key = make_key("prefetch", name, filters, sorted(values.items()), version)
+        if name == visible or key in _prefetched:
+            continue
+        # Recorded as it is queued so later runs don't queue it again, _run_prefetch forgets it if it doesn't run
+        _prefetched.set(key, True)
+        future = pool.submit(_run_prefetch, key, tab, values, current[1])
+        with _pool_lock:
+            _pending.add(future)
+        future.add_done_callback(_discard)
+
+
+def _discard(future):
+    '''Forgets a finished prefetch.'''
+    with _pool_lock:
+        _pending.discard(future)
+
+
+def wait_for_prefetches(timeout=None):
+    '''Waits for every queued prefetch to finish, used by the warm-up.'''
+    with _pool_lock:
+        pending = list(_pending)
+    wait(pending, timeout=timeout)
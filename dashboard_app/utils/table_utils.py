@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+from utils.cache_utils import LRUCache
+from utils.compute_utils import run_heavy
+from utils.data_utils import dataset_version
+
+# Size limit for the cached sort orders, shared by every session
+SORT_CACHE_BYTES = 128 * 1024 * 1024
+
+# Tables with at least this many rows only sort the rows needed for the pages viewed so far
+PARTIAL_SORT_MIN_ROWS = 100_000
+
+# Process wide cache of (positions, number of sorted leading positions) per sort and filter selection
+_sort_cache = LRUCache(SORT_CACHE_BYTES, sizeof=lambda entry: entry[0].nbytes)
+
+
+def sort_keys(series, ascending):
+    '''
+    Converts a column into an int64 or float64 array whose ascending order is the requested
+    sort order. Categories sort by their category order, and missing values always go last
+    like pandas sort_values.
+
+    Parameters:
+    - series: The column to sort by
+    - ascending: Whether to sort ascending
+
+    Returns:
+    - A numpy array of sort keys
+    '''
+    missing = series.isna().to_numpy()
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        keys = series.cat.codes.to_numpy().astype("int64")
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        keys = series.to_numpy().view("int64")
+    elif pd.api.types.is_integer_dtype(series) or pd.api.types.is_bool_dtype(series):
+        keys = series.to_numpy(dtype="int64", na_value=0)
+    else:
+        keys = series.to_numpy(dtype="float64", na_value=np.nan)
+
+    if not ascending:
+        keys = -keys
+
+    # Push missing values to the end whichever way the column is sorted
+    if missing.any():
+        keys = keys.copy()
+        keys[missing] = np.inf if keys.dtype.kind == "f" else np.iinfo("int64").max
+
+    return keys
+
+
+def top_k_positions(keys, k):
+    '''
+    Returns the positions of the k smallest keys in sorted order, without sorting the rest.
+    Ties keep their original order, so the result matches the start of a stable full sort.
+
+    Parameters:
+    - keys: Array of sort keys
+    - k: Number of positions to return
+
+    Returns:
+    - A numpy array of k positions
+    '''
+    kth = np.partition(keys, k - 1)[k - 1]
+
+    # Everything below the k-th key, then the earliest rows that tie with it
+    below = np.flatnonzero(keys < kth)
+    ties = np.flatnonzero(keys == kth)[:k - len(below)]
+    top = np.concatenate([below, ties])
+
+    return top[np.argsort(keys[top], kind="stable")]
+
+
+def page_positions(df, rows, sort_by, ascending, filters, start, end):
+    '''
+    Returns the positions in df of the rows on one page of the table. The sort order is cached
+    per column, direction and filter selection, so turning the page doesn't sort again.
+    Large tables only sort as far as the pages that have been viewed.
+
+    Parameters:
+    - df: The full, unfiltered DataFrame
+    - rows: Positions in df of the rows that pass the filters, in index order
+    - sort_by: Column to sort by, or "None" to keep the index order
+    - ascending: Whether to sort ascending
+    - filters: The sidebar filter signature that rows were built with
+    - start: Position of the first row on the page in the sorted table
+    - end: Position after the last row on the page in the sorted table
+
+    Returns:
+    - A numpy array of row positions in df
+    '''
+    total_rows = len(rows)
+    end = min(end, total_rows)
+    if start >= end:
+        return np.array([], dtype="int64")
+
+    # The filtered rows are already in index order, so there is nothing to sort
+    if sort_by == "None":
+        order = np.arange(start, end)
+        return rows[order if ascending else total_rows - 1 - order]
+
+    key = (sort_by, ascending, filters, dataset_version())
+    positions, sorted_rows = _sort_cache.get(key, (None, 0))
+
+    if end > sorted_rows:
+        # Sessions viewing the same page of the same sort at once share one sort on the worker pool
+        positions, sorted_rows = run_heavy(("sort", key, end), lambda: _sort_rows(df, rows, sort_by, ascending, key, end))
+
+    return positions[start:end]
+
+
+def _sort_rows(df, rows, sort_by, ascending, key, end):
+    '''Sorts the filtered rows at least as far as end and caches the order, see page_positions.'''
+    total_rows = len(rows)
+
+    # A sort that finished just before this one started may already cover the page
+    positions, sorted_rows = _sort_cache.get(key, (None, 0))
+    if end <= sorted_rows:
+        return positions, sorted_rows
+
+    # Build the keys from the full column and pick out the filtered rows, without copying the DataFrame
+    keys = sort_keys(df[sort_by], ascending)[rows]
+
+    if total_rows >= PARTIAL_SORT_MIN_ROWS and end * 8 <= total_rows:
+        # Only the first pages have been viewed, sort double what is needed for the next page turns
+        sorted_rows = min(total_rows, max(2 * end, 2 * sorted_rows))
+        positions = rows[top_k_positions(keys, sorted_rows)]
+    else:
+        positions = rows[np.argsort(keys, kind="stable")]
+        sorted_rows = total_rows
+
+    _sort_cache.set(key, (positions, sorted_rows))
+    return positions, sorted_rows
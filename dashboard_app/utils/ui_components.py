@@ -1,4 +1,5 @@
 import streamlit as st
+from datetime import date
 
 def section_header(number, text):
     '''
@@ -44,4 +45,56 @@ def section_header(number, text):
     """)
 
 
-    
\ No newline at end of file
+def sidebar_filters(df, on_change=None):
+    '''
+    Adds the date range and category filters to the sidebar, shared by the pages that filter the dataset.
+
+    Parameters:
+    - df: The cleaned dataset, used for the date range limits
+    - on_change: Optional callback run when any filter changes
+
+    Returns:
+    - A tuple of (start_date, end_date, gender, age_group, platform, mental_state)
+    '''
+    with st.sidebar:
+        st.header(":material/filter_alt: Filters")
+
+        # Get min and max dates for date filter
+        min_date = df["date"].min()
+        max_date = df["date"].max()
+
+        # Date range filter
+        date_range = st.date_input(
+            "Select Date Range",
+            value=(min_date, max_date),
+            min_value=min_date,
+            max_value=max_date,
+            format="DD/MM/YYYY",
+            on_change=on_change
+        )
+
+        # Initialise start_date and end_date
+        start_date = None
+        end_date = None
+
+        if isinstance(date_range, tuple) and len(date_range) == 2:
+            # Set start_date and end_date based on date_range
+            start_date, end_date = date_range
+        elif isinstance(date_range, date):
+            # If date_range is a single date, set start_date and leave end_date as None
+            start_date = date_range
+            end_date = None
+
+        # gender multi select filter
+        gender = st.multiselect("Select Genders", options=["Male", "Female", "Other"], on_change=on_change)
+
+        # age group multi select filter
+        age_group = st.multiselect("Select Age Groups", options=['<18', '18-24', '25-34', '35-44', '45-54', '55+'], on_change=on_change)
+
+        # platform multi select filter
+        platform = st.multiselect("Select Platforms", options=['Facebook', 'Instagram', 'Snapchat', 'TikTok', 'Twitter', 'WhatsApp', 'YouTube'], on_change=on_change)
+
+        # mental state multi select filter
+        mental_state = st.multiselect("Select Mental States", options=['Healthy', 'Stressed', 'At Risk'], on_change=on_change)
+
+    return start_date, end_date, gender, age_group, platform, mental_state
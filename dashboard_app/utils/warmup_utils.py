@@ -0,0 +1,192 @@
+import copy
+import json
+import logging
+import os
+import runpy
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from streamlit.logger import get_logger
+
+# File the warm-up reports its progress to, for a readiness check
+HEALTH_FILE = "./.cache/health.json"
+
+# Threads loading at once. Most of the loads wait on the disk or release the GIL in numpy and pyarrow
+WARMUP_WORKERS = 4
+
+# Folder the page scripts are in
+DASHBOARD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Pages run once with their default options, so the aggregates and figures of their first view are
+# cached before anyone opens them. Model Predictions only predicts on a button press, so its models
+# are loaded on their own instead
+WARMUP_PAGES = ["data_visualisation.py", "hypothesis_statistical_testing.py", "significance_screening.py", "clusters.py"]
+
+# Name prefixes of the threads that run pages outside a session
+BACKGROUND_THREADS = ("warmup", "prefetch")
+
+# Streamlit loggers that warn about every command run outside a session
+QUIET_LOGGERS = ["root", "streamlit.runtime.scriptrunner_utils.script_run_context", "streamlit.runtime.caching.cache_data_api",
+                 "streamlit.runtime.state.session_state_proxy"]
+
+# The warm-up's progress, None until it is started in this process, and when it was started
+_status = None
+_started_at = None
+_status_lock = threading.Lock()
+
+
+class _BackgroundLogFilter(logging.Filter):
+    '''
+    Drops the log records of the warm-up and prefetch threads, which warn that they have no
+    session, and the same warning from the cache spinners' timer threads they start.
+    '''
+
+    def filter(self, record):
+        if record.threadName.startswith(BACKGROUND_THREADS):
+            return False
+        warming = _status is not None and _status["status"] == "warming"
+        return not (warming and "missing ScriptRunContext" in record.getMessage())
+
+
+def quiet_background_logs():
+    '''Stops Streamlit warning about every command the background threads run, doing nothing if already done.'''
+    with _status_lock:
+        for name in QUIET_LOGGERS:
+            logger = get_logger(name)
+            if not any(isinstance(f, _BackgroundLogFilter) for f in logger.filters):
+                logger.addFilter(_BackgroundLogFilter())
+
+
+def _warm_data():
+    '''Maps the dataset, the daily rollup and the Arrow table.'''
+    from utils.data_utils import load_daily_rollup, load_data, load_table
+    load_data()
+    load_daily_rollup()
+    load_table()
+
+
+def _warm_cluster_profiles():
+    '''Loads the cluster profiles the personas are built from.'''
+    from utils.persona_utils import load_cluster_profiles
+    load_cluster_profiles()
+
+
+def _warm_model(name):
+    '''Loads one of the prediction models into the model cache.'''
+    from utils.model_utils import get_model
+    get_model(name)
+
+
+def _warm_matplotlib():
+    '''Imports matplotlib and seaborn and renders a figure with text, which builds the font cache.'''
+    import matplotlib.pyplot as plt
+    import seaborn  # noqa: F401
+    from utils.render_utils import _draw_lock, render_figure
+    # The warm-up pages draw at the same time through pyplot's one current figure, so take the
+    # render cache's lock or their titles and layouts could land on this figure
+    with _draw_lock:
+        fig, ax = plt.subplots()
+        ax.set_title("Warm up")
+        render_figure(fig)
+
+
+def _warm_page(page):
+    '''
+    Runs a page script outside any session, where every widget returns its default value, then
+    waits for the tabs it queued to prefetch.
+    '''
+    from utils.tab_utils import wait_for_prefetches
+    runpy.run_path(os.path.join(DASHBOARD_DIR, page), run_name="__warmup__")
+    wait_for_prefetches()
+
+
+def _warmup_tasks():
+    '''Lists the warm-up tasks by name, the loads first so the pages find them done.'''
+    from utils.model_utils import MODELS
+    tasks = {"data": _warm_data, "cluster_profiles": _warm_cluster_profiles, "matplotlib": _warm_matplotlib}
+    tasks.update({f"model:{name}": lambda name=name: _warm_model(name) for name in MODELS})
+    tasks.update({f"page:{page}": lambda page=page: _warm_page(page) for page in WARMUP_PAGES})
+    return tasks
+
+
+def _now():
+    '''Returns the current UTC time for the health file.'''
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _write_health():
+    '''Writes the warm-up status to the health file in one rename. Call with the status lock held.'''
+    try:
+        os.makedirs(os.path.dirname(HEALTH_FILE), exist_ok=True)
+        temp_path = f"{HEALTH_FILE}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(_status, f, indent=2)
+        os.replace(temp_path, HEALTH_FILE)
+    except OSError:
+        # The health file is optional, e.g. on a read only file system
+        pass
+
+
+def _run_task(name, task):
+    '''Runs one warm-up task and records how it went, finishing the warm-up after the last one.'''
+    start = time.perf_counter()
+    try:
+        task()
+        result = {"status": "done"}
+    except Exception as e:
+        # A failed load is only slow for the first user who needs it, so the others carry on
+        result = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+    result["seconds"] = round(time.perf_counter() - start, 3)
+
+    with _status_lock:
+        _status["tasks"][name] = result
+        if all(task["status"] in ["done", "failed"] for task in _status["tasks"].values()):
+            failed = any(task["status"] == "failed" for task in _status["tasks"].values())
+            _status["status"] = "degraded" if failed else "ready"
+            _status["finished"] = _now()
+            _status["seconds"] = round(time.perf_counter() - _started_at, 3)
+        _write_health()
+
+
+def start_warmup():
+    '''
+    Starts loading the data, cluster profiles, models and matplotlib on a thread pool, then runs
+    the heaviest pages once with their default options, so their first view is served from the
+    caches. Only the first call in a process starts anything, so it can be called on every run.
+    The status is written to HEALTH_FILE as "warming", then "ready", or "degraded" if a task failed.
+
+    Returns:
+    - True if this call started the warm-up
+    '''
+    global _status, _started_at
+    with _status_lock:
+        if _status is not None:
+            return False
+        tasks = _warmup_tasks()
+        _started_at = time.perf_counter()
+        _status = {
+            "status": "warming", "pid": os.getpid(), "started": _now(), "finished": None,
+            "tasks": {name: {"status": "pending"} for name in tasks},
+        }
+        _write_health()
+
+    quiet_background_logs()
+
+    # Queued tasks still run after shutdown, it only stops the pool taking new ones
+    pool = ThreadPoolExecutor(WARMUP_WORKERS, thread_name_prefix="warmup")
+    for name, task in tasks.items():
+        pool.submit(_run_task, name, task)
+    pool.shutdown(wait=False)
+    return True
+
+
+def warmup_status():
+    '''
+    Returns the warm-up's progress in this process.
+
+    Returns:
+    - Dictionary with the overall status and each task's status and time, or None if it hasn't started
+    '''
+    with _status_lock:
+        return copy.deepcopy(_status)
@@ -0,0 +1,92 @@
+'''
+Checks that heavy computations started from the pool's own threads can't deadlock it. Run from
+the repo root:
+
+    python -m pytest tests
+'''
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+# Make the dashboard utils importable from the tests
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "dashboard_app"))
+from utils import compute_utils
+from utils.cache_utils import SingleFlight
+
+WORKERS = 2
+TIMEOUT_SECONDS = 10
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    '''Swaps in a small pool and fresh flights, releasing any caller still stuck on them afterwards.'''
+    flights = SingleFlight()
+    pool = ThreadPoolExecutor(WORKERS, thread_name_prefix="test_heavy")
+    callers = ThreadPoolExecutor(WORKERS + 1, thread_name_prefix="test_session")
+    monkeypatch.setattr(compute_utils, "_pool", pool)
+    monkeypatch.setattr(compute_utils, "_flights", flights)
+    yield flights, callers
+
+    # Without the fix the workers never return, so fail their waits to let the pool shut down
+    with flights._lock:
+        calls = list(flights._calls.values())
+    for call in calls:
+        if not call.done():
+            call.set_exception(RuntimeError("released by the test"))
+    callers.shutdown(wait=True)
+    pool.shutdown(wait=True)
+
+
+def test_worker_does_not_wait_on_a_queued_leader(pool):
+    '''Every worker asks for a key whose leader is queued behind them, which used to hang the pool.'''
+    _, callers = pool
+    started = threading.Semaphore(0)
+    release = threading.Event()
+
+    def nested():
+        """Runs on a worker once another caller leads the shared key, which is then queued behind the workers."""
+        started.release()
+        release.wait(TIMEOUT_SECONDS)
+        return compute_utils.run_heavy("shared", lambda: "nested")
+
+    # Fill every worker with a computation that will ask for the shared key
+    outer = [callers.submit(compute_utils.run_heavy, ("outer", i), nested) for i in range(WORKERS)]
+    for _ in range(WORKERS):
+        assert started.acquire(timeout=TIMEOUT_SECONDS)
+
+    # A session leads the shared key, its computation waits in the pool's queue
+    leader = callers.submit(compute_utils.run_heavy, "shared", lambda: "leader")
+    while compute_utils._pool._work_queue.qsize() == 0:
+        time.sleep(0.01)
+    release.set()
+
+    assert [future.result(timeout=TIMEOUT_SECONDS) for future in outer] == ["nested"] * WORKERS
+    assert leader.result(timeout=TIMEOUT_SECONDS) == "leader"
+
+
+def test_session_callers_share_one_run(pool):
+    '''Callers outside the pool still wait for the run in flight instead of starting their own.'''
+    _, callers = pool
+    runs = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def compute():
+        """Counts its runs and holds the flight open until every caller has joined it."""
+        runs.append(1)
+        started.set()
+        release.wait(TIMEOUT_SECONDS)
+        return len(runs)
+
+    first = callers.submit(compute_utils.run_heavy, "key", compute)
+    started.wait(TIMEOUT_SECONDS)
+    others = [callers.submit(compute_utils.run_heavy, "key", compute) for _ in range(2)]
+    time.sleep(0.1)
+    release.set()
+    results = [future.result(timeout=TIMEOUT_SECONDS) for future in [first, *others]]
+
+    assert results == [1, 1, 1]
+    assert len(runs) == 1
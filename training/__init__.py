@@ -0,0 +1,14 @@
+'''
+Command line training pipeline for the five prediction models, run from the repo root with
+
+    python -m training train
+
+It shares the schema and data utils with the dashboard, so the dashboard folder is made importable here.
+'''
+import os
+import sys
+
+# Make the dashboard utils importable, like the notebooks do
+DASHBOARD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dashboard_app")
+if DASHBOARD_DIR not in sys.path:
+    sys.path.append(DASHBOARD_DIR)
@@ -0,0 +1,543 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+import joblib
+import numpy as np
+import pandas as pd
+import imblearn
+import sklearn
+from sklearn.metrics import accuracy_score, f1_score, mean_absolute_error, mean_squared_error, r2_score
+from training import DASHBOARD_DIR
+from training.data import encode_dataset, load_encoded, split_positions
+from training.incremental import accumulator_file, design_matrix, load_accumulators, save_accumulators, solve, summarise
+from training.incremental import update as update_accumulators
+from training.pipelines import OVERSAMPLERS, TARGETS, build_pipeline, choose_oversampler, features
+from training.refresh import MAX_TREES, REFRESH_TREES, TOLERANCE, refresh_forest
+from training.streaming import BATCH_ROWS, SHARD_ROWS, compare_in_memory, is_test, stream_train
+from training.tuning import PARAM_GRID, candidates, grid_search, halving_search, prepare_folds
+from utils.artifact_utils import artifact_folder, export_pipeline
+from utils.data_utils import DATA_FILES
+from utils.schema import NEW_ROWS_SCHEMA, apply_schema, validate_schema
+
+# Repo root, the data and model paths are relative to it like in the dashboard
+REPO_DIR = os.path.dirname(DASHBOARD_DIR)
+MODELS_DIR = os.path.join(REPO_DIR, "models")
+
+# Name of the manifest written next to each version's models
+MANIFEST_FILE = "manifest.json"
+
+# Largest prediction difference from the published regressions that train --validate accepts, the
+# cleaned dataset's float32 columns leave differences of about 1e-7 between identical fits
+REPRODUCE_TOLERANCE = 1e-5
+
+
+def file_sha256(path):
+    '''Returns the SHA-256 of a file, read in chunks.'''
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_json(path, data):
+    '''Writes data to a JSON file.'''
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def write_atomic(path, write):
+    '''
+    Writes a file through a temporary file in the same folder and renames it into place,
+    so readers such as the dashboard never load a partly written file.
+
+    Parameters:
+    - path: The final path
+    - write: Function that writes the file at the temporary path it is given
+    '''
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def save_model(pipeline, path):
+    '''Saves a fitted pipeline as a pickle and as the pickle free artifact folder next to it.'''
+    joblib.dump(pipeline, path)
+    export_pipeline(pipeline, artifact_folder(path))
+
+
+def replace_folder(source, destination):
+    '''
+    Copies a folder into place through a temporary copy, so the destination is swapped in with a
+    rename rather than built file by file. Readers that already mapped the old files keep them.
+    '''
+    temp_path = f"{destination}.{os.getpid()}.tmp"
+    old_path = f"{destination}.{os.getpid()}.old"
+    shutil.copytree(source, temp_path)
+    try:
+        if os.path.exists(destination):
+            os.replace(destination, old_path)
+        os.replace(temp_path, destination)
+    finally:
+        shutil.rmtree(temp_path, ignore_errors=True)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+
+def evaluate(target, y_test, y_pred):
+    '''Returns the metrics the notebooks report for a target.'''
+    if TARGETS[target]["kind"] == "classifier":
+        return {
+            "accuracy": accuracy_score(y_test, y_pred),
+            "f1_macro": f1_score(y_test, y_pred, average="macro"),
+        }
+    return {
+        "mae": mean_absolute_error(y_test, y_pred),
+        "rmse": float(np.sqrt(mean_squared_error(y_test, y_pred))),
+        "r2": r2_score(y_test, y_pred),
+    }
+
+
+def fit_target(target, encoded_dir, version_dir, oversampler="smote"):
+    '''
+    Fits, evaluates and saves one model, in a worker process.
+
+    Parameters:
+    - target: A key of TARGETS
+    - encoded_dir: Folder written by encode_dataset
+    - version_dir: Folder to save the model to
+    - oversampler: One of OVERSAMPLERS, used by the classifier
+
+    Returns:
+    - Dictionary describing the saved model for the manifest
+    '''
+    start = time.perf_counter()
+    df = load_encoded(encoded_dir)
+    train, test = split_positions(df, target)
+    X = df[features(target)]
+    y = df[target]
+
+    # One thread per model as the models are already fitted in parallel processes
+    oversampler = choose_oversampler(y.iloc[train], oversampler) if TARGETS[target]["kind"] == "classifier" else None
+    pipeline = build_pipeline(target, n_jobs=1, oversampler=oversampler)
+    pipeline.fit(X.iloc[train], y.iloc[train])
+    metrics = evaluate(target, y.iloc[test], pipeline.predict(X.iloc[test]))
+
+    # Samplers only run while fitting, so drop PartitionedSMOTE before saving and the dashboard
+    # can load the model without the training package
+    if oversampler == "partitioned":
+        pipeline.set_params(smote="passthrough")
+
+    path = os.path.join(version_dir, TARGETS[target]["file"])
+    save_model(pipeline, path)
+
+    # Save the linear regressions' accumulators so the update command can add rows without a refit
+    accumulators = {}
+    if TARGETS[target]["kind"] == "regressor":
+        save_accumulators(os.path.join(version_dir, accumulator_file(target)),
+                          summarise(design_matrix(df.iloc[train], target)), target)
+        accumulators = {"accumulators": accumulator_file(target)}
+
+    return {
+        "file": TARGETS[target]["file"],
+        **accumulators,
+        **({"oversampler": oversampler} if oversampler else {}),
+        "sha256": file_sha256(path),
+        "metrics": metrics,
+        "train_rows": len(train),
+        "test_rows": len(test),
+        "fit_seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def compare_published(df, version_dir, models_dir, targets):
+    '''
+    Checks that freshly trained models reproduce the published ones, by predicting every row of
+    the dataset with both.
+
+    Parameters:
+    - df: The cleaned dataset
+    - version_dir: Folder of the trained version
+    - models_dir: The dashboard's models folder
+    - targets: The trained targets
+
+    Returns:
+    - Dictionary by target, the largest prediction difference for the regressions and the share of
+      matching predictions for the classifier, and whether the model was reproduced
+
+    Raises:
+    - FileNotFoundError if a target has no published model
+    '''
+    comparison = {}
+    for target in targets:
+        path = os.path.join(models_dir, TARGETS[target]["file"])
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} doesn't exist, there is no published model to compare with")
+
+        X = df[features(target)]
+        published = joblib.load(path).predict(X)
+        trained = joblib.load(os.path.join(version_dir, TARGETS[target]["file"])).predict(X)
+        if TARGETS[target]["kind"] == "classifier":
+            agreement = float(np.mean(published == trained))
+            comparison[target] = {"agreement": agreement, "reproduced": agreement == 1.0}
+        else:
+            difference = float(np.abs(published - trained).max())
+            comparison[target] = {"max_difference": difference, "reproduced": difference <= REPRODUCE_TOLERANCE}
+    return comparison
+
+
+def publish(version_dir, manifest, models_dir=MODELS_DIR):
+    '''
+    Replaces the models the dashboard loads with a trained version, one atomic rename per file.
+
+    Parameters:
+    - version_dir: Folder of the trained version
+    - manifest: The version's manifest
+    - models_dir: The dashboard's models folder
+    '''
+    for entry in manifest["models"].values():
+        # The artifact folder first, the dashboard falls back to the pickle while it is swapped
+        folder = artifact_folder(entry["file"])
+        if os.path.isdir(os.path.join(version_dir, folder)):
+            replace_folder(os.path.join(version_dir, folder), os.path.join(models_dir, folder))
+        for file in [entry["file"], entry.get("accumulators")]:
+            if file:
+                source = os.path.join(version_dir, file)
+                write_atomic(os.path.join(models_dir, file), lambda temp_path: shutil.copyfile(source, temp_path))
+
+
+def train(args):
+    '''Runs the train command.'''
+    start = time.perf_counter()
+    targets = args.targets or list(TARGETS)
+    version = args.version or datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    version_dir = os.path.join(args.models_dir, "versions", version)
+    os.makedirs(version_dir)
+
+    # Load and check the cleaned dataset once for every model
+    data_path = os.path.join(REPO_DIR, DATA_FILES[0])
+    df = load_data_file()
+
+    with tempfile.TemporaryDirectory(dir=version_dir) as encoded_dir:
+        # Encode once into memory mapped files that every worker shares
+        encode_dataset(df, encoded_dir)
+        print(f"Encoded {len(df):,} rows in {time.perf_counter() - start:.1f}s, training {len(targets)} models on {args.workers} workers")
+
+        models = {}
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = {executor.submit(fit_target, target, encoded_dir, version_dir, args.oversampler): target for target in targets}
+            for future in as_completed(futures):
+                target = futures[future]
+                models[target] = future.result()
+                metrics = ", ".join(f"{name} {value:.4f}" for name, value in models[target]["metrics"].items())
+                print(f"  {target}: {metrics} ({models[target]['fit_seconds']}s)")
+
+    manifest = {
+        "version": version,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "dataset": {"file": DATA_FILES[0], "sha256": file_sha256(data_path), "rows": len(df)},
+        "packages": {"scikit-learn": sklearn.__version__, "imbalanced-learn": imblearn.__version__,
+                     "numpy": np.__version__, "pandas": pd.__version__},
+        "models": {target: models[target] for target in targets},
+    }
+
+    if args.validate:
+        manifest["validation"] = compare_published(df, version_dir, args.models_dir, targets)
+        for target, comparison in manifest["validation"].items():
+            print(f"  {target} against published: " + ", ".join(f"{name} {value:.6g}" for name, value in comparison.items()))
+    write_atomic(os.path.join(version_dir, MANIFEST_FILE), lambda temp_path: write_json(temp_path, manifest))
+
+    # A version that doesn't reproduce the published models isn't published
+    failed = [target for target, comparison in manifest.get("validation", {}).items() if not comparison["reproduced"]]
+    if failed:
+        raise SystemExit(f"Saved version {version} to {version_dir}, but it doesn't reproduce the published {', '.join(failed)} models")
+
+    if args.publish:
+        publish(version_dir, manifest, args.models_dir)
+        print(f"Published version {version} to {args.models_dir}")
+
+    print(f"Saved version {version} to {version_dir} in {time.perf_counter() - start:.1f}s")
+    return manifest
+
+
+def tune(args):
+    '''Runs the tune command.'''
+    timings = {}
+
+    def timed(stage, function, *function_args, **kwargs):
+        """Runs one stage, recording its wall clock and this process's CPU time."""
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = function(*function_args, **kwargs)
+        timings[stage] = {"wall_seconds": time.perf_counter() - wall, "cpu_seconds": time.process_time() - cpu}
+        return result
+
+    # Tune on the training rows only, like notebook 05
+    df = timed("load", lambda: load_data_file())
+    train, test = split_positions(df, "mental_state")
+    X, y = df[features("mental_state")], df["mental_state"]
+    X_train, y_train = X.iloc[train], y.iloc[train]
+
+    # Preprocess and oversample each fold once for every candidate
+    oversampler = choose_oversampler(y_train, args.oversampler)
+    folds = timed("prepare folds", prepare_folds, X_train, y_train, args.cv, args.workers, oversampler)
+    # With more than one worker the folds and candidates run in other processes, so add their CPU time
+    workers_cpu = args.workers != 1
+    if workers_cpu:
+        timings["prepare folds"]["cpu_seconds"] += sum(fold["cpu_seconds"] for fold in folds)
+
+    print(f"Searching {len(candidates(PARAM_GRID))} candidates x {args.cv} folds with {args.search} search on {args.workers} workers")
+    if args.search == "halving":
+        search = timed("search", halving_search, folds, PARAM_GRID, args.factor, n_jobs=args.workers)
+    else:
+        search = timed("search", grid_search, folds, PARAM_GRID, n_jobs=args.workers)
+    if workers_cpu:
+        timings["search"]["cpu_seconds"] += search["cpu_seconds"]
+
+    # Refit the best parameters on all the training rows and score the held back rows
+    def refit():
+        pipeline = build_pipeline("mental_state", n_jobs=args.workers, oversampler=oversampler)
+        pipeline.set_params(**{f"model__{name}": value for name, value in search["best_params"].items()})
+        pipeline.fit(X_train, y_train)
+        return evaluate("mental_state", y.iloc[test], pipeline.predict(X.iloc[test]))
+    metrics = timed("refit", refit)
+
+    print(f"Best params: {search['best_params']}")
+    print(f"Best CV accuracy: {search['best_score']:.4f}, test accuracy: {metrics['accuracy']:.4f}")
+    print(f"\n{'Stage':<16}{'Wall (s)':>10}{'CPU (s)':>10}")
+    for stage, timing in timings.items():
+        print(f"{stage:<16}{timing['wall_seconds']:>10.2f}{timing['cpu_seconds']:>10.2f}")
+    print(f"{'total':<16}{sum(t['wall_seconds'] for t in timings.values()):>10.2f}{sum(t['cpu_seconds'] for t in timings.values()):>10.2f}")
+
+    report = {"search": args.search, "cv": args.cv, "oversampler": oversampler, **search, "test_metrics": metrics, "timings": timings}
+    if args.report:
+        write_atomic(args.report, lambda temp_path: write_json(temp_path, report))
+    return report
+
+
+def update(args):
+    '''Runs the update command.'''
+    start = time.perf_counter()
+    version = args.version or datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    version_dir = os.path.join(args.models_dir, "versions", version)
+    targets = [target for target, spec in TARGETS.items() if spec["kind"] == "regressor"]
+
+    # The new rows are cast to the cleaned dataset's schema, which also rejects unknown categories
+    df = apply_schema(pd.read_parquet(args.data), NEW_ROWS_SCHEMA)
+
+    models = {}
+    for target in targets:
+        path = os.path.join(args.models_dir, accumulator_file(target))
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} doesn't exist, run the train command with --publish first")
+
+        # Only the new rows are summarised, the rest comes from the saved accumulators
+        accumulators = update_accumulators(load_accumulators(path, target), df, target)
+        os.makedirs(version_dir, exist_ok=True)
+        save_accumulators(os.path.join(version_dir, accumulator_file(target)), accumulators, target)
+        model_path = os.path.join(version_dir, TARGETS[target]["file"])
+        save_model(solve(accumulators, target), model_path)
+
+        models[target] = {"file": TARGETS[target]["file"], "accumulators": accumulator_file(target),
+                          "sha256": file_sha256(model_path), "train_rows": accumulators["rows"]}
+        print(f"  {target}: {accumulators['rows']:,} rows")
+
+    manifest = {
+        "version": version,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "update": {"file": args.data, "sha256": file_sha256(args.data), "rows": len(df)},
+        "packages": {"scikit-learn": sklearn.__version__, "numpy": np.__version__, "pandas": pd.__version__},
+        "models": models,
+    }
+    write_atomic(os.path.join(version_dir, MANIFEST_FILE), lambda temp_path: write_json(temp_path, manifest))
+
+    if args.publish:
+        publish(version_dir, manifest, args.models_dir)
+        print(f"Published version {version} to {args.models_dir}")
+
+    print(f"Added {len(df):,} rows to {len(targets)} models and saved version {version} in {time.perf_counter() - start:.2f}s")
+    return manifest
+
+
+def stream(args):
+    '''Runs the stream command.'''
+    start = time.perf_counter()
+    version = args.version or datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    version_dir = os.path.join(args.models_dir, "versions", version)
+    os.makedirs(version_dir)
+    data_path = os.path.join(REPO_DIR, DATA_FILES[0])
+
+    pipelines, accumulators, metrics = stream_train(data_path, args.batch_size, args.shard_rows, args.workers)
+
+    models = {}
+    for target, pipeline in pipelines.items():
+        path = os.path.join(version_dir, TARGETS[target]["file"])
+        save_model(pipeline, path)
+        entry = {"file": TARGETS[target]["file"]}
+        if TARGETS[target]["kind"] == "regressor":
+            save_accumulators(os.path.join(version_dir, accumulator_file(target)), accumulators[target], target)
+            entry["accumulators"] = accumulator_file(target)
+        models[target] = {**entry, "sha256": file_sha256(path), "metrics": metrics[target],
+                          "train_rows": accumulators[target]["rows"]}
+        print(f"  {target}: " + ", ".join(f"{name} {value:.4f}" for name, value in metrics[target].items()))
+
+    manifest = {
+        "version": version,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "dataset": {"file": DATA_FILES[0], "sha256": file_sha256(data_path)},
+        "streaming": {"batch_rows": args.batch_size, "shard_rows": args.shard_rows},
+        "packages": {"scikit-learn": sklearn.__version__, "imbalanced-learn": imblearn.__version__,
+                     "numpy": np.__version__, "pandas": pd.__version__},
+        "models": {target: models[target] for target in TARGETS},
+    }
+
+    if args.validate:
+        manifest["validation"] = compare_in_memory(data_path, pipelines)
+        for target, comparison in manifest["validation"].items():
+            print(f"  {target} against in memory: " + ", ".join(f"{name} {value:.6g}" for name, value in comparison.items()))
+
+    write_atomic(os.path.join(version_dir, MANIFEST_FILE), lambda temp_path: write_json(temp_path, manifest))
+
+    if args.publish:
+        publish(version_dir, manifest, args.models_dir)
+        print(f"Published version {version} to {args.models_dir}")
+
+    print(f"Saved version {version} to {version_dir} in {time.perf_counter() - start:.1f}s")
+    return manifest
+
+
+def refresh(args):
+    '''Runs the refresh command.'''
+    start = time.perf_counter()
+    target = "mental_state"
+    version = args.version or datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    version_dir = os.path.join(args.models_dir, "versions", version)
+    model_path = os.path.join(args.models_dir, TARGETS[target]["file"])
+    pipeline = joblib.load(model_path)
+
+    # Hold back a share of the new rows, and check against the dataset's test rows too so the
+    # refresh can't trade the old data's accuracy for the new data's
+    new = apply_schema(pd.read_parquet(args.data), NEW_ROWS_SCHEMA)
+    new_test = is_test(np.arange(len(new)))
+    df = load_data_file()
+    _, test = split_positions(df, target)
+    holdout = pd.concat([df.iloc[test], new[new_test]])
+
+    # Seed the new trees from the new rows, so refreshing with the same file gives the same forest
+    data_sha256 = file_sha256(args.data)
+    refreshed, report = refresh_forest(
+        pipeline, new.loc[~new_test, features(target)], new.loc[~new_test, target].astype(str),
+        holdout[features(target)], holdout[target].astype(str), args.trees, args.max_trees, args.tolerance,
+        random_state=int(data_sha256[:8], 16))
+    print(f"Holdout accuracy {report['accuracy_before']:.4f} -> {report['accuracy_after']:.4f} on {report['holdout_rows']:,} rows, "
+          f"{report['trees_added']} trees added, {report['trees_evicted']} evicted, {report['trees']} kept")
+
+    os.makedirs(version_dir)
+    manifest = {
+        "version": version,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "refresh": {"file": args.data, "sha256": data_sha256, "rows": len(new), **report},
+        "packages": {"scikit-learn": sklearn.__version__, "imbalanced-learn": imblearn.__version__,
+                     "numpy": np.__version__, "pandas": pd.__version__},
+        "models": {},
+    }
+
+    if report["accepted"]:
+        path = os.path.join(version_dir, TARGETS[target]["file"])
+        save_model(refreshed, path)
+        manifest["models"][target] = {"file": TARGETS[target]["file"], "sha256": file_sha256(path),
+                                      "metrics": {"holdout_accuracy": report["accuracy_after"]}}
+    write_atomic(os.path.join(version_dir, MANIFEST_FILE), lambda temp_path: write_json(temp_path, manifest))
+
+    if not report["accepted"]:
+        print(f"Rejected the refresh as holdout accuracy dropped by more than {args.tolerance}, the model is unchanged")
+    elif args.publish:
+        publish(version_dir, manifest, args.models_dir)
+        print(f"Published version {version} to {args.models_dir}")
+
+    print(f"Saved version {version} to {version_dir} in {time.perf_counter() - start:.1f}s")
+    return manifest
+
+
+def export(args):
+    '''Runs the export command.'''
+    for target in TARGETS:
+        path = os.path.join(args.models_dir, TARGETS[target]["file"])
+        export_pipeline(joblib.load(path), artifact_folder(path))
+        print(f"  {target}: {artifact_folder(path)}")
+
+
+def load_data_file():
+    '''Loads the cleaned dataset and checks it against the shared schema.'''
+    df = pd.read_parquet(os.path.join(REPO_DIR, DATA_FILES[0]))
+    validate_schema(df)
+    return df
+
+
+def main(argv=None):
+    '''Parses the command line and runs a command.'''
+    parser = argparse.ArgumentParser(prog="python -m training", description="Train the dashboard's prediction models.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = commands.add_parser("train", help="Train every model from the cleaned dataset")
+    train_parser.add_argument("--targets", nargs="+", choices=list(TARGETS), help="Targets to train, defaults to all five")
+    train_parser.add_argument("--workers", type=int, default=min(len(TARGETS), os.cpu_count() or 1), help="Worker processes")
+    train_parser.add_argument("--version", help="Version name, defaults to the UTC time")
+    train_parser.add_argument("--models-dir", default=MODELS_DIR, help="Models folder, versions are saved under versions/")
+    train_parser.add_argument("--publish", action="store_true", help="Also replace the models the dashboard loads")
+    train_parser.add_argument("--oversampler", choices=OVERSAMPLERS, default="auto",
+                              help="Oversampler for the mental state model, auto uses SMOTE until the minority classes are large")
+    train_parser.add_argument("--validate", action="store_true",
+                              help="Check the models reproduce the published ones' predictions, and don't publish them if not")
+    train_parser.set_defaults(run=train)
+
+    tune_parser = commands.add_parser("tune", help="Search the mental state random forest's parameters")
+    tune_parser.add_argument("--search", choices=["grid", "halving"], default="halving", help="Exhaustive grid or successive halving")
+    tune_parser.add_argument("--cv", type=int, default=5, help="Cross validation folds")
+    tune_parser.add_argument("--factor", type=int, default=3, help="Halving factor")
+    tune_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    tune_parser.add_argument("--report", help="Optional path to save the results as JSON")
+    tune_parser.add_argument("--oversampler", choices=OVERSAMPLERS, default="auto", help="Oversampler for the folds, as train")
+    tune_parser.set_defaults(run=tune)
+
+    update_parser = commands.add_parser("update", help="Add new rows to the linear regressions without refitting them")
+    update_parser.add_argument("data", help="Parquet file of new rows with the cleaned dataset's columns")
+    update_parser.add_argument("--version", help="Version name, defaults to the UTC time")
+    update_parser.add_argument("--models-dir", default=MODELS_DIR, help="Models folder holding the published models and accumulators")
+    update_parser.add_argument("--publish", action="store_true", help="Also replace the models the dashboard loads")
+    update_parser.set_defaults(run=update)
+
+    stream_parser = commands.add_parser("stream", help="Train every model in batches without loading the whole dataset")
+    stream_parser.add_argument("--batch-size", type=int, default=BATCH_ROWS, help="Rows read at a time")
+    stream_parser.add_argument("--shard-rows", type=int, default=SHARD_ROWS, help="Training rows per random forest shard")
+    stream_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Threads for the random forest")
+    stream_parser.add_argument("--version", help="Version name, defaults to the UTC time")
+    stream_parser.add_argument("--models-dir", default=MODELS_DIR, help="Models folder, versions are saved under versions/")
+    stream_parser.add_argument("--publish", action="store_true", help="Also replace the models the dashboard loads")
+    stream_parser.add_argument("--validate", action="store_true", help="Compare with in memory models, loads the whole dataset")
+    stream_parser.set_defaults(run=stream)
+
+    refresh_parser = commands.add_parser("refresh", help="Grow the mental state forest with trees trained on new rows")
+    refresh_parser.add_argument("data", help="Parquet file of new labelled rows with the cleaned dataset's columns")
+    refresh_parser.add_argument("--trees", type=int, default=REFRESH_TREES, help="Trees to grow from the new rows")
+    refresh_parser.add_argument("--max-trees", type=int, default=MAX_TREES, help="Most trees to keep, the oldest are dropped")
+    refresh_parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Largest accepted drop in holdout accuracy")
+    refresh_parser.add_argument("--version", help="Version name, defaults to the UTC time")
+    refresh_parser.add_argument("--models-dir", default=MODELS_DIR, help="Models folder holding the published model")
+    refresh_parser.add_argument("--publish", action="store_true", help="Replace the model the dashboard loads if the refresh is accepted")
+    refresh_parser.set_defaults(run=refresh)
+
+    export_parser = commands.add_parser("export", help="Write the pickle free artifact folders of existing models")
+    export_parser.add_argument("--models-dir", default=MODELS_DIR, help="Models folder holding the .pkl files")
+    export_parser.set_defaults(run=export)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
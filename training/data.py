@@ -0,0 +1,110 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from training.pipelines import RANDOM_STATE, TARGETS, TEST_SIZE
+from utils.schema import ROW_ID_COLUMN
+
+# Files written by encode_dataset
+NUMERIC_FILE = "numeric.npy"
+CODES_FILE = "codes.npy"
+ROW_IDS_FILE = "row_ids.npy"
+ENCODING_FILE = "encoding.json"
+
+
+def model_columns():
+    '''
+    Returns the numeric and categorical columns used by any of the models, including the targets.
+    '''
+    numeric, categorical = [], []
+    for target, spec in TARGETS.items():
+        for column in spec["numeric"] + ([target] if spec["kind"] == "regressor" else []):
+            if column not in numeric:
+                numeric.append(column)
+        for column in spec["categorical"] + ([target] if spec["kind"] == "classifier" else []):
+            if column not in categorical:
+                categorical.append(column)
+    return numeric, categorical
+
+
+def encode_dataset(df, folder):
+    '''
+    Encodes the model columns of the cleaned dataset once into memory mapped .npy files, so every
+    worker process maps the same pages instead of reading and decoding the parquet file again.
+    Numeric columns are stored as float64 and categorical columns as their category codes, both
+    column major so each column is one contiguous block. The row ids are kept for split_positions.
+
+    Parameters:
+    - df: The cleaned dataset
+    - folder: Folder to write the files to
+
+    Returns:
+    - The folder
+    '''
+    numeric, categorical = model_columns()
+    os.makedirs(folder, exist_ok=True)
+
+    values = np.lib.format.open_memmap(os.path.join(folder, NUMERIC_FILE), mode="w+", dtype="float64",
+                                       shape=(len(df), len(numeric)), fortran_order=True)
+    for i, column in enumerate(numeric):
+        values[:, i] = df[column].to_numpy(dtype="float64")
+    values.flush()
+
+    codes = np.lib.format.open_memmap(os.path.join(folder, CODES_FILE), mode="w+", dtype="int16",
+                                      shape=(len(df), len(categorical)), fortran_order=True)
+    for i, column in enumerate(categorical):
+        codes[:, i] = df[column].cat.codes.to_numpy()
+    codes.flush()
+
+    np.save(os.path.join(folder, ROW_IDS_FILE), df[ROW_ID_COLUMN].to_numpy())
+
+    encoding = {
+        "rows": len(df),
+        "numeric": numeric,
+        "categorical": {column: [str(c) for c in df[column].cat.categories] for column in categorical},
+    }
+    with open(os.path.join(folder, ENCODING_FILE), "w") as f:
+        json.dump(encoding, f, indent=2)
+
+    return folder
+
+
+def load_encoded(folder):
+    '''
+    Rebuilds a DataFrame of the model columns from the files written by encode_dataset. The
+    numeric columns are read from the shared memory map rather than a private copy of the parquet.
+
+    Parameters:
+    - folder: Folder written by encode_dataset
+
+    Returns:
+    - A DataFrame with the row ids, the numeric columns and the categorical columns as categories
+    '''
+    with open(os.path.join(folder, ENCODING_FILE)) as f:
+        encoding = json.load(f)
+
+    values = np.load(os.path.join(folder, NUMERIC_FILE), mmap_mode="r")
+    codes = np.load(os.path.join(folder, CODES_FILE), mmap_mode="r")
+
+    columns = {ROW_ID_COLUMN: np.load(os.path.join(folder, ROW_IDS_FILE), mmap_mode="r")}
+    columns.update({column: values[:, i] for i, column in enumerate(encoding["numeric"])})
+    for i, (column, categories) in enumerate(encoding["categorical"].items()):
+        # Category strings, as the encoders saved by the notebooks were fitted on strings
+        columns[column] = pd.Categorical.from_codes(codes[:, i], categories=categories)
+
+    return pd.DataFrame(columns)
+
+
+def split_positions(df, target):
+    '''
+    Splits the rows into train and test positions the same way as the notebooks, stratified
+    by the target for the classifier. The rows are split in the raw CSV's order, like the
+    notebooks, so the split doesn't depend on the order the cleaned file was written in.
+
+    Returns:
+    - A tuple of (train positions, test positions)
+    '''
+    positions = np.argsort(df[ROW_ID_COLUMN].to_numpy(), kind="stable")
+    stratify = df[target].iloc[positions] if TARGETS[target]["kind"] == "classifier" else None
+    return train_test_split(positions, test_size=TEST_SIZE, random_state=RANDOM_STATE, stratify=stratify)
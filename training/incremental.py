@@ -0,0 +1,165 @@
+import json
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import Pipeline
+from training.pipelines import TARGETS, build_preprocessor
+from utils.schema import CATEGORIES
+
+# Extension of the accumulator file saved next to each linear regression's .pkl
+ACCUMULATOR_EXTENSION = ".npz"
+
+
+def accumulator_file(target):
+    '''Returns the file name of a regression target's accumulators, next to its model file.'''
+    return TARGETS[target]["file"].rsplit(".", 1)[0] + ACCUMULATOR_EXTENSION
+
+
+def design_columns(target):
+    '''
+    Returns the columns of a target's raw design matrix: its numeric features, then one column per
+    category of each categorical feature in the sorted order the OneHotEncoder learns, then the target.
+    '''
+    spec = TARGETS[target]
+    return spec["numeric"] + [f"{column}_{category}" for column in spec["categorical"]
+                              for category in sorted(CATEGORIES[column])] + [target]
+
+
+def design_matrix(df, target):
+    '''
+    Builds the unscaled design matrix of a target, the numeric features, their one hot encoded
+    categories and the target as the last column.
+
+    Parameters:
+    - df: Rows of the cleaned dataset
+    - target: A regression key of TARGETS
+
+    Returns:
+    - A float64 array with one column per design_columns entry
+    '''
+    spec = TARGETS[target]
+    blocks = [df[spec["numeric"]].to_numpy(dtype="float64")]
+    for column in spec["categorical"]:
+        categories = sorted(CATEGORIES[column])
+        codes = pd.Categorical(df[column].astype(str), categories=categories).codes
+        blocks.append((codes[:, None] == np.arange(len(categories))).astype("float64"))
+    blocks.append(df[[target]].to_numpy(dtype="float64"))
+    return np.hstack(blocks)
+
+
+def summarise(Z):
+    '''
+    Returns the accumulators of a design matrix: the row count, the column means and the centred
+    cross products, from which XᵀX, Xᵀy and the scaler statistics all follow.
+    '''
+    mean = Z.mean(axis=0)
+    centred = Z - mean
+    return {"rows": len(Z), "mean": mean, "comoment": centred.T @ centred}
+
+
+def merge(a, b):
+    '''
+    Combines the accumulators of two sets of rows as if they had been summarised together, using
+    the pairwise update for means and centred cross products so large sums don't lose precision.
+    '''
+    if a["rows"] == 0:
+        return b
+    if b["rows"] == 0:
+        return a
+    rows = a["rows"] + b["rows"]
+    delta = b["mean"] - a["mean"]
+    return {
+        "rows": rows,
+        "mean": a["mean"] + delta * b["rows"] / rows,
+        "comoment": a["comoment"] + b["comoment"] + np.outer(delta, delta) * a["rows"] * b["rows"] / rows,
+    }
+
+
+def update(accumulators, df, target):
+    '''Adds new rows to a target's accumulators, in time proportional to the number of rows.'''
+    return merge(accumulators, summarise(design_matrix(df, target)))
+
+
+def save_accumulators(path, accumulators, target):
+    '''Saves a target's accumulators to an .npz file, with its design columns to check them on load.'''
+    with open(path, "wb") as f:
+        np.savez(f, rows=accumulators["rows"], mean=accumulators["mean"], comoment=accumulators["comoment"],
+                 columns=json.dumps(design_columns(target)))
+
+
+def load_accumulators(path, target):
+    '''
+    Loads a target's accumulators saved by save_accumulators.
+
+    Raises:
+    - ValueError if they were saved for different design columns
+    '''
+    with np.load(path) as f:
+        if json.loads(str(f["columns"])) != design_columns(target):
+            raise ValueError(f"{path} was saved for different features than the {target} model")
+        return {"rows": int(f["rows"]), "mean": f["mean"], "comoment": f["comoment"]}
+
+
+def fitted_preprocessor(spec, rows, mean, var):
+    '''
+    Builds a fitted column transformer from summary statistics instead of the rows themselves.
+
+    Parameters:
+    - spec: An entry of TARGETS
+    - rows: Number of rows the statistics cover
+    - mean: Means of the numeric features
+    - var: Population variances of the numeric features
+
+    Returns:
+    - A ColumnTransformer equal to build_preprocessor(spec) fitted on those rows, with every category encoded
+    '''
+    # Fit on one row per category to set up the encoder, then set the scaler's statistics
+    sample = pd.DataFrame({column: 0.0 for column in spec["numeric"]}, index=range(max(len(CATEGORIES[c]) for c in spec["categorical"])))
+    for column in spec["categorical"]:
+        sample[column] = np.resize(sorted(CATEGORIES[column]), len(sample))
+    prep = build_preprocessor(spec).fit(sample)
+
+    scaler = prep.named_transformers_["num"]
+    scaler.mean_, scaler.var_, scaler.n_samples_seen_ = mean, var, rows
+    scaler.scale_ = np.where(var > 0, np.sqrt(var), 1.0)
+    return prep
+
+
+def solve(accumulators, target):
+    '''
+    Rebuilds a target's fitted pipeline from its accumulators. The StandardScaler statistics come
+    from the means and the diagonal of the cross products, and the regression solves the normal
+    equations of the scaled features. The minimum norm solution is used, like LinearRegression's
+    least squares, as the one hot columns of each feature always sum to one.
+
+    Parameters:
+    - accumulators: The target's accumulators
+    - target: A regression key of TARGETS
+
+    Returns:
+    - A fitted sklearn Pipeline with the same steps as build_pipeline, so the dashboard loads it unchanged
+    '''
+    spec = TARGETS[target]
+    rows, mean, comoment = accumulators["rows"], accumulators["mean"], accumulators["comoment"]
+    n_numeric = len(spec["numeric"])
+
+    # Scaler statistics, the population variance like StandardScaler, with constant columns left unscaled
+    var = np.diag(comoment)[:n_numeric] / rows
+    scale = np.where(var > 0, np.sqrt(var), 1.0)
+
+    # Normal equations of the centred, scaled features
+    factors = np.concatenate([1 / scale, np.ones(len(mean) - 1 - n_numeric)])
+    xtx = comoment[:-1, :-1] * np.outer(factors, factors)
+    xty = comoment[:-1, -1] * factors
+    coef = np.linalg.lstsq(xtx, xty, rcond=None)[0]
+
+    prep = fitted_preprocessor(spec, rows, mean[:n_numeric], var)
+
+    model = LinearRegression()
+    model.coef_ = coef
+    # Intercept from the means, with the numeric features at their scaled mean of zero
+    model.intercept_ = mean[-1] - coef[n_numeric:] @ mean[n_numeric:-1]
+    model.n_features_in_ = len(coef)
+    model.rank_ = np.linalg.matrix_rank(xtx)
+
+    return Pipeline(steps=[("prep", prep), ("model", model)])
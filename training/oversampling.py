@@ -0,0 +1,145 @@
+import numbers
+import numpy as np
+import scipy.sparse as sp
+from joblib import Parallel, delayed
+from imblearn.over_sampling.base import BaseOverSampler
+from sklearn.neighbors import BallTree
+from sklearn.utils._param_validation import Interval
+
+# Minority class rows above which the train command switches from SMOTE to PartitionedSMOTE
+PARTITIONED_MIN_ROWS = 50_000
+
+
+def _binary_columns(X):
+    '''Returns the indices of the columns that only hold 0 and 1, i.e. the one hot encoded categories.'''
+    return np.flatnonzero(np.all((X == 0) | (X == 1), axis=0))
+
+
+def _generate(X, count, k_neighbors, binary, seed, chunk_size):
+    '''
+    Generates synthetic samples for one partition of one class, in a worker.
+
+    Parameters:
+    - X: The partition's samples
+    - count: Number of samples to generate
+    - k_neighbors: Neighbours to interpolate towards
+    - binary: Indices of the one hot columns, copied from the base sample rather than interpolated
+    - seed: SeedSequence for this partition
+    - chunk_size: Samples queried or generated per step, to bound the memory of each step
+
+    Returns:
+    - An array of count new samples
+    '''
+    rng = np.random.default_rng(seed)
+    k = min(k_neighbors, len(X) - 1)
+    if k < 1:
+        # A single sample can only be duplicated
+        return np.repeat(X, count, axis=0)
+
+    # The tree only needs the continuous columns, the one hot columns are equal within a partition
+    continuous = np.setdiff1d(np.arange(X.shape[1]), binary)
+    points = X[:, continuous] if len(continuous) else X
+    tree = BallTree(points)
+
+    # Neighbours of every sample, queried in chunks. The nearest is the sample itself, so ask for one more
+    neighbours = np.vstack([tree.query(points[start:start + chunk_size], k=k + 1, return_distance=False)[:, 1:]
+                            for start in range(0, len(X), chunk_size)])
+
+    chunks = []
+    for start in range(0, count, chunk_size):
+        size = min(chunk_size, count - start)
+        base = rng.integers(0, len(X), size)
+        neighbour = neighbours[base, rng.integers(0, k, size)]
+
+        # Interpolate between each base sample and one of its neighbours
+        gap = rng.random((size, 1))
+        samples = X[base] + gap * (X[neighbour] - X[base])
+        samples[:, binary] = X[base][:, binary]
+        chunks.append(samples)
+
+    return np.vstack(chunks)
+
+
+class PartitionedSMOTE(BaseOverSampler):
+    '''
+    SMOTE with the neighbour search split by category. Each minority class is partitioned by its
+    one hot encoded columns and a ball tree is built per partition, so every search covers a small
+    block of rows instead of the whole class. Synthetic samples are interpolated only between rows
+    of the same categories, so their one hot columns stay valid. Samples are generated in chunks,
+    and the partitions can be processed on several processes.
+
+    It takes the same place as SMOTE in an imblearn Pipeline, after the ColumnTransformer, and
+    balances the classes the same way.
+
+    Parameters:
+    - sampling_strategy: As SMOTE, defaults to oversampling every class but the majority
+    - random_state: Seed for the synthetic samples
+    - k_neighbors: Neighbours to interpolate towards, as SMOTE
+    - min_partition_size: Partitions smaller than this are merged into one shared partition
+    - chunk_size: Samples generated per step
+    - n_jobs: Processes for the partitions, None for one
+    '''
+
+    _parameter_constraints: dict = {
+        **BaseOverSampler._parameter_constraints,
+        "k_neighbors": [Interval(numbers.Integral, 1, None, closed="left")],
+        "min_partition_size": [Interval(numbers.Integral, 1, None, closed="left")],
+        "chunk_size": [Interval(numbers.Integral, 1, None, closed="left")],
+        "n_jobs": [numbers.Integral, None],
+    }
+
+    def __init__(self, *, sampling_strategy="auto", random_state=None, k_neighbors=5,
+                 min_partition_size=20, chunk_size=10_000, n_jobs=None):
+        super().__init__(sampling_strategy=sampling_strategy)
+        self.random_state = random_state
+        self.k_neighbors = k_neighbors
+        self.min_partition_size = min_partition_size
+        self.chunk_size = chunk_size
+        self.n_jobs = n_jobs
+
+    def _partitions(self, X, binary):
+        '''Groups the rows by their one hot columns, merging the small groups into one.'''
+        if len(binary) == 0:
+            return [np.arange(len(X))]
+
+        _, labels = np.unique(X[:, binary], axis=0, return_inverse=True)
+        labels = labels.ravel()
+        sizes = np.bincount(labels)
+
+        partitions = [np.flatnonzero(labels == label) for label in np.flatnonzero(sizes >= self.min_partition_size)]
+        small = np.flatnonzero(np.isin(labels, np.flatnonzero(sizes < self.min_partition_size)))
+        if len(small):
+            partitions.append(small)
+        return partitions
+
+    def _fit_resample(self, X, y):
+        if sp.issparse(X):
+            X = X.toarray()
+        binary = _binary_columns(X)
+        seed = np.random.SeedSequence(self.random_state if isinstance(self.random_state, numbers.Integral) else None)
+
+        # One task per partition of each class, with new samples shared out by partition size
+        tasks = []
+        for class_sample, n_samples in self.sampling_strategy_.items():
+            if n_samples == 0:
+                continue
+            X_class = X[y == class_sample]
+            partitions = self._partitions(X_class, binary)
+            sizes = np.array([len(p) for p in partitions])
+            counts = np.floor(n_samples * sizes / sizes.sum()).astype(int)
+            counts[np.argsort(-sizes)[:n_samples - counts.sum()]] += 1
+
+            for partition, count in zip(partitions, counts):
+                if count:
+                    tasks.append((class_sample, X_class[partition], int(count)))
+
+        seeds = seed.spawn(len(tasks))
+        generated = Parallel(n_jobs=self.n_jobs)(
+            delayed(_generate)(X_part, count, self.k_neighbors, binary, task_seed, self.chunk_size)
+            for (_, X_part, count), task_seed in zip(tasks, seeds)
+        )
+
+        X_resampled = np.vstack([X] + generated)
+        y_resampled = np.concatenate([np.asarray(y)] + [np.full(count, class_sample, dtype=np.asarray(y).dtype)
+                                                       for class_sample, _, count in tasks])
+        return X_resampled, y_resampled
@@ -0,0 +1,133 @@
+from imblearn.over_sampling import SMOTE
+from imblearn.pipeline import Pipeline as ImbPipeline
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from training.oversampling import PARTITIONED_MIN_ROWS, PartitionedSMOTE
+
+# Seed used by the notebooks for the split, SMOTE and the random forest
+RANDOM_STATE = 42
+
+# Share of the rows held back for evaluation
+TEST_SIZE = 0.2
+
+# Oversamplers the classifier can use, auto picks by the number of minority rows
+OVERSAMPLERS = ["smote", "partitioned", "auto"]
+
+# The five models from notebooks 05 to 09, with the same features, file names and settings.
+# The random forest uses the best parameters from the notebook 05 grid search
+TARGETS = {
+    "mental_state": {
+        "kind": "classifier",
+        "numeric": ["age", "daily_screen_time_min", "social_media_time_min", "sleep_hours", "physical_activity_min",
+                    "interaction_negative_ratio", "stress_level", "mood_level", "anxiety_level"],
+        "categorical": ["gender", "platform"],
+        "file": "predicting_mental_state_random_forest_model.pkl",
+        "params": {"n_estimators": 100, "max_depth": None, "min_samples_split": 2, "min_samples_leaf": 1},
+    },
+    "sleep_hours": {
+        "kind": "regressor",
+        "numeric": ["age", "daily_screen_time_min", "social_media_time_min", "physical_activity_min",
+                    "interaction_negative_ratio", "stress_level", "mood_level", "anxiety_level"],
+        "categorical": ["gender", "platform", "mental_state"],
+        "file": "predicting_sleep_linear_regression_model.pkl",
+    },
+    "stress_level": {
+        "kind": "regressor",
+        "numeric": ["age", "daily_screen_time_min", "social_media_time_min", "physical_activity_min",
+                    "interaction_negative_ratio", "sleep_hours", "mood_level", "anxiety_level"],
+        "categorical": ["gender", "platform", "mental_state"],
+        "file": "predicting_stress_level_linear_regression_model.pkl",
+    },
+    "anxiety_level": {
+        "kind": "regressor",
+        "numeric": ["age", "daily_screen_time_min", "social_media_time_min", "physical_activity_min",
+                    "interaction_negative_ratio", "stress_level", "mood_level", "sleep_hours"],
+        "categorical": ["gender", "platform", "mental_state"],
+        "file": "predicting_anxiety_level_linear_regression_model.pkl",
+    },
+    "mood_level": {
+        "kind": "regressor",
+        "numeric": ["age", "daily_screen_time_min", "social_media_time_min", "physical_activity_min",
+                    "interaction_negative_ratio", "stress_level", "sleep_hours", "anxiety_level"],
+        "categorical": ["gender", "platform", "mental_state"],
+        "file": "predicting_mood_level_linear_regression_model.pkl",
+    },
+}
+
+
+def build_preprocessor(spec):
+    '''
+    Builds the column transformer shared by every model, scaling the numeric features
+    and one hot encoding the categorical ones.
+
+    Parameters:
+    - spec: An entry of TARGETS
+
+    Returns:
+    - An unfitted ColumnTransformer
+    '''
+    return ColumnTransformer(
+        transformers=[
+            ("num", StandardScaler(), spec["numeric"]),
+            ("cat", OneHotEncoder(handle_unknown="ignore"), spec["categorical"])
+        ]
+    )
+
+
+def choose_oversampler(y, oversampler="auto"):
+    '''
+    Resolves the auto oversampler: exact SMOTE while the minority classes are small enough for its
+    single neighbour search, PartitionedSMOTE beyond PARTITIONED_MIN_ROWS minority rows.
+
+    Parameters:
+    - y: The training target
+    - oversampler: One of OVERSAMPLERS
+
+    Returns:
+    - "smote" or "partitioned"
+    '''
+    if oversampler != "auto":
+        return oversampler
+    counts = y.value_counts()
+    return "partitioned" if counts.sum() - counts.max() > PARTITIONED_MIN_ROWS else "smote"
+
+
+def build_pipeline(target, n_jobs=None, oversampler="smote"):
+    '''
+    Builds the unfitted pipeline for a target, the same as the one its notebook saves.
+
+    Parameters:
+    - target: A key of TARGETS
+    - n_jobs: Threads for the random forest, None to use one
+    - oversampler: "smote" for the notebook's SMOTE or "partitioned" for PartitionedSMOTE
+
+    Returns:
+    - An unfitted sklearn or imblearn Pipeline
+    '''
+    spec = TARGETS[target]
+
+    if spec["kind"] == "classifier":
+        # Oversample the minority mental states before the random forest. The step keeps the
+        # name smote for either oversampler so parameters and saved pipelines look the same
+        if oversampler == "partitioned":
+            sampler = PartitionedSMOTE(random_state=RANDOM_STATE, n_jobs=n_jobs)
+        else:
+            sampler = SMOTE(random_state=RANDOM_STATE)
+        return ImbPipeline(steps=[
+            ("prep", build_preprocessor(spec)),
+            ("smote", sampler),
+            ("model", RandomForestClassifier(random_state=RANDOM_STATE, n_jobs=n_jobs, **spec["params"]))
+        ])
+
+    return Pipeline(steps=[
+        ("prep", build_preprocessor(spec)),
+        ("model", LinearRegression())
+    ])
+
+
+def features(target):
+    '''Returns the feature columns of a target's model, in the order the pipeline expects them.'''
+    return TARGETS[target]["numeric"] + TARGETS[target]["categorical"]
@@ -0,0 +1,75 @@
+import copy
+import numpy as np
+import pandas as pd
+from imblearn.over_sampling import SMOTE
+from sklearn.metrics import accuracy_score
+from training.pipelines import RANDOM_STATE
+
+# Trees grown from each refresh's new rows
+REFRESH_TREES = 20
+
+# Most trees the refreshed forest keeps, the oldest are dropped beyond it
+MAX_TREES = 200
+
+# Largest drop in holdout accuracy a refresh may cause before it is rejected
+TOLERANCE = 0.0
+
+
+def refresh_forest(pipeline, X_new, y_new, X_holdout, y_holdout, new_trees=REFRESH_TREES,
+                   max_trees=MAX_TREES, tolerance=TOLERANCE, random_state=None):
+    '''
+    Grows extra trees on new rows with warm_start and drops the oldest trees beyond max_trees, then
+    checks the result on holdout rows. The fitted scaler and encoder are kept, so the new trees see
+    the features on the same scale as the old ones.
+
+    Parameters:
+    - pipeline: The fitted mental state pipeline, it isn't changed
+    - X_new, y_new: The new rows, with at least two of every class the forest predicts
+    - X_holdout, y_holdout: Rows to compare the old and refreshed forests on
+    - new_trees: Trees to grow from the new rows
+    - max_trees: Most trees to keep
+    - tolerance: Largest accepted drop in holdout accuracy
+    - random_state: Seed for the new trees, so each refresh grows different trees
+
+    Returns:
+    - A tuple of (refreshed pipeline, report dictionary with both accuracies, the tree counts and
+      whether the refresh was accepted)
+
+    Raises:
+    - ValueError if the new rows have fewer than two rows of a class, as the new trees need every
+      class to predict the same classes as the old ones and SMOTE needs a neighbour to interpolate with
+    '''
+    forest = pipeline.named_steps["model"]
+    counts = pd.Series(np.asarray(y_new)).value_counts().reindex(forest.classes_, fill_value=0)
+    if counts.min() < 2:
+        raise ValueError(f"The new rows need at least two rows of every class, they have {counts.to_dict()}")
+
+    refreshed = copy.deepcopy(pipeline)
+    model = refreshed.named_steps["model"]
+
+    # Oversample the new rows with the existing preprocessing, then grow trees on them. A recent
+    # partition can have only a few rows of the rarest class, so SMOTE uses fewer neighbours if needed
+    smote = SMOTE(random_state=RANDOM_STATE, k_neighbors=min(5, int(counts.min()) - 1))
+    X_resampled, y_resampled = smote.fit_resample(refreshed.named_steps["prep"].transform(X_new), y_new)
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + new_trees, random_state=random_state)
+    model.fit(X_resampled, y_resampled)
+    model.set_params(warm_start=False)
+
+    # Evict the oldest trees, the forest keeps them in the order they were grown
+    evicted = max(0, len(model.estimators_) - max_trees)
+    if evicted:
+        model.estimators_ = model.estimators_[evicted:]
+        model.n_estimators = len(model.estimators_)
+
+    before = accuracy_score(y_holdout, pipeline.predict(X_holdout))
+    after = accuracy_score(y_holdout, refreshed.predict(X_holdout))
+    report = {
+        "holdout_rows": len(y_holdout),
+        "accuracy_before": float(before),
+        "accuracy_after": float(after),
+        "trees_added": new_trees,
+        "trees_evicted": evicted,
+        "trees": len(model.estimators_),
+        "accepted": bool(after >= before - tolerance),
+    }
+    return refreshed, report
@@ -0,0 +1,264 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from imblearn.pipeline import Pipeline as ImbPipeline
+from sklearn.base import clone
+from training.incremental import design_matrix, fitted_preprocessor, merge, solve, summarise
+from training.pipelines import RANDOM_STATE, TARGETS, TEST_SIZE, build_pipeline, features
+from utils.schema import CLEANED_SCHEMA
+
+# Rows read from the parquet file at a time
+BATCH_ROWS = 65_536
+
+# Most training rows the random forest is fitted on at once, each shard grows its share of the trees
+SHARD_ROWS = 500_000
+
+# SMOTE needs more rows than its neighbours in every class, so shards grow until each class has this many
+MIN_CLASS_ROWS = 6
+
+
+def is_test(positions):
+    '''
+    Decides which rows are held back for evaluation from their positions alone, so the split is the
+    same whatever the batch size. Each position is hashed with the splitmix64 mixer and about
+    TEST_SIZE of the rows land in the test set.
+    '''
+    with np.errstate(over="ignore"):
+        z = positions.astype(np.uint64) + np.uint64(RANDOM_STATE) * np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) / 2.0 ** 53 < TEST_SIZE
+
+
+def model_columns():
+    '''Returns every column any model reads, in schema order.'''
+    used = {column for target in TARGETS for column in features(target) + [target]}
+    return [column for column in CLEANED_SCHEMA if column in used]
+
+
+def iter_batches(path, batch_size=BATCH_ROWS):
+    '''
+    Streams the model columns of a parquet file as DataFrames with the cleaned dataset's dtypes.
+
+    Parameters:
+    - path: The parquet file
+    - batch_size: Rows per batch
+
+    Yields:
+    - Tuples of (DataFrame, whether each row is held back for testing)
+    '''
+    columns = model_columns()
+    start = 0
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=columns):
+        # Each batch has its own dictionaries, so cast the categorical columns back to the shared categories
+        df = batch.to_pandas().astype({column: CLEANED_SCHEMA[column] for column in columns})
+        yield df, is_test(np.arange(start, start + len(df)))
+        start += len(df)
+
+
+def statistics_pass(path, batch_size=BATCH_ROWS):
+    '''
+    First pass over the file: the regressions' accumulators and the classifier's scaler statistics,
+    all from the training rows.
+
+    Returns:
+    - Dictionary of accumulators by target, the classifier's covering only its numeric features
+    '''
+    accumulators = {target: {"rows": 0} for target in TARGETS}
+    for df, test in iter_batches(path, batch_size):
+        train = df[~test]
+        if train.empty:
+            continue
+        for target, spec in TARGETS.items():
+            if spec["kind"] == "regressor":
+                Z = design_matrix(train, target)
+            else:
+                Z = train[spec["numeric"]].to_numpy(dtype="float64")
+            accumulators[target] = merge(accumulators[target], summarise(Z))
+    return accumulators
+
+
+def _has_classes(shard, target):
+    '''Checks a shard has at least MIN_CLASS_ROWS rows of every class.'''
+    return shard[target].value_counts().min() >= MIN_CLASS_ROWS
+
+
+def _shards(path, batch_size, shard_rows, target):
+    '''
+    Groups the training rows into shards of about shard_rows, each with enough rows of every class.
+    A short last shard is folded into the one before it.
+    '''
+    ready, pending, rows = None, [], 0
+    for df, test in iter_batches(path, batch_size):
+        pending.append(df[~test])
+        rows += len(pending[-1])
+        if rows >= shard_rows:
+            shard = pd.concat(pending, ignore_index=True)
+            if _has_classes(shard, target):
+                if ready is not None:
+                    yield ready
+                ready, pending, rows = shard, [], 0
+
+    if pending:
+        shard = pd.concat(pending, ignore_index=True)
+        if ready is not None and not _has_classes(shard, target):
+            shard = pd.concat([ready, shard], ignore_index=True)
+            ready = None
+        if ready is not None:
+            yield ready
+        ready = shard
+    if ready is not None:
+        yield ready
+
+
+def train_forest(path, statistics, batch_size=BATCH_ROWS, shard_rows=SHARD_ROWS, n_jobs=None):
+    '''
+    Second pass over the file: fits the mental state pipeline one shard at a time and merges the
+    shards' trees into one random forest. Every shard is scaled with the statistics of the whole
+    training set, oversampled on its own and grows a share of the trees in proportion to its rows,
+    so at most two shards are in memory.
+
+    Parameters:
+    - path: The parquet file
+    - statistics: The classifier's entry from statistics_pass
+    - batch_size: Rows per batch
+    - shard_rows: Training rows per shard
+    - n_jobs: Threads for each shard's forest
+
+    Returns:
+    - A fitted imblearn Pipeline with the same steps as build_pipeline
+    '''
+    target = "mental_state"
+    spec = TARGETS[target]
+    template = build_pipeline(target, n_jobs=n_jobs)
+    prep = fitted_preprocessor(spec, statistics["rows"], statistics["mean"],
+                               np.diag(statistics["comoment"]) / statistics["rows"])
+    n_estimators = template.named_steps["model"].n_estimators
+
+    forest = None
+    for i, shard in enumerate(_shards(path, batch_size, shard_rows, target)):
+        X = prep.transform(shard[features(target)])
+        # Category strings, like the labels of the in memory model
+        y = shard[target].astype(str).to_numpy()
+        X_resampled, y_resampled = clone(template.named_steps["smote"]).fit_resample(X, y)
+
+        # A different seed per shard so the shards don't grow the same trees
+        trees = max(1, round(n_estimators * len(shard) / statistics["rows"]))
+        model = clone(template.named_steps["model"]).set_params(n_estimators=trees, random_state=RANDOM_STATE + i)
+        model.fit(X_resampled, y_resampled)
+
+        if forest is None:
+            forest = model
+        else:
+            forest.estimators_ += model.estimators_
+            forest.n_estimators = len(forest.estimators_)
+
+    return ImbPipeline(steps=[("prep", prep), ("smote", template.named_steps["smote"]), ("model", forest)])
+
+
+def evaluate_pass(path, pipelines, batch_size=BATCH_ROWS):
+    '''
+    Last pass over the file: scores every model on the held back rows from running totals, giving
+    the same metrics as evaluate without keeping the predictions.
+
+    Parameters:
+    - path: The parquet file
+    - pipelines: Dictionary of fitted pipelines by target
+
+    Returns:
+    - Dictionary of metrics by target
+    '''
+    totals = {target: np.zeros(5) for target in pipelines if TARGETS[target]["kind"] == "regressor"}
+    confusion = {target: {} for target in pipelines if TARGETS[target]["kind"] == "classifier"}
+
+    for df, test in iter_batches(path, batch_size):
+        df = df[test]
+        if df.empty:
+            continue
+        for target, pipeline in pipelines.items():
+            y_pred = pipeline.predict(df[features(target)])
+            if target in confusion:
+                pairs = pd.DataFrame({"true": df[target].astype(str).to_numpy(), "pred": y_pred}).value_counts()
+                for pair, count in pairs.items():
+                    confusion[target][pair] = confusion[target].get(pair, 0) + count
+            else:
+                y = df[target].to_numpy(dtype="float64")
+                errors = y - y_pred
+                totals[target] += [len(y), np.abs(errors).sum(), (errors ** 2).sum(), y.sum(), (y ** 2).sum()]
+
+    metrics = {}
+    for target, (n, abs_errors, squared_errors, y_sum, y_squares) in totals.items():
+        metrics[target] = {
+            "mae": float(abs_errors / n),
+            "rmse": float(np.sqrt(squared_errors / n)),
+            "r2": float(1 - squared_errors / (y_squares - y_sum ** 2 / n)),
+        }
+    for target, counts in confusion.items():
+        # Macro F1 over every label that appears, like f1_score
+        labels = sorted({label for pair in counts for label in pair})
+        f1 = []
+        for label in labels:
+            tp = counts.get((label, label), 0)
+            predicted = sum(count for (_, pred), count in counts.items() if pred == label)
+            actual = sum(count for (true, _), count in counts.items() if true == label)
+            f1.append(2 * tp / (predicted + actual) if predicted + actual else 0.0)
+        metrics[target] = {
+            "accuracy": sum(counts.get((label, label), 0) for label in labels) / sum(counts.values()),
+            "f1_macro": float(np.mean(f1)),
+        }
+    return metrics
+
+
+def compare_in_memory(path, pipelines):
+    '''
+    Checks streamed models against the usual in memory fit on the same training rows. This loads
+    the whole file, so it is only for validating the streaming code on data that fits in memory.
+
+    Parameters:
+    - path: The parquet file
+    - pipelines: The streamed pipelines by target
+
+    Returns:
+    - Dictionary by target, the largest prediction difference on the test rows for the regressions,
+      and both accuracies and the share of matching predictions for the classifier
+    '''
+    df = pd.read_parquet(path, columns=model_columns())
+    test = is_test(np.arange(len(df)))
+    train = df[~test]
+
+    comparison = {}
+    for target, pipeline in pipelines.items():
+        X = df.loc[test, features(target)]
+        reference = build_pipeline(target).fit(train[features(target)], train[target]).predict(X)
+        streamed = pipeline.predict(X)
+        if TARGETS[target]["kind"] == "classifier":
+            y = df.loc[test, target].astype(str).to_numpy()
+            comparison[target] = {"in_memory_accuracy": float(np.mean(reference == y)),
+                                  "streamed_accuracy": float(np.mean(streamed == y)),
+                                  "agreement": float(np.mean(reference == streamed))}
+        else:
+            comparison[target] = {"max_difference": float(np.abs(reference - streamed).max())}
+    return comparison
+
+
+def stream_train(path, batch_size=BATCH_ROWS, shard_rows=SHARD_ROWS, n_jobs=None):
+    '''
+    Trains all five models without loading the dataset, in three passes over the parquet file: the
+    regressions' accumulators and the scaler statistics, the sharded random forest, then evaluation.
+    Memory is bounded by the batch and shard sizes rather than the number of rows.
+
+    Parameters:
+    - path: The parquet file
+    - batch_size: Rows per batch
+    - shard_rows: Training rows per random forest shard
+    - n_jobs: Threads for the random forest
+
+    Returns:
+    - A tuple of (pipelines by target, accumulators by target, metrics by target)
+    '''
+    accumulators = statistics_pass(path, batch_size)
+    pipelines = {target: solve(accumulators[target], target)
+                 for target, spec in TARGETS.items() if spec["kind"] == "regressor"}
+    pipelines["mental_state"] = train_forest(path, accumulators["mental_state"], batch_size, shard_rows, n_jobs)
+    return pipelines, accumulators, evaluate_pass(path, pipelines, batch_size)
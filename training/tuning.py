@@ -0,0 +1,153 @@
+import itertools
+import time
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import StratifiedKFold
+from training.pipelines import RANDOM_STATE, build_pipeline
+
+# The grid searched in notebook 05
+PARAM_GRID = {
+    "n_estimators": [100, 300, 500],
+    "max_depth": [None, 10, 20],
+    "min_samples_split": [2, 5, 10],
+    "min_samples_leaf": [1, 2, 4],
+}
+
+
+def candidates(param_grid):
+    '''Returns every combination of a parameter grid as a list of dictionaries.'''
+    names = list(param_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*param_grid.values())]
+
+
+def _prepare_fold(prep, smote, X, y, train, test):
+    '''Fits the preprocessing on one fold's training rows and oversamples them.'''
+    start = time.process_time()
+    prep = clone(prep)
+    X_train = prep.fit_transform(X.iloc[train])
+    X_resampled, y_resampled = clone(smote).fit_resample(X_train, y.iloc[train])
+    return {
+        "X_train": X_resampled,
+        "y_train": np.asarray(y_resampled),
+        "X_test": prep.transform(X.iloc[test]),
+        "y_test": y.iloc[test].to_numpy(),
+        "cpu_seconds": time.process_time() - start,
+    }
+
+
+def prepare_folds(X, y, cv=5, n_jobs=1, oversampler="smote"):
+    '''
+    Fits the preprocessing and SMOTE once per fold and keeps the results, so every candidate reuses
+    them instead of repeating the same deterministic work. The folds match GridSearchCV's default
+    for a classifier, a StratifiedKFold without shuffling.
+
+    Parameters:
+    - X: The feature DataFrame
+    - y: The mental state target
+    - cv: Number of folds
+    - n_jobs: Processes to prepare the folds on
+    - oversampler: "smote" or "partitioned", see build_pipeline
+
+    Returns:
+    - A list of dictionaries with the oversampled training matrix and the transformed test matrix of each fold
+    '''
+    pipeline = build_pipeline("mental_state", n_jobs=1, oversampler=oversampler)
+    prep, smote = pipeline.named_steps["prep"], pipeline.named_steps["smote"]
+    splits = StratifiedKFold(n_splits=cv).split(X, y)
+    return Parallel(n_jobs=n_jobs)(delayed(_prepare_fold)(prep, smote, X, y, train, test) for train, test in splits)
+
+
+def _score(params, fold, n_samples=None):
+    '''
+    Fits one random forest on a prepared fold and scores it, in a worker process.
+
+    Parameters:
+    - params: Random forest parameters
+    - fold: A fold from prepare_folds
+    - n_samples: Train on only this many of the oversampled rows, for successive halving
+
+    Returns:
+    - A tuple of (accuracy, CPU seconds)
+    '''
+    start = time.process_time()
+    X_train, y_train = fold["X_train"], fold["y_train"]
+    if n_samples is not None and n_samples < len(y_train):
+        # A fixed random subset, the same for every candidate so they are compared fairly
+        subset = np.random.default_rng(RANDOM_STATE).permutation(len(y_train))[:n_samples]
+        X_train, y_train = X_train[subset], y_train[subset]
+
+    model = RandomForestClassifier(random_state=RANDOM_STATE, n_jobs=1, **params).fit(X_train, y_train)
+    accuracy = accuracy_score(fold["y_test"], model.predict(fold["X_test"]))
+    return accuracy, time.process_time() - start
+
+
+def _evaluate(parallel, folds, candidate_list, n_samples=None):
+    '''Scores every candidate on every fold in one parallel batch and returns the mean scores and CPU time.'''
+    results = parallel(delayed(_score)(params, fold, n_samples) for params in candidate_list for fold in folds)
+    scores = np.array([score for score, _ in results]).reshape(len(candidate_list), len(folds))
+    return scores.mean(axis=1), sum(cpu for _, cpu in results)
+
+
+def grid_search(folds, param_grid=PARAM_GRID, n_jobs=1):
+    '''
+    Exhaustive search over the grid on the prepared folds, equivalent to GridSearchCV on the full pipeline.
+
+    Returns:
+    - Dictionary with best_params, best_score, results and cpu_seconds
+    '''
+    candidate_list = candidates(param_grid)
+    with Parallel(n_jobs=n_jobs) as parallel:
+        means, cpu_seconds = _evaluate(parallel, folds, candidate_list)
+
+    results = [{"params": params, "mean_accuracy": float(score)} for params, score in zip(candidate_list, means)]
+    best = int(np.argmax(means))
+    return {"best_params": candidate_list[best], "best_score": float(means[best]), "results": results, "cpu_seconds": cpu_seconds}
+
+
+def halving_search(folds, param_grid=PARAM_GRID, factor=3, min_samples=None, n_jobs=1):
+    '''
+    Successive halving over the grid on the prepared folds. Every candidate is first trained on a
+    small share of the rows, then only the best 1 / factor go on to the next round with factor times
+    more rows, until one candidate is left or the full training rows are used.
+
+    Parameters:
+    - folds: Folds from prepare_folds
+    - param_grid: The parameter grid
+    - factor: How much the rows grow and the candidates shrink each round
+    - min_samples: Rows in the first round, defaults to the smallest that reaches the full rows in the last round
+    - n_jobs: Processes to fit the candidates on
+
+    Returns:
+    - Dictionary with best_params, best_score, results (one entry per round) and cpu_seconds
+    '''
+    candidate_list = candidates(param_grid)
+    max_samples = min(len(fold["y_train"]) for fold in folds)
+    rounds = int(np.ceil(np.log(len(candidate_list)) / np.log(factor))) + 1
+    if min_samples is None:
+        min_samples = max(max_samples // factor ** (rounds - 1), 2 * len(np.unique(folds[0]["y_train"])))
+
+    results = []
+    cpu_seconds = 0.0
+    n_samples = min_samples
+    with Parallel(n_jobs=n_jobs) as parallel:
+        while True:
+            n_samples = min(n_samples, max_samples)
+            means, cpu = _evaluate(parallel, folds, candidate_list, n_samples)
+            cpu_seconds += cpu
+            results.append({"n_samples": int(n_samples), "candidates": len(candidate_list),
+                            "best_score": float(means.max())})
+
+            if len(candidate_list) == 1 or n_samples >= max_samples:
+                break
+
+            # Keep the best candidates, ties keep the earlier one like GridSearchCV
+            keep = max(1, len(candidate_list) // factor)
+            order = np.argsort(-means, kind="stable")[:keep]
+            candidate_list = [candidate_list[i] for i in sorted(order)]
+            n_samples *= factor
+
+    best = int(np.argmax(means))
+    return {"best_params": candidate_list[best], "best_score": float(means[best]), "results": results, "cpu_seconds": cpu_seconds}